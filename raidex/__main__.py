@@ -8,6 +8,7 @@ from raidex.app import App
 from raidex.message_broker.message_broker import MessageBroker
 from raidex.commitment_service.node import CommitmentService
 from raidex.raidex_node.bots import LiquidityProvider, RandomWalker, Manipulator
+from raidex.raidex_node.architecture.event_architecture import set_event_trace, print_event_trace
 from raidex.constants import RTT_ADDRESS, WETH_ADDRESS, CS_ADDRESS
 
 structlog.configure()
@@ -43,9 +44,17 @@ def main():
                                                   <Options:\"liquidity\", \"random\", \"manipulator\">')
     parser.add_argument('--token-address', type=str, help='Token address of token to trade against WETH on kovan',
                         default=RTT_ADDRESS)
+    parser.add_argument('--trace-events', action='store_true',
+                        help='Print every event and state change handled')
+    parser.add_argument('--state-dir', type=str, default=None,
+                        help='Directory to persist the node state in, '
+                             'the state is restored from it on startup')
 
     args = parser.parse_args()
 
+    if args.trace_events is True:
+        set_event_trace(print_event_trace)
+
     if args.mock_networking is True:
         message_broker = MessageBroker()
         commitment_service = CommitmentService.build_service(message_broker, fee_rate=1)
@@ -67,7 +76,8 @@ def main():
                                                    message_broker_port=args.broker_port,
                                                    trader_host=args.trader_host,
                                                    trader_port=args.trader_port,
-                                                   offer_lifetime=args.offer_lifetime)
+                                                   offer_lifetime=args.offer_lifetime,
+                                                   state_dir=args.state_dir)
     raidex_app.start()
 
     if args.api is True:
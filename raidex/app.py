@@ -1,4 +1,5 @@
 from raidex.account import Account
+from raidex.messages import Envelope
 from raidex.signing import Signer
 from raidex.utils.address import binary_address
 from raidex.raidex_node.market import TokenPair
@@ -15,6 +16,7 @@ from raidex.raidex_node.trader.listener.raiden_listener import RaidenListener
 from raidex.raidex_node.architecture.event_architecture import event_dispatch, state_change_dispatch
 from raidex.raidex_node.handle_state_change import handle_state_change
 from raidex.raidex_node.trader.listener.listen_for_events import raiden_poll, raiden_poll_channel
+from raidex.raidex_node.architecture.journal import StateStorage
 
 
 class App:
@@ -43,6 +45,8 @@ class App:
         state_change_dispatch.connect_consumer(self.raidex_node, handle_state_change)
 
     def start(self):
+        if self.raidex_node.state_storage is not None:
+            self.raidex_node.state_storage.restore(self.raidex_node, handle_state_change)
         self.raidex_node.start()
         # start task for updating the balance of the trader:
         self.trader.start()
@@ -64,7 +68,8 @@ class App:
                                   message_broker_port=5000,
                                   trader_host='127.0.0.1',
                                   trader_port=5001,
-                                  offer_lifetime=None):
+                                  offer_lifetime=None,
+                                  state_dir=None):
 
         if keyfile is not None and pw_file is not None:
             pw = pw_file.read()
@@ -82,7 +87,8 @@ class App:
 
         trader_client = TraderClient(signer.checksum_address, host=trader_host, port=trader_port, market=token_pair)
         message_broker = MessageBrokerClient(host=message_broker_host, port=message_broker_port,
-                                             address=signer.checksum_address)
+                                             address=signer.checksum_address,
+                                             envelope_version=Envelope.binary_version)
 
         transport = Transport(message_broker, signer)
 
@@ -96,6 +102,9 @@ class App:
         if offer_lifetime is not None:
             raidex_node.default_offer_lifetime = offer_lifetime
 
+        if state_dir is not None:
+            raidex_node.state_storage = StateStorage(state_dir)
+
         app = App(trader_client, commitment_service_client, transport, token_pair, raidex_node)
         return app
 
@@ -4,6 +4,7 @@ from gevent.event import Event
 import structlog
 
 from raidex.commitment_service.node import CommitmentService
+from raidex.commitment_service.shards import ShardedCommitmentService
 
 structlog.configure()
 
@@ -24,16 +25,37 @@ def main():
                         default='localhost')
     parser.add_argument("--trader-port", type=int, help='Specify the port for the trader mock, default is 5001',
                         default=5001)
+    parser.add_argument("--shards", type=int, help='Number of worker processes, each handling a '
+                                                   'partition of the offer ids, '
+                                                   'default is 1 (no worker processes)',
+                        default=1)
+    parser.add_argument("--refund-store", type=str, help='File the refunds are persisted in until '
+                                                         'they were transferred, per shard with '
+                                                         'the shard index appended',
+                        default=None)
 
     args = parser.parse_args()
 
-    commitment_service = CommitmentService.build_service(keyfile=args.keyfile,
-                                                         pw_file=args.pwfile,
-                                                         message_broker_host=args.broker_host,
-                                                         message_broker_port=args.broker_port,
-                                                         trader_host=args.trader_host,
-                                                         trader_port=args.trader_port,
-                                                         fee_rate=0)
+    if args.shards > 1:
+        commitment_service = ShardedCommitmentService.build_service(
+            keyfile=args.keyfile,
+            pw_file=args.pwfile,
+            message_broker_host=args.broker_host,
+            message_broker_port=args.broker_port,
+            trader_host=args.trader_host,
+            trader_port=args.trader_port,
+            fee_rate=0,
+            refund_store_path=args.refund_store,
+            nof_shards=args.shards)
+    else:
+        commitment_service = CommitmentService.build_service(keyfile=args.keyfile,
+                                                             pw_file=args.pwfile,
+                                                             message_broker_host=args.broker_host,
+                                                             message_broker_port=args.broker_port,
+                                                             trader_host=args.trader_host,
+                                                             trader_port=args.trader_port,
+                                                             fee_rate=0,
+                                                             refund_store_path=args.refund_store)
     commitment_service.start()
 
     stop_event.wait()
@@ -4,8 +4,10 @@ from gevent.queue import PriorityQueue, Queue
 from raidex.raidex_node.transport.client import MessageBrokerClient
 from raidex.raidex_node.trader.client import TraderClient
 from raidex.account import Account
+from raidex.messages import Envelope
 from raidex.signing import Signer
 from raidex.constants import FEE_ADDRESS, COMMITMENT_AMOUNT
+from raidex.commitment_service.refund import RefundStore
 from raidex.commitment_service.tasks import (
     RefundTask,
     MessageSenderTask,
@@ -40,7 +42,15 @@ class CommitmentMismatch(RaidexException):
 
 class CommitmentService(object):
 
-    def __init__(self, signer, message_broker, trader_client, fee_rate=None):
+    def __init__(self, signer, message_broker, trader_client, fee_rate=None,
+                 inbound_message_broker=None, inbound_trader_client=None, refund_store=None):
+        """
+        :param inbound_message_broker: broker the incoming messages are received from,
+                                       default `message_broker`
+        :param inbound_trader_client: client the incoming transfers are received from,
+                                      default `trader_client`
+        :param refund_store: RefundStore persisting the refunds until they were transferred
+        """
         self._sign = signer.sign
         self.address = signer.address
         self.swaps = dict()  # offer_hash -> CommitmentTuple
@@ -48,17 +58,45 @@ class CommitmentService(object):
         # FIXME fee_rate should be int representation (int(float_rate/uint32.max_int)) for CSAdvertisements
         self.fee_rate = fee_rate
         self.message_broker = message_broker
+        self.inbound_message_broker = inbound_message_broker or message_broker
+        self.inbound_trader_client = inbound_trader_client or trader_client
         self.refund_queue = PriorityQueue()  # type: (TransferReceipt, substract_fee <bool>)
-        self.message_queue = Queue()  # type: (messages.Signed, recipient (str) or None)
+        # (messages.Signed, recipient (str) or None, enqueued_at (float))
+        self.message_queue = Queue()
+        self.refund_store = refund_store
+        self._commitment_task = None
+        self._refund_task = None
+        self._message_sender_task = None
 
     def start(self):
         self.trader_client.start()
-        CommitmentTask(self.swaps, self.refund_queue, self.message_queue, self.message_broker, self.address).start()
-        CancellationRequestTask(self.swaps, self.message_broker, self.address).start()
-        SwapExecutionTask(self.swaps, self.message_broker, self.address).start()
-        TransferReceivedTask(self.swaps, self.trader_client).start()
-        RefundTask(self.trader_client, self.refund_queue, FEE_ADDRESS, self.fee_rate).start()
-        MessageSenderTask(self.message_broker, self.message_queue, self._sign).start()
+        self._commitment_task = CommitmentTask(self.swaps, self.refund_queue, self.message_queue,
+                                               self.inbound_message_broker, self.address)
+        self._commitment_task.start()
+        CancellationRequestTask(self.swaps, self.inbound_message_broker, self.address).start()
+        SwapExecutionTask(self.swaps, self.inbound_message_broker, self.address).start()
+        TransferReceivedTask(self.swaps, self.inbound_trader_client).start()
+        self._refund_task = RefundTask(self.trader_client, self.refund_queue, FEE_ADDRESS,
+                                       self.fee_rate, store=self.refund_store)
+        self._refund_task.start()
+        self._message_sender_task = MessageSenderTask(self.message_broker, self.message_queue,
+                                                      self._sign)
+        self._message_sender_task.start()
+
+    def metrics(self):
+        factory = self._commitment_task.factory if self._commitment_task is not None else None
+        metrics = dict(
+            nof_swaps=len(self.swaps),
+            nof_swaps_created=factory.nof_created if factory is not None else 0,
+            nof_swaps_processed=factory.nof_processed if factory is not None else 0,
+            refund_queue_size=self.refund_queue.qsize(),
+            message_queue_size=self.message_queue.qsize(),
+        )
+        if self._refund_task is not None:
+            metrics.update(self._refund_task.gauges())
+        if self._message_sender_task is not None:
+            metrics.update(self._message_sender_task.gauges())
+        return metrics
 
     @property
     def checksum_address(self):
@@ -72,18 +110,24 @@ class CommitmentService(object):
                       message_broker_port=5000,
                       trader_host='127.0.0.1',
                       trader_port=5003,
-                      fee_rate=None):
+                      fee_rate=None,
+                      refund_store_path=None):
 
         pw = pw_file.read()
         if pw != '':
             pw = pw.splitlines()[0]
         acc = Account.load(file=keyfile, password=pw)
         signer = Signer.from_account(acc)
-        message_broker_client = MessageBrokerClient(host=message_broker_host, port=message_broker_port)
+        message_broker_client = MessageBrokerClient(host=message_broker_host,
+                                                    port=message_broker_port,
+                                                    envelope_version=Envelope.binary_version)
         trader_client = TraderClient(signer.canonical_address,
                                      host=trader_host,
                                      port=trader_port,
                                      api_version='v1',
                                      commitment_amount=COMMITMENT_AMOUNT)
 
-        return cls(signer, message_broker_client, trader_client, fee_rate)
+        refund_store = RefundStore(refund_store_path) if refund_store_path is not None else None
+
+        return cls(signer, message_broker_client, trader_client, fee_rate,
+                   refund_store=refund_store)
@@ -1,5 +1,12 @@
+import os
+from collections import OrderedDict
 from functools import total_ordering
 
+import structlog
+
+from raidex.utils.journal import Journal
+
+log = structlog.get_logger('commitment_service.refunds')
 
 
 @total_ordering
@@ -41,3 +48,55 @@ class Refund(object):
             self.receipt,
             self.claim_fee,
         )
+
+
+class RefundStore(object):
+    """
+    Journal of the refunds whose transfer didn't succeed yet, so that they survive a restart.
+    Refunds are added as soon as they are accepted and removed once they were transferred,
+    every change is synced to disk before `add` / `remove` return.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._journal = None
+
+    def load(self):
+        """
+        Reads the outstanding refunds and compacts the journal to them,
+        has to be called before add / remove.
+
+        :return: OrderedDict refund id -> Refund
+        """
+        outstanding = OrderedDict()
+        for action, refund_id, refund in Journal.read(self.path):
+            if action == 'add':
+                outstanding[refund_id] = refund
+            else:
+                outstanding.pop(refund_id, None)
+
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        compacted = Journal(tmp_path)
+        for refund_id, refund in outstanding.items():
+            compacted.append(('add', refund_id, refund))
+        compacted.close()
+        os.replace(tmp_path, self.path)
+
+        # a lost record would drop a refund, or transfer it twice after a restart
+        self._journal = Journal(self.path, fsync_batch_size=1)
+        if outstanding:
+            log.info('Loaded outstanding refunds', path=self.path, nof_refunds=len(outstanding))
+        return outstanding
+
+    def add(self, refund_id, refund):
+        self._journal.append(('add', refund_id, refund))
+
+    def remove(self, refund_id):
+        self._journal.append(('remove', refund_id, None))
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,396 @@
+"""
+Runs the commitment service in several worker processes,
+each one owning a partition of the offer ids.
+
+The front process listens on the commitment service topic of the message broker and for
+incoming transfers, and forwards every message and transfer to the shard owning its offer id.
+A shard is a full CommitmentService, it receives from the front process instead of the broker
+and the trader, but signs, sends and refunds itself. A shard whose process exited is restarted,
+the frames routed to it in between are dropped.
+Front and shards exchange length prefixed frames over a pair of pipes:
+
+    front -> shard: INIT (json config), MESSAGE (binary envelope frame), TRANSFER (json)
+    shard -> front: METRICS (json)
+"""
+import json
+import os
+import struct
+import sys
+
+import gevent
+import structlog
+from gevent import subprocess
+from gevent.fileobject import FileObjectPosix
+from gevent.lock import Semaphore
+from eth_utils import encode_hex, decode_hex
+
+from raidex import messages
+from raidex.signing import Signer
+from raidex.account import Account
+from raidex.commitment_service.node import CommitmentService
+from raidex.commitment_service.refund import RefundStore
+from raidex.message_broker.message_broker import MessageBroker
+from raidex.message_broker.listeners import MessageListener
+from raidex.raidex_node.listener_tasks import ListenerTask
+from raidex.raidex_node.transport.client import MessageBrokerClient
+from raidex.raidex_node.trader.client import TraderClient
+from raidex.trader_mock.trader import Trader, TraderClientMock, TransferReceivedListener
+from raidex.constants import COMMITMENT_AMOUNT, SHARD_METRICS_INTERVAL, SHARD_RESTART_DELAY
+
+log = structlog.get_logger('commitment_service.shards')
+
+FRAME_HEADER = struct.Struct('>BI')
+
+INIT = 0
+MESSAGE = 1
+TRANSFER = 2
+METRICS = 3
+
+
+def shard_of(offer_id, nof_shards):
+    # offer ids are random 32 byte integers, so their residue is already a uniform hash partition
+    return offer_id % nof_shards
+
+
+class ShardChannel(object):
+    """Frames over a pair of pipe file descriptors, used in the front process and in the shards"""
+
+    def __init__(self, read_fd, write_fd):
+        self._reader = FileObjectPosix(read_fd, 'rb')
+        self._writer = FileObjectPosix(write_fd, 'wb')
+        # a write can yield to other greenlets in between, frames must not interleave
+        self._write_lock = Semaphore()
+
+    def send(self, kind, payload):
+        with self._write_lock:
+            self._writer.write(FRAME_HEADER.pack(kind, len(payload)) + payload)
+            self._writer.flush()
+
+    def send_json(self, kind, data):
+        self.send(kind, json.dumps(data).encode('utf-8'))
+
+    def receive(self):
+        """:return: (kind, payload), None if the other side closed the channel"""
+        header = self._reader.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return None
+        kind, length = FRAME_HEADER.unpack(header)
+        payload = self._reader.read(length)
+        if len(payload) < length:
+            return None
+        return kind, payload
+
+    def __iter__(self):
+        while True:
+            frame = self.receive()
+            if frame is None:
+                return
+            yield frame
+
+    def close_send(self):
+        """the other side receives the end of the channel, and is expected to close it in turn"""
+        self._writer.close()
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self._reader.close()
+
+
+class ShardProcess(object):
+    """The front process' handle of a shard"""
+
+    def __init__(self, index, config):
+        self.index = index
+        to_shard_read, to_shard_write = os.pipe()
+        from_shard_read, from_shard_write = os.pipe()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'raidex.commitment_service.shards',
+             str(to_shard_read), str(from_shard_write)],
+            pass_fds=(to_shard_read, from_shard_write))
+        os.close(to_shard_read)
+        os.close(from_shard_write)
+        self.channel = ShardChannel(from_shard_read, to_shard_write)
+        self.channel.send_json(INIT, dict(config, shard=index))
+        self.metrics = dict()
+        self.stopped = False
+
+    def receive_metrics(self):
+        """receives the metrics until the shard closed the channel, e.g. because it exited"""
+        for kind, payload in self.channel:
+            if kind == METRICS:
+                self.metrics = json.loads(payload.decode('utf-8'))
+
+    def kill(self):
+        """kills the process of a shard which can't be reached anymore"""
+        if self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self, timeout=5):
+        self.stopped = True
+        try:
+            self.channel.close_send()
+        except (OSError, ValueError):
+            # the shard exited already
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class MessageRouterTask(ListenerTask):
+
+    def __init__(self, service, message_broker):
+        self.service = service
+        super(MessageRouterTask, self).__init__(MessageListener(message_broker,
+                                                                topic=service.address))
+
+    def process(self, data):
+        self.service.route_message(data)
+
+
+class TransferRouterTask(ListenerTask):
+
+    def __init__(self, service, trader_client):
+        self.service = service
+        super(TransferRouterTask, self).__init__(TransferReceivedListener(trader_client))
+
+    def process(self, data):
+        self.service.route_transfer(data)
+
+
+class ShardedCommitmentService(object):
+    """
+    Front process of a commitment service running in `nof_shards` processes,
+    the shards connect to the message broker and the trader given in `shard_config` themselves.
+    """
+
+    def __init__(self, private_key, message_broker, trader_client, nof_shards, shard_config,
+                 restart_delay=SHARD_RESTART_DELAY):
+        self._private_key = private_key
+        self.address = Signer(private_key).address
+        self.message_broker = message_broker
+        self.trader_client = trader_client
+        self.nof_shards = nof_shards
+        self.shard_config = shard_config
+        self.restart_delay = restart_delay
+        self.shards = list()
+        self.stopped = False
+        self.nof_routed_messages = 0
+        self.nof_routed_transfers = 0
+        self.nof_dropped = 0
+        self.nof_restarts = 0
+
+    def start(self):
+        self.start_shards()
+        self.trader_client.start()
+        MessageRouterTask(self, self.message_broker).start()
+        TransferRouterTask(self, self.trader_client).start()
+
+    def start_shards(self):
+        self.shards = [self._start_shard(index) for index in range(self.nof_shards)]
+
+    def _start_shard(self, index):
+        config = dict(self.shard_config, private_key=encode_hex(self._private_key),
+                      nof_shards=self.nof_shards)
+        shard = ShardProcess(index, config)
+        gevent.spawn(self._watch, shard)
+        return shard
+
+    def _watch(self, shard):
+        shard.receive_metrics()
+        if shard.stopped or self.stopped:
+            return
+        shard.kill()
+        log.error('Shard exited, restarting it', shard=shard.index,
+                  returncode=shard.process.wait())
+        try:
+            shard.channel.close()
+        except OSError:
+            # frames which were still buffered for the exited shard
+            pass
+        gevent.sleep(self.restart_delay)
+        if not self.stopped:
+            self.shards[shard.index] = self._start_shard(shard.index)
+            self.nof_restarts += 1
+
+    def stop(self):
+        self.stopped = True
+        for shard in self.shards:
+            shard.stop()
+
+    def shard_for(self, offer_id):
+        return self.shards[shard_of(offer_id, self.nof_shards)]
+
+    def _send(self, shard, kind, payload):
+        """
+        :return: whether the frame was handed to the shard,
+                 the frames for a shard that exited are dropped until it was restarted
+        """
+        try:
+            shard.channel.send(kind, payload)
+        except (OSError, ValueError) as e:
+            # a broken pipe or the closed channel of a shard that is being restarted
+            self.nof_dropped += 1
+            log.error('Shard unreachable, dropping the frame', shard=shard.index, error=repr(e))
+            shard.kill()
+            return False
+        return True
+
+    def route_message(self, message):
+        offer_id = getattr(message, 'offer_id', None)
+        if offer_id is None:
+            self.nof_dropped += 1
+            return
+        if self._send(self.shard_for(offer_id), MESSAGE, messages.Envelope.envelop_frame(message)):
+            self.nof_routed_messages += 1
+
+    def route_transfer(self, transfer_receipt):
+        initiator = transfer_receipt.initiator
+        is_binary = isinstance(initiator, bytes)
+        transfer = dict(
+            initiator=encode_hex(initiator) if is_binary else initiator,
+            binary=is_binary,
+            amount=transfer_receipt.amount,
+            identifier=transfer_receipt.identifier,
+        )
+        payload = json.dumps(transfer).encode('utf-8')
+        if self._send(self.shard_for(transfer_receipt.identifier), TRANSFER, payload):
+            self.nof_routed_transfers += 1
+
+    def metrics(self):
+        """
+        the sum of the last reported metrics of all shards,
+        together with those of the front process
+        """
+        total = dict()
+        for shard in self.shards:
+            for key, value in shard.metrics.items():
+                total[key] = total.get(key, 0) + value
+        total.update(
+            nof_shards=self.nof_shards,
+            nof_routed_messages=self.nof_routed_messages,
+            nof_routed_transfers=self.nof_routed_transfers,
+            nof_dropped=self.nof_dropped,
+            nof_shard_restarts=self.nof_restarts,
+            shards=[shard.metrics for shard in self.shards],
+        )
+        return total
+
+    @classmethod
+    def build_service(cls,
+                      keyfile=None,
+                      pw_file=None,
+                      message_broker_host='127.0.0.1',
+                      message_broker_port=5000,
+                      trader_host='127.0.0.1',
+                      trader_port=5003,
+                      fee_rate=None,
+                      refund_store_path=None,
+                      nof_shards=2):
+
+        pw = pw_file.read()
+        if pw != '':
+            pw = pw.splitlines()[0]
+        acc = Account.load(file=keyfile, password=pw)
+        signer = Signer.from_account(acc)
+        message_broker_client = MessageBrokerClient(
+            host=message_broker_host, port=message_broker_port,
+            envelope_version=messages.Envelope.binary_version)
+        trader_client = TraderClient(signer.canonical_address,
+                                     host=trader_host,
+                                     port=trader_port,
+                                     api_version='v1',
+                                     commitment_amount=COMMITMENT_AMOUNT)
+        shard_config = dict(message_broker_host=message_broker_host,
+                            message_broker_port=message_broker_port,
+                            trader_host=trader_host,
+                            trader_port=trader_port,
+                            fee_rate=fee_rate,
+                            refund_store_path=refund_store_path)
+
+        return cls(acc.privkey, message_broker_client, trader_client, nof_shards, shard_config)
+
+
+class CommitmentShard(object):
+    """
+    Runs in a shard process,
+    feeds the messages and transfers from the front process into its service
+    """
+
+    def __init__(self, channel, service, inbound_message_broker, inbound_trader):
+        self.channel = channel
+        self.service = service
+        self.inbound_message_broker = inbound_message_broker
+        self.inbound_trader = inbound_trader
+
+    @classmethod
+    def build(cls, channel, config):
+        signer = Signer(decode_hex(config['private_key']))
+        message_broker_client = MessageBrokerClient(
+            host=config['message_broker_host'], port=config['message_broker_port'],
+            envelope_version=messages.Envelope.binary_version)
+        trader_client = TraderClient(signer.canonical_address,
+                                     host=config['trader_host'],
+                                     port=config['trader_port'],
+                                     api_version='v1',
+                                     commitment_amount=COMMITMENT_AMOUNT)
+        refund_store = None
+        if config.get('refund_store_path') is not None:
+            refund_store = RefundStore('{}.{}'.format(config['refund_store_path'],
+                                                      config['shard']))
+        inbound_message_broker = MessageBroker()
+        inbound_trader = Trader()
+        inbound_trader_client = TraderClientMock(signer.address, trader=inbound_trader)
+        service = CommitmentService(signer, message_broker_client, trader_client,
+                                    config['fee_rate'],
+                                    inbound_message_broker=inbound_message_broker,
+                                    inbound_trader_client=inbound_trader_client,
+                                    refund_store=refund_store)
+        return cls(channel, service, inbound_message_broker, inbound_trader)
+
+    def handle(self, kind, payload):
+        if kind == MESSAGE:
+            self.inbound_message_broker.send(self.service.address,
+                                             messages.Envelope.open_frame(payload))
+        elif kind == TRANSFER:
+            transfer = json.loads(payload.decode('utf-8'))
+            initiator = transfer['initiator']
+            if transfer['binary']:
+                initiator = decode_hex(initiator)
+            self.inbound_trader.transfer(initiator, self.service.address, transfer['amount'],
+                                         transfer['identifier'])
+        else:
+            log.warning('Unexpected frame from the front process', kind=kind)
+
+    def report_metrics(self, interval=SHARD_METRICS_INTERVAL):
+        while True:
+            self.channel.send_json(METRICS, self.service.metrics())
+            gevent.sleep(interval)
+
+    def run(self):
+        self.service.start()
+        # the tasks of the service only start listening once they ran,
+        # frames handed before would be lost
+        gevent.idle()
+        reporter = gevent.spawn(self.report_metrics)
+        for kind, payload in self.channel:
+            self.handle(kind, payload)
+        # the front process closed the channel
+        reporter.kill()
+
+
+def run_shard(read_fd, write_fd):
+    channel = ShardChannel(read_fd, write_fd)
+    frame = channel.receive()
+    if frame is None or frame[0] != INIT:
+        raise RuntimeError('Shard was not initialized by the front process')
+    config = json.loads(frame[1].decode('utf-8'))
+    log.info('Shard started', shard=config['shard'], nof_shards=config['nof_shards'])
+    CommitmentShard.build(channel, config).run()
+
+
+if __name__ == '__main__':
+    run_shard(int(sys.argv[1]), int(sys.argv[2]))
@@ -1,3 +1,5 @@
+import time
+
 from eth_utils import keccak
 
 from raidex import messages
@@ -12,6 +14,8 @@ class SwapFactory(object):
         self.swaps = swaps
         self.refund_queue = refund_queue
         self.message_queue = message_queue
+        self.nof_created = 0
+        self.nof_processed = 0
 
     def make_swap(self, offer_id):
         swap = None
@@ -20,11 +24,13 @@ class SwapFactory(object):
                                   cleanup_func=lambda id_=offer_id: self.cleanup_swap(id_))
 
             self.swaps[offer_id] = swap
+            self.nof_created += 1
 
         return swap
 
     def cleanup_swap(self, offer_id):
         del self.swaps[offer_id]
+        self.nof_processed += 1
 
     def id_collides(self, offer_id):
         return offer_id in self.swaps
@@ -34,7 +40,7 @@ class SwapFactory(object):
         self.refund_queue.put(refund)
 
     def _queue_send(self, msg, topic):
-        self.message_queue.put((msg, topic))
+        self.message_queue.put((msg, topic, time.monotonic()))
 
 
 class SwapCommitment(object):
@@ -53,6 +59,7 @@ class SwapCommitment(object):
         self.maker_transfer_receipt = None
         self.taker_transfer_receipt = None
         self.terminated_state = None
+        self.taker_commitment_pool = dict()
 
         self.secret = random_secret()
         self.secret_hash = keccak(self.secret)
@@ -1,8 +1,10 @@
+from collections import namedtuple
+from types import MappingProxyType
+
 import gevent
-from functools import wraps
-from transitions import Machine
 
 from raidex.utils import timestamp
+from raidex.raidex_node.order.fsm import MachineError
 
 SWAP_BASE_STATES = [
     'initializing',
@@ -21,75 +23,131 @@ SWAP_BASE_STATES = [
 SWAP_INITIAL_STATE = 'initializing'
 
 
-def swap_setup_state_transitions(fsm, auto_spawn_timeout):
-    fsm.add_transition('timeout', 'wait_for_taker', 'untraded',
-                       after=[omit_args_and_kwargs(fsm.swap.refund_maker), 'finalize'])
-    fsm.add_transition('timeout', ['initializing', 'wait_for_maker'], 'uncommitted',
-                       after='finalize')
-    fsm.add_transition('maker_commitment_msg', 'initializing', 'wait_for_maker',
-                       after=[fsm.set_maker_commitment])
-    fsm.add_transition('transfer_receipt', 'wait_for_maker', 'wait_for_taker',
-                       conditions=[fsm.sender_is_maker],
-                       after=[fsm.set_maker_transfer_receipt,
-                              omit_args_and_kwargs(fsm.swap.send_maker_commitment_proof)])
+SWAP_STATE_CODES = {state: code for code, state in enumerate(SWAP_BASE_STATES)}
+
+SWAP_TERMINATED_STATES = ['traded', 'untraded', 'failed', 'uncommitted']
+SWAP_EXECUTION_STATES = [
+    'wait_for_execution',
+    'wait_for_taker_execution',
+    'wait_for_maker_execution',
+]
+
+# Transitions are tried in this order, the first one whose conditions hold is taken,
+# dest '=' keeps the state.
+# The callbacks are names of SwapStateMachine methods and are called with the event,
+# the `swap_after` methods of the swap are called without arguments after them.
+# `finalize` triggers 'finalize' at the end.
+SWAP_TRANSITIONS = (
+    dict(trigger='timeout', source='wait_for_taker', dest='untraded',
+         swap_after=['refund_maker'], finalize=True),
+    dict(trigger='timeout', source=['initializing', 'wait_for_maker'], dest='uncommitted',
+         finalize=True),
+    dict(trigger='maker_commitment_msg', source='initializing', dest='wait_for_maker',
+         after=['set_maker_commitment']),
+    dict(trigger='transfer_receipt', source='wait_for_maker', dest='wait_for_taker',
+         conditions=['sender_is_maker'],
+         after=['set_maker_transfer_receipt'], swap_after=['send_maker_commitment_proof']),
     # TODO check if before is the right place to execute
-    fsm.add_transition('taker_commitment_msg', 'wait_for_taker', '=', before=[fsm.queue_commitment])
-    fsm.add_transition('transfer_receipt', 'wait_for_taker', 'wait_for_execution',
-                       conditions=[fsm.sender_sent_taker_commitment],
-                       after=[fsm.accept_taker_commitment_from_receipt, fsm.set_taker_transfer_receipt,
-                              omit_args_and_kwargs(fsm.swap.send_offer_taken),
-                              omit_args_and_kwargs(fsm.swap.send_taker_commitment_proof)])
-
-    fsm.add_transition('swap_execution_msg', 'wait_for_execution', 'wait_for_taker_execution',
-                       conditions=[fsm.sender_is_maker],
-                       after=[fsm.set_maker_execution])
-
-    fsm.add_transition('swap_execution_msg', 'wait_for_execution', 'wait_for_maker_execution',
-                       conditions=[fsm.sender_is_taker],
-                       after=[fsm.set_taker_execution])
-
-    fsm.add_transition('swap_execution_msg', 'wait_for_taker_execution', 'traded',
-                       conditions=[fsm.sender_is_taker],
-                       after=[fsm.set_taker_execution,
-                              omit_args_and_kwargs(fsm.swap.send_swap_completed),
-                              omit_args_and_kwargs(fsm.swap.refund_maker_with_fee),
-                              omit_args_and_kwargs(fsm.swap.refund_taker_with_fee),
-                              'finalize'])
-    fsm.add_transition('swap_execution_msg', 'wait_for_maker_execution', 'traded',
-                       conditions=[fsm.sender_is_maker],
-                       after=[fsm.set_maker_execution,
-                              omit_args_and_kwargs(fsm.swap.send_swap_completed),
-                              omit_args_and_kwargs(fsm.swap.refund_maker_with_fee),
-                              omit_args_and_kwargs(fsm.swap.refund_taker_with_fee),
-                              'finalize'])
-
-    fsm.add_transition('timeout', ['wait_for_execution', 'wait_for_taker_execution', 'wait_for_maker_execution'],
-                       'failed',
-                       after=[omit_args_and_kwargs(fsm.swap.punish_maker),
-                              omit_args_and_kwargs(fsm.swap.punish_taker), 'finalize'])
-
-    fsm.add_transition('finalize', ['traded', 'untraded', 'failed', 'uncommitted'], 'processed',
-                       after=[fsm.set_terminated_state, omit_args_and_kwargs(fsm.swap.cleanup)])
+    dict(trigger='taker_commitment_msg', source='wait_for_taker', dest='=',
+         before=['queue_commitment']),
+    dict(trigger='transfer_receipt', source='wait_for_taker', dest='wait_for_execution',
+         conditions=['sender_sent_taker_commitment'],
+         after=['accept_taker_commitment_from_receipt', 'set_taker_transfer_receipt'],
+         swap_after=['send_offer_taken', 'send_taker_commitment_proof']),
+
+    dict(trigger='swap_execution_msg', source='wait_for_execution',
+         dest='wait_for_taker_execution',
+         conditions=['sender_is_maker'],
+         after=['set_maker_execution']),
+    dict(trigger='swap_execution_msg', source='wait_for_execution',
+         dest='wait_for_maker_execution',
+         conditions=['sender_is_taker'],
+         after=['set_taker_execution']),
+    dict(trigger='swap_execution_msg', source='wait_for_taker_execution', dest='traded',
+         conditions=['sender_is_taker'],
+         after=['set_taker_execution'],
+         swap_after=['send_swap_completed', 'refund_maker_with_fee', 'refund_taker_with_fee'],
+         finalize=True),
+    dict(trigger='swap_execution_msg', source='wait_for_maker_execution', dest='traded',
+         conditions=['sender_is_maker'],
+         after=['set_maker_execution'],
+         swap_after=['send_swap_completed', 'refund_maker_with_fee', 'refund_taker_with_fee'],
+         finalize=True),
+
+    dict(trigger='timeout', source=SWAP_EXECUTION_STATES, dest='failed',
+         swap_after=['punish_maker', 'punish_taker'], finalize=True),
+
+    dict(trigger='finalize', source=SWAP_TERMINATED_STATES, dest='processed',
+         after=['set_terminated_state'], swap_after=['cleanup']),
 
     # refund transfers that don't trigger any action
     # TODO check if after is right
-    fsm.add_transition('transfer_receipt', 'wait_for_taker', '=',
-                       unless=[fsm.sender_sent_taker_commitment],
-                       after=[fsm.refund_unsuccessful_transfer])
-    fsm.add_transition('transfer_receipt', 'wait_for_maker', '=',
-                       unless=[fsm.sender_is_maker],
-                       after=[fsm.refund_unsuccessful_transfer]
-                       )
-    fsm.add_transition('transfer_receipt',
-                       ['wait_for_execution', 'wait_for_taker_execution', 'wait_for_maker_execution',
-                         'failed', 'traded', 'uncommitted', 'untraded'],
-                        '=',
-                       after=[fsm.refund_unsuccessful_transfer])
-
-    if auto_spawn_timeout is True:
-        fsm.remove_transition(source='initializing', dest='wait_for_maker', trigger='maker_commitment_msg')
-        fsm.add_transition(source='initializing', dest='wait_for_maker', trigger='maker_commitment_msg',
-                            after=[fsm.set_maker_commitment, fsm.spawn_timeout])
+    dict(trigger='transfer_receipt', source='wait_for_taker', dest='=',
+         unless=['sender_sent_taker_commitment'],
+         after=['refund_unsuccessful_transfer']),
+    dict(trigger='transfer_receipt', source='wait_for_maker', dest='=',
+         unless=['sender_is_maker'],
+         after=['refund_unsuccessful_transfer']),
+    dict(trigger='transfer_receipt',
+         source=SWAP_EXECUTION_STATES + ['failed', 'traded', 'uncommitted', 'untraded'],
+         dest='=',
+         after=['refund_unsuccessful_transfer']),
+)
+
+
+class SwapTransition(namedtuple('SwapTransition', 'source dest conditions unless before after '
+                                                  'swap_after finalize')):
+    """A compiled transition, the state machine callbacks are resolved to functions"""
+
+
+def compile_swap_transitions(transitions, auto_spawn_timeout):
+    """
+    :return: read-only mapping trigger -> tuple with the candidate transitions
+             for every state code, None where the trigger is invalid in the state
+    """
+    def methods(names):
+        return tuple(getattr(SwapStateMachine, name) for name in names)
+
+    table = dict()
+    for transition in transitions:
+        after = list(transition.get('after', []))
+        if auto_spawn_timeout and transition['trigger'] == 'maker_commitment_msg':
+            after.append('spawn_timeout')
+
+        sources = transition['source']
+        if isinstance(sources, str):
+            sources = [sources]
+        candidates = table.setdefault(transition['trigger'], [None] * len(SWAP_BASE_STATES))
+        for source in sources:
+            dest = source if transition['dest'] == '=' else transition['dest']
+            compiled = SwapTransition(
+                source=source,
+                dest=SWAP_STATE_CODES[dest],
+                conditions=methods(transition.get('conditions', [])),
+                unless=methods(transition.get('unless', [])),
+                before=methods(transition.get('before', [])),
+                after=methods(after),
+                swap_after=tuple(transition.get('swap_after', [])),
+                finalize=transition.get('finalize', False),
+            )
+            source_code = SWAP_STATE_CODES[source]
+            candidates[source_code] = (candidates[source_code] or ()) + (compiled,)
+    return MappingProxyType({trigger: tuple(candidates) for trigger, candidates in table.items()})
+
+
+class SwapEvent(object):
+
+    __slots__ = [
+        'transition',
+        'kwargs',
+        'result',
+    ]
+
+    def __init__(self, transition, kwargs):
+        self.transition = transition
+        self.kwargs = kwargs
+        # like in `transitions`, the result is only set after all callbacks of the transition ran
+        self.result = False
 
 
 def event_get_success(event):
@@ -125,27 +183,79 @@ def event_get_msg_or_receipt_kwarg(event):
     return data
 
 
-# FIXME mocking is not easy when a swap-method is wrapped with this
-def omit_args_and_kwargs(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        func()
-    return wrapper
-
+class SwapStateMachine(object):
+    """
+    The state of one swap. The transitions are shared by all swaps,
+    they are compiled once into SWAP_TRANSITION_TABLES.
+    """
 
-class SwapStateMachine(Machine):
+    __slots__ = [
+        'swap',
+        '_state',
+        '_table',
+    ]
 
     def __init__(self, swap, auto_spawn_timeout=True):
-        # TODO evaluate if queued_transition is better
-        super(SwapStateMachine, self).__init__(self, states=SWAP_BASE_STATES, initial=SWAP_INITIAL_STATE,
-                                               send_event=True)
-        self.taker_commitment_pool = dict()
         self.swap = swap
-
-        self._setup_transitions(auto_spawn_timeout)
-
-    def _setup_transitions(self, auto_spawn_timeout):
-        swap_setup_state_transitions(self, auto_spawn_timeout)
+        self._state = SWAP_STATE_CODES[SWAP_INITIAL_STATE]
+        self._table = SWAP_TRANSITION_TABLES[bool(auto_spawn_timeout)]
+
+    @property
+    def state(self):
+        return SWAP_BASE_STATES[self._state]
+
+    def set_state(self, state):
+        self._state = SWAP_STATE_CODES[state]
+
+    def trigger(self, trigger, **kwargs):
+        """
+        Takes the first transition of `trigger` from the current state whose conditions hold.
+
+        :return: False if no transition was taken
+        :raises MachineError: if the trigger is not valid in the current state
+        """
+        candidates = self._table[trigger][self._state]
+        if candidates is None:
+            raise MachineError("Can't trigger event {} from state {}!".format(trigger, self.state))
+
+        event = SwapEvent(None, kwargs)
+        for transition in candidates:
+            event.transition = transition
+            if not all(condition(self, event) for condition in transition.conditions):
+                continue
+            if any(condition(self, event) for condition in transition.unless):
+                continue
+
+            for callback in transition.before:
+                callback(self, event)
+            self._state = transition.dest
+            for callback in transition.after:
+                callback(self, event)
+            for name in transition.swap_after:
+                getattr(self.swap, name)()
+            if transition.finalize:
+                self.finalize()
+            event.result = True
+            return True
+        return False
+
+    def timeout(self):
+        return self.trigger('timeout')
+
+    def finalize(self):
+        return self.trigger('finalize')
+
+    def maker_commitment_msg(self, msg):
+        return self.trigger('maker_commitment_msg', msg=msg)
+
+    def taker_commitment_msg(self, msg):
+        return self.trigger('taker_commitment_msg', msg=msg)
+
+    def transfer_receipt(self, receipt):
+        return self.trigger('transfer_receipt', receipt=receipt)
+
+    def swap_execution_msg(self, msg):
+        return self.trigger('swap_execution_msg', msg=msg)
 
     def spawn_timeout(self, event):
         maker_commitment_msg = event_get_msg_kwarg(event)
@@ -185,7 +295,7 @@ class SwapStateMachine(Machine):
 
     def accept_taker_commitment_from_receipt(self, event):
         transfer_receipt = event_get_receipt_kwarg(event)
-        taker_commitment = self.taker_commitment_pool[transfer_receipt.initiator]
+        taker_commitment = self.swap.taker_commitment_pool[transfer_receipt.initiator]
         self.swap.taker_commitment_msg = taker_commitment
 
     def sender_is_maker(self, event):
@@ -202,13 +312,19 @@ class SwapStateMachine(Machine):
 
     def sender_sent_taker_commitment(self, event):
         msg_or_receipt = event_get_msg_or_receipt_kwarg(event)
-        return msg_or_receipt.initiator in self.taker_commitment_pool
+        return msg_or_receipt.initiator in self.swap.taker_commitment_pool
 
     def queue_commitment(self, event):
         commitment_msg = event_get_msg_kwarg(event)
-        if commitment_msg.sender not in self.taker_commitment_pool:
-            self.taker_commitment_pool[commitment_msg.sender] = commitment_msg
+        if commitment_msg.sender not in self.swap.taker_commitment_pool:
+            self.swap.taker_commitment_pool[commitment_msg.sender] = commitment_msg
         else:
             # TODO
             # sent another message... what should we allow here? replace, ignore?
             pass
+
+
+SWAP_TRANSITION_TABLES = {
+    auto_spawn_timeout: compile_swap_transitions(SWAP_TRANSITIONS, auto_spawn_timeout)
+    for auto_spawn_timeout in (False, True)
+}
@@ -1,8 +1,27 @@
-import gevent
+import itertools
+import random
+import time
+from collections import OrderedDict
 
+import gevent
 import structlog
+from gevent.pool import Pool
+from gevent.queue import Empty
+from gevent.threadpool import ThreadPool
+from requests import RequestException
+
 from raidex import messages
 from raidex.utils import pex
+from raidex.utils.histogram import Histogram
+from raidex.constants import (
+    REFUND_MAX_IN_FLIGHT,
+    REFUND_TRANSFER_TIMEOUT,
+    REFUND_BACKOFF_BASE,
+    REFUND_BACKOFF_MAX,
+    SEND_BATCH_SIZE,
+    SEND_MAX_CONNECTIONS,
+    SIGN_POOL_SIZE,
+)
 
 from raidex.commitment_service.swap import SwapFactory
 from raidex.raidex_node.listener_tasks import ListenerTask
@@ -36,59 +55,282 @@ class QueueListenerTask(gevent.Greenlet):
         raise NotImplementedError
 
 
+def transfer_succeeded(result, timeout=REFUND_TRANSFER_TIMEOUT):
+    """
+    :param result: result of a trader client's `transfer_async`,
+                   an AsyncResult of the mocked trader or the response of the raiden api
+    """
+    if hasattr(result, 'get'):
+        result = result.get(timeout=timeout)
+    if isinstance(result, bool):
+        return result
+    return result.status_code == 200
+
+
 class RefundTask(QueueListenerTask):
-    def __init__(self, trader_client, refund_queue, commitment_token_address, fee_rate=None):
+    """
+    Transfers the refunds back to the commitment senders,
+    with at most `max_in_flight` transfers at a time.
+    Failed refunds are retried after an exponential backoff with jitter.
+
+    With `coalesce`, all refunds to the same recipient that wait for a free transfer slot
+    or a retry are transferred at once, with the identifier of the first one.
+    Only use it if the trader's recipients don't need one transfer per refunded commitment.
+    With a `store`, refunds are persisted until they were transferred and retried after a restart.
+    """
+
+    def __init__(self, trader_client, refund_queue, commitment_token_address, fee_rate=None,
+                 max_in_flight=REFUND_MAX_IN_FLIGHT, coalesce=False, store=None,
+                 backoff_base=REFUND_BACKOFF_BASE, backoff_max=REFUND_BACKOFF_MAX):
         self.refund_queue = refund_queue
         self.trader_client = trader_client
         self.commitment_token_address = commitment_token_address
         self.fee_rate = fee_rate
+        self.max_in_flight = max_in_flight
+        self.coalesce = coalesce
+        self.store = store
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._ids = itertools.count()
+        # recipient, or refund id without coalescing
+        # -> list of (refund id, refund, attempt) waiting for a transfer
+        self._pending = OrderedDict()
+        self._nof_transfers = 0
+        self.nof_in_flight = 0
+        self.nof_backing_off = 0
+        self.nof_refunded = 0
+        self.nof_failed_transfers = 0
         super(RefundTask, self).__init__(refund_queue)
 
+    def _run(self):
+        if self.store is not None:
+            outstanding = self.store.load()
+            if outstanding:
+                self._ids = itertools.count(max(outstanding) + 1)
+            for refund_id, refund in outstanding.items():
+                self._add(refund_id, refund, 0)
+            self._dispatch()
+        super(RefundTask, self)._run()
+
     def process(self, data):
         refund = data
+        refund_id = next(self._ids)
+        if self.store is not None:
+            self.store.add(refund_id, refund)
+        self._add(refund_id, refund, 0)
+        self._dispatch()
+
+    def gauges(self):
+        return dict(
+            refunds_in_flight=self.nof_in_flight,
+            refunds_pending=(sum(len(batch) for batch in self._pending.values()) +
+                             self.refund_queue.qsize()),
+            refunds_failed=self.nof_backing_off,
+            refunds_done=self.nof_refunded,
+            refund_transfers_failed=self.nof_failed_transfers,
+        )
+
+    def backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def amount(self, refund):
         amount = refund.receipt.amount
         if self.fee_rate is not None and refund.claim_fee is True:
             amount -= amount * self.fee_rate
-        transfer_async_result = self.trader_client.transfer_async(self.commitment_token_address,
-                                                                  refund.receipt.initiator,
-                                                                  amount,
-                                                                  refund.receipt.identifier)
-
-        def get_and_requeue(async_result, refund_, queue):
-            # FIXME this could block a greenlet forever, leaving the refund in nirvana
-            success = async_result.get()
-
-            if success.status_code == 200:
-                log_trader.debug('Refund successful {}'.format(refund_))
-            else:
-                queue.put(refund_)
-                log_trader.debug('Refunding failed for {}, retrying'.format(refund_))
-
-        # spawn so that we can process the next refunds in the queue
-        gevent.spawn(get_and_requeue, transfer_async_result, refund, self.refund_queue)
+        return amount
+
+    def _add(self, refund_id, refund, attempt):
+        key = refund.receipt.initiator if self.coalesce else refund_id
+        self._pending.setdefault(key, []).append((refund_id, refund, attempt))
+
+    def _dispatch(self):
+        while self._pending and self._nof_transfers < self.max_in_flight:
+            _, batch = self._pending.popitem(last=False)
+            self._nof_transfers += 1
+            self.nof_in_flight += len(batch)
+            gevent.spawn(self._transfer, batch)
+
+    def _transfer(self, batch):
+        receipt = batch[0][1].receipt
+        success = False
+        try:
+            amount = sum(self.amount(refund) for _, refund, _ in batch)
+            result = self.trader_client.transfer_async(self.commitment_token_address,
+                                                       receipt.initiator,
+                                                       amount,
+                                                       receipt.identifier)
+            success = transfer_succeeded(result)
+        except (RequestException, gevent.Timeout) as e:
+            log_trader.warning('Refund transfer failed', receipt=receipt, error=e)
+        except Exception as e:
+            # the refunds are retried like after any failed transfer,
+            # instead of being lost with the greenlet
+            log_trader.error('Refund transfer failed unexpectedly', receipt=receipt, error=repr(e))
+        finally:
+            self._nof_transfers -= 1
+            self.nof_in_flight -= len(batch)
+
+        if success:
+            log_trader.debug('Refund successful', receipt=receipt, nof_refunds=len(batch))
+            self.nof_refunded += len(batch)
+            if self.store is not None:
+                for refund_id, _, _ in batch:
+                    self.store.remove(refund_id)
+        else:
+            self.nof_failed_transfers += 1
+            attempt = max(attempt for _, _, attempt in batch) + 1
+            delay = self.backoff(attempt)
+            log_trader.debug('Refunding failed, retrying', receipt=receipt, attempt=attempt,
+                             delay=delay)
+            self.nof_backing_off += len(batch)
+            gevent.spawn_later(delay, self._retry, batch, attempt)
+        self._dispatch()
+
+    def _retry(self, batch, attempt):
+        self.nof_backing_off -= len(batch)
+        for refund_id, refund, _ in batch:
+            self._add(refund_id, refund, attempt)
+        self._dispatch()
 
 
 class MessageSenderTask(QueueListenerTask):
-
-    def __init__(self, message_broker, message_queue, sign_func):
+    """
+    Signs and sends the queued (message, recipient, enqueued_at) tuples,
+    recipient None is a broadcast.
+
+    The queue is drained in batches of up to `batch_size` messages. A batch is signed,
+    split over `sign_pool_size` threads if set,
+    while the requests of the previous batches are still in flight.
+    The messages of a batch are grouped by recipient and each group is sent with one bulk request,
+    if the broker supports it. At most `max_connections` requests are in flight, the messages for
+    one recipient are sent in the order they were queued.
+    """
+
+    def __init__(self, message_broker, message_queue, sign_func, batch_size=SEND_BATCH_SIZE,
+                 max_connections=SEND_MAX_CONNECTIONS, sign_pool_size=SIGN_POOL_SIZE):
         self.message_broker = message_broker
         self._sign_func = sign_func
+        self.batch_size = batch_size
+        self.sign_pool_size = sign_pool_size
+        # enqueue to acknowledgement by the broker
+        self.latency = Histogram()
+        self.nof_sent = 0
+        self.nof_failed = 0
+        self._requests = Pool(max_connections)
+        self._last_request = dict()  # recipient -> latest request greenlet for it
+        self._sign_pool = None
         super(MessageSenderTask, self).__init__(message_queue)
 
+    def _run(self):
+        if self.sign_pool_size > 0:
+            self._sign_pool = ThreadPool(self.sign_pool_size)
+        try:
+            while True:
+                self.process(self._next_batch())
+        finally:
+            if self._sign_pool is not None:
+                self._sign_pool.kill()
+
     def process(self, data):
-        msg, recipient = data
-        self._sign_func(msg)
-        # FIXME make async
+        batch = data
+        self._sign([msg for msg, _, _ in batch])
+
+        groups = OrderedDict()
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+        for recipient, group in groups.items():
+            # blocks while all connections are busy
+            request = self._requests.spawn(self._send, recipient, group,
+                                           self._last_request.get(recipient))
+            self._last_request[recipient] = request
+            request.link(lambda request_, recipient_=recipient:
+                         self._forget_request(recipient_, request_))
+
+    def gauges(self):
+        gauges = dict(
+            messages_sent=self.nof_sent,
+            messages_failed=self.nof_failed,
+            send_latency_count=self.latency.count,
+            send_latency_sum=self.latency.sum,
+        )
+        # cumulative like prometheus buckets, they add up over the shards of the service
+        for bound, count in self.latency.cumulative_counts():
+            gauges['send_latency_bucket_{:g}'.format(bound)] = count
+        return gauges
+
+    def _next_batch(self):
+        # no waiting for a full batch, the queue fills up while the previous batches are sent
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _sign(self, messages_):
+        if self._sign_pool is None or len(messages_) == 1:
+            for msg in messages_:
+                self._sign_func(msg)
+            return
+
+        def sign_all(chunk):
+            for msg in chunk:
+                self._sign_func(msg)
+
+        chunk_size = -(-len(messages_) // self.sign_pool_size)
+        results = [self._sign_pool.spawn(sign_all, messages_[index:index + chunk_size])
+                   for index in range(0, len(messages_), chunk_size)]
+        for result in results:
+            result.get()
+
+    def _send(self, recipient, group, previous_request):
+        if previous_request is not None:
+            previous_request.join()
+        messages_ = [msg for msg, _, _ in group]
+        recipient_repr = pex(recipient) if recipient else 'broadcast'
+
+        try:
+            statuses = self._request(recipient, messages_)
+        except RequestException as e:
+            self.nof_failed += len(messages_)
+            log_messaging.warning('Sending failed', recipient=recipient_repr,
+                                  nof_messages=len(messages_), error=e)
+            return
+
+        # messages the broker didn't accept count as failed, they are not part of the latency
+        acknowledged_at = time.monotonic()
+        nof_failed = 0
+        for (_, _, enqueued_at), status in zip(group, statuses):
+            if status:
+                self.latency.observe(acknowledged_at - enqueued_at)
+            else:
+                nof_failed += 1
+        self.nof_sent += len(messages_) - nof_failed
+        self.nof_failed += nof_failed
+        if nof_failed:
+            log_messaging.warning('Sending failed', recipient=recipient_repr,
+                                  nof_messages=nof_failed)
+        log_messaging.debug('Sending successful', recipient=recipient_repr,
+                            nof_messages=len(messages_) - nof_failed)
+
+    def _request(self, recipient, messages_):
+        """:return: the send status of every message"""
         # recipient == None is indicating a broadcast
+        if len(messages_) > 1 and hasattr(self.message_broker, 'send_bulk'):
+            if recipient is None:
+                statuses = self.message_broker.broadcast_bulk(messages_)
+            else:
+                statuses = self.message_broker.send_bulk(recipient, messages_)
+            return statuses if statuses is not None else [False] * len(messages_)
         if recipient is None:
-            success = self.message_broker.broadcast(msg)
-            if success is True:
-                log_messaging.debug('Broadcast successful: {}'.format(msg))
-        else:
+            return [self.message_broker.broadcast(msg) for msg in messages_]
+        return [self.message_broker.send(topic=recipient, message=msg) for msg in messages_]
 
-            success = self.message_broker.send(topic=recipient, message=msg)
-            if success is True:
-                log_messaging.debug('Sending successful: {} // recipient={}'.format(msg, pex(recipient)))
+    def _forget_request(self, recipient, request):
+        if self._last_request.get(recipient) is request:
+            del self._last_request[recipient]
 
 
 class TransferReceivedTask(ListenerTask):
@@ -1,5 +1,5 @@
 from eth_utils import keccak
-from raidex.raidex_node.matching.matching_algorithm import match_limit
+from raidex.raidex_node.matching.matching_algorithm import match_limit_crossing
 
 EMPTY_SECRET = bytes(32)
 EMPTY_SECRET_KECCAK = keccak(EMPTY_SECRET)
@@ -7,11 +7,86 @@ EMPTY_SECRET_KECCAK = keccak(EMPTY_SECRET)
 DEFAULT_OFFER_LIFETIME = 60
 # seconds until timeout  external offer is seen as valid
 OFFER_THRESHOLD_TIME = 10
+# max seconds between the evictions of timed out offers from the offer book, and the offers evicted
+# at once before other greenlets get to run
+OFFER_EVICTION_INTERVAL = 1
+OFFER_EVICTION_BATCH_SIZE = 256
 
 
 RAIDEN_POLL_INTERVAL = 1
+# raiden payment events are polled in pages of RAIDEN_POLL_PAGE_SIZE events, the poll interval
+# grows from RAIDEN_POLL_INTERVAL up to RAIDEN_POLL_MAX_INTERVAL seconds while no new events arrive
+RAIDEN_POLL_MAX_INTERVAL = 8
+RAIDEN_POLL_PAGE_SIZE = 500
+# ids of received payment events are remembered for RAIDEN_DEDUPE_WINDOW seconds,
+# at most RAIDEN_DEDUPE_SIZE of them
+RAIDEN_DEDUPE_WINDOW = 600
+RAIDEN_DEDUPE_SIZE = 10000
 
-MATCHING_ALGORITHM = match_limit
+MATCHING_ALGORITHM = match_limit_crossing
+
+# fsync the state change journal after this many records or seconds, whatever comes first
+JOURNAL_FSYNC_BATCH_SIZE = 100
+JOURNAL_FSYNC_INTERVAL = 1
+# number of recovered message senders kept in memory, by signature and message hash
+SENDER_CACHE_SIZE = 8192
+
+# incoming offers are verified in batches of up to VERIFY_BATCH_SIZE messages, waiting at most
+# VERIFY_MAX_WAIT seconds to fill a batch, on VERIFY_POOL_SIZE threads
+VERIFY_BATCH_SIZE = 64
+VERIFY_MAX_WAIT = 0.01
+VERIFY_POOL_SIZE = 4
+
+# keep-alive connection pools of the broker and trader clients
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+HTTP_MAX_RETRIES = 1
+# (connect, read) timeout in seconds, streaming requests have no read timeout
+HTTP_TIMEOUT = (3.05, 30)
+
+# resolutions in seconds of the incrementally aggregated price chart candles,
+# and the number of candles kept per resolution
+CANDLE_RESOLUTIONS = (10, 60, 300, 3600)
+CANDLE_HISTORY = 1024
+
+# price precisions (digits after the decimal point)
+# the market depth of the offer book is aggregated for
+DEPTH_PRECISIONS = (0, 1, 2, 3)
+
+# pending deltas per client of the streaming market feed, slower clients are disconnected,
+# and the seconds after which an idle stream gets an empty keepalive line
+FEED_QUEUE_SIZE = 1000
+FEED_KEEPALIVE_INTERVAL = 15
+
+# seconds after which an idle topic stream of the message broker server gets a keepalive item,
+# and the seconds after which a topic stream which was never connected is closed
+STREAM_KEEPALIVE_INTERVAL = 15
+STREAM_CONNECT_TIMEOUT = 30
+
+# seconds without any item after which a client considers its topic stream broken,
+# and the backoff of its reconnection attempts, doubling from the base up to the max seconds
+STREAM_READ_TIMEOUT = 3 * STREAM_KEEPALIVE_INTERVAL
+STREAM_RECONNECT_BACKOFF_BASE = 0.5
+STREAM_RECONNECT_BACKOFF_MAX = 30
+
+# pending messages per subscriber of the message broker server,
+# what happens when a subscriber doesn't keep up ('block', 'drop_oldest', 'disconnect' or
+# 'snapshot'), and the seconds a blocked publisher waits before the subscriber is disconnected.
+# The default doesn't lose messages, subscribers which can reload their state opt in to the
+# lossy policies. With 'block' a publisher waits for every stalled subscriber in turn, a POST
+# to a topic with n stalled subscribers takes up to n * BROKER_BLOCK_TIMEOUT seconds
+BROKER_QUEUE_SIZE = 1000
+BROKER_QUEUE_POLICY = 'block'
+BROKER_BLOCK_TIMEOUT = 5
+
+# bytes of a segment file of the broadcast log of the message broker server,
+# and the seconds after which logged messages other than offers expire,
+# offers expire with their timeout
+BROADCAST_LOG_SEGMENT_SIZE = 16 * 1024 * 1024
+BROADCAST_LOG_RETENTION = 3600
+
+# number of handled state changes after which a new snapshot of the node state is written
+SNAPSHOT_INTERVAL = 1000
 
 
 DEFAULT_TESTNET = 'GOERLI'
@@ -37,3 +112,25 @@ GOERLI_RXT_ADDRESS = '0xe6ff467647e65e80e70597fC43a74Ea698c678A2'
 
 CS_ADDRESS = '0xEDC5f296a70096EB49f55681237437cbd249217A'
 COMMITMENT_AMOUNT = pow(10, 18)
+
+# the commitment service has at most REFUND_MAX_IN_FLIGHT refund transfers in flight,
+# waits at most REFUND_TRANSFER_TIMEOUT seconds for a transfer
+# and retries failed refunds after an exponential backoff,
+# starting at REFUND_BACKOFF_BASE and growing up to REFUND_BACKOFF_MAX seconds
+REFUND_MAX_IN_FLIGHT = 8
+REFUND_TRANSFER_TIMEOUT = 60
+REFUND_BACKOFF_BASE = 1
+REFUND_BACKOFF_MAX = 300
+
+# the commitment service signs its queued messages in batches of up to SEND_BATCH_SIZE messages,
+# on SIGN_POOL_SIZE threads (0 signs in the sending greenlet), and has at most SEND_MAX_CONNECTIONS
+# requests to the message broker in flight
+SEND_BATCH_SIZE = 64
+SEND_MAX_CONNECTIONS = 8
+SIGN_POOL_SIZE = 0
+
+# the shards of a sharded commitment service report their metrics
+# every SHARD_METRICS_INTERVAL seconds, a shard which exited is restarted
+# after SHARD_RESTART_DELAY seconds
+SHARD_METRICS_INTERVAL = 1
+SHARD_RESTART_DELAY = 1
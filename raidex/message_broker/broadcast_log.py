@@ -0,0 +1,265 @@
+"""
+Durable log of the broadcast messages of the message broker server,
+from which subscribers can replay.
+
+Every broadcast gets a monotonic offset and is appended to the active segment,
+a preallocated memory-mapped file named after the offset of its first record.
+Records are `kind (1 byte) | offset (8) | expires (8) | length (4) | data`,
+the kind tells whether the data is a binary frame or a JSON envelope,
+a zero kind marks the unwritten rest of a segment.
+
+Offers expire with their timeout, all other messages after the retention period.
+Expired records are skipped on replay,
+segments of only expired records are deleted when the active segment is rolled over.
+"""
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+
+import rlp
+import structlog
+from eth_utils import big_endian_to_int
+from gevent.event import Event
+
+from raidex.messages import Envelope, ProvenOffer, SwapOffer, cmdid_types_map
+from raidex.utils import timestamp
+from raidex.constants import BROADCAST_LOG_SEGMENT_SIZE, BROADCAST_LOG_RETENTION
+
+log = structlog.get_logger('message_broker.broadcast_log')
+
+RECORD_HEADER = struct.Struct('>BQQI')
+
+BYTES = 1
+TEXT = 2
+
+SEGMENT_FILE = '{:020d}.log'
+
+# positions of the offer in a ProvenOffer and of the timeout in a SwapOffer, to read the timeout
+# from the decoded rlp lists without deserializing the messages
+OFFER_INDEX = [name for name, _ in ProvenOffer.fields].index('offer')
+TIMEOUT_INDEX = [name for name, _ in SwapOffer.fields].index('timeout')
+
+
+def expiry_of(data, default):
+    """:return: the timeout of an offer in milliseconds, `default` for every other message"""
+    try:
+        frame = Envelope.to_frame(data)
+        version, cmdid, length = Envelope.read_frame_header(frame)
+        message_class = cmdid_types_map.get(cmdid)
+        if version != Envelope.binary_version or message_class not in (ProvenOffer, SwapOffer):
+            return default
+        fields = rlp.decode(frame[Envelope.frame_header.size:Envelope.frame_header.size + length])
+        if message_class is ProvenOffer:
+            fields = fields[OFFER_INDEX]
+        return big_endian_to_int(fields[TIMEOUT_INDEX])
+    except (ValueError, IndexError, TypeError, rlp.exceptions.RLPException):
+        return default
+
+
+class Segment(object):
+    """A memory-mapped file of records, holding the consecutive offsets from `base_offset` on"""
+
+    def __init__(self, path, base_offset, size):
+        self.path = path
+        self.base_offset = base_offset
+        if not os.path.exists(path):
+            with open(path, 'wb') as segment_file:
+                segment_file.truncate(size)
+        self._file = open(path, 'r+b')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), self.size)
+        self.positions = array('Q')  # offset - base_offset -> position of the record
+        self.end = 0
+        self.max_expires = 0
+        self.closed = False
+        self._recover()
+
+    def _recover(self):
+        """
+        indexes the records already written,
+        stops at the unwritten or a torn rest of the segment
+        """
+        while self.end + RECORD_HEADER.size <= self.size:
+            kind, offset, expires, length = RECORD_HEADER.unpack_from(self._mmap, self.end)
+            record_end = self.end + RECORD_HEADER.size + length
+            if kind not in (BYTES, TEXT) or offset != self.next_offset or record_end > self.size:
+                break
+            self.positions.append(self.end)
+            self.max_expires = max(self.max_expires, expires)
+            self.end = record_end
+
+    @property
+    def next_offset(self):
+        return self.base_offset + len(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def append(self, kind, expires, payload):
+        """:return: False if the record doesn't fit into the segment anymore"""
+        record_end = self.end + RECORD_HEADER.size + len(payload)
+        if record_end > self.size:
+            return False
+        RECORD_HEADER.pack_into(self._mmap, self.end, kind, self.next_offset, expires,
+                                len(payload))
+        self._mmap[self.end + RECORD_HEADER.size:record_end] = payload
+        self.positions.append(self.end)
+        self.max_expires = max(self.max_expires, expires)
+        self.end = record_end
+        return True
+
+    def record(self, offset):
+        """:return: (expires, data) of the record"""
+        position = self.positions[offset - self.base_offset]
+        kind, _, expires, length = RECORD_HEADER.unpack_from(self._mmap, position)
+        data = self._mmap[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+        return expires, data if kind == BYTES else data.decode('utf-8')
+
+    def flush(self):
+        if not self.closed:
+            self._mmap.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+
+    def delete(self):
+        self.close()
+        os.remove(self.path)
+
+
+class BroadcastLog(object):
+    """
+    Append-only, segmented log of the broadcast messages.
+
+    The written records are in the page cache immediately and survive a crash of the server,
+    `flush` writes them to disk.
+    """
+
+    def __init__(self, directory, segment_size=BROADCAST_LOG_SEGMENT_SIZE,
+                 retention=BROADCAST_LOG_RETENTION):
+        """
+        :param segment_size: bytes of a segment file
+        :param retention: seconds after which messages other than offers expire
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.retention = retention
+        self.segments = list()
+        self._appended = Event()
+
+        os.makedirs(directory, exist_ok=True)
+        base_offsets = sorted(int(name[:-len('.log')]) for name in os.listdir(directory)
+                              if name.endswith('.log'))
+        for base_offset in base_offsets:
+            if self.segments and base_offset != self.segments[-1].next_offset:
+                # a segment was torn, the offsets of the following ones would not be consecutive
+                log.warning('Broadcast log not consecutive, ignoring the following segments',
+                            offset=base_offset)
+                break
+            self.segments.append(Segment(self._path(base_offset), base_offset, segment_size))
+        if not self.segments:
+            self.segments.append(Segment(self._path(0), 0, segment_size))
+        self._base_offsets = [segment.base_offset for segment in self.segments]
+
+    def _path(self, base_offset):
+        return os.path.join(self.directory, SEGMENT_FILE.format(base_offset))
+
+    @property
+    def start_offset(self):
+        return self.segments[0].base_offset
+
+    @property
+    def next_offset(self):
+        return self.segments[-1].next_offset
+
+    def append(self, data, now=None):
+        """
+        :param data: binary frame or JSON envelope of the broadcast message
+        :return: offset of the message
+        """
+        if now is None:
+            now = timestamp.time()
+        expires = expiry_of(data, now + int(timestamp.to_milliseconds(self.retention)))
+        if isinstance(data, (bytes, bytearray)):
+            kind, payload = BYTES, bytes(data)
+        else:
+            kind, payload = TEXT, data.encode('utf-8')
+
+        offset = self.next_offset
+        if not self.segments[-1].append(kind, expires, payload):
+            self._roll(RECORD_HEADER.size + len(payload), now)
+            self.segments[-1].append(kind, expires, payload)
+
+        # waiting readers hold the previous event, which stays set
+        appended, self._appended = self._appended, Event()
+        appended.set()
+        return offset
+
+    def _roll(self, record_size, now):
+        self.segments[-1].flush()
+        segment = Segment(self._path(self.next_offset), self.next_offset,
+                          max(self.segment_size, record_size))
+        self.segments.append(segment)
+        self._base_offsets.append(segment.base_offset)
+        self.enforce_retention(now)
+
+    def enforce_retention(self, now=None):
+        """
+        deletes the oldest segments while all of their records expired,
+        the active segment is kept
+        """
+        if now is None:
+            now = timestamp.time()
+        while len(self.segments) > 1 and self.segments[0].max_expires < now:
+            segment = self.segments.pop(0)
+            self._base_offsets.pop(0)
+            segment.delete()
+
+    def read(self, from_offset=0, until_offset=None, now=None):
+        """
+        Yields (offset, data) of the messages, from `from_offset` or the oldest retained one on,
+        up to `until_offset` (exclusive) or the last one appended. Expired messages are skipped.
+        """
+        if now is None:
+            now = timestamp.time()
+        offset = from_offset
+        while True:
+            # the oldest segments can be deleted by the retention in between
+            offset = max(offset, self.start_offset)
+            end_offset = self.next_offset
+            if until_offset is not None:
+                end_offset = min(until_offset, end_offset)
+            if offset >= end_offset:
+                return
+            segment = self.segments[bisect_right(self._base_offsets, offset) - 1]
+            if segment.closed:
+                return  # the log was closed
+            for offset in range(offset, min(segment.next_offset, end_offset)):
+                if segment.closed:
+                    break
+                expires, data = segment.record(offset)
+                if expires >= now:
+                    yield offset, data
+            else:
+                offset += 1
+
+    def wait(self, offset, timeout=None):
+        """:return: True when the message with the offset was appended, False after the timeout"""
+        if offset >= self.next_offset:
+            self._appended.wait(timeout)
+        return offset < self.next_offset
+
+    def flush(self):
+        for segment in self.segments:
+            segment.flush()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
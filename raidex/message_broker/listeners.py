@@ -4,6 +4,7 @@ from raidex import messages
 from raidex.raidex_node.offer_book import OfferBookEntry
 from raidex.raidex_node.order.offer import OfferType, BasicOffer
 from raidex.raidex_node.trades import SwapCompleted
+from raidex.utils.signature_verifier import SignatureVerifier
 
 
 @contextmanager
@@ -14,7 +15,15 @@ def listener_context(listener_task):
 
 
 class MessageListener(object):
-    """Represents a listener currently listening for new messages"""
+    """Represents a listener currently listening for new messages
+
+    Subclasses declare the `message_types` they are interested in,
+    the broker only hands them messages of these classes.
+    A `_transform` that doesn't depend on the listener instance should be a staticmethod,
+    the broker calls it once per message for all listeners sharing it.
+    """
+
+    message_types = None
 
     def __init__(self, message_broker, topic='broadcast'):
         # type: (MessageBroker, str) -> None
@@ -30,6 +39,17 @@ class MessageListener(object):
         """
         return self.listener.message_queue_async.get(*args, **kwargs)
 
+    def get_all(self, *args, **kwargs):
+        """Gets all pending messages, blocks until there is at least one
+
+        can only be called after start()
+        For parameters see get()
+        """
+        queue = self.listener.message_queue_async
+        pending = [queue.get(*args, **kwargs)]
+        pending.extend(queue.get_nowait() for _ in range(queue.qsize()))
+        return pending
+
     def get_once(self):
         """starts the listener, returns one value, and stops"""
         self.start()
@@ -40,7 +60,8 @@ class MessageListener(object):
     def start(self):
         """Starts listening for new messages"""
 
-        self.listener = self.message_broker.listen_on(self.topic, self._transform)
+        self.listener = self.message_broker.listen_on(self.topic, self._transform,
+                                                      message_types=self.message_types)
         print(f"LISTEN ON TOPIC: {self.topic} , {self.__class__.__name__}")
 
     def stop(self):
@@ -48,20 +69,21 @@ class MessageListener(object):
         if self.listener is not None:
             self.message_broker.stop_listen(self.listener)
 
-    def _transform(self, message):
-        return message
+    # messages are passed as they are
+    _transform = None
 
 
 class TakerListener(MessageListener):
     """Listens for the Taker of the offer"""
 
+    message_types = messages.ProvenOffer
+
     def __init__(self, offer, message_broker):
         self.offer = offer
         MessageListener.__init__(self, message_broker, message_broker.address)
 
     def _transform(self, message):
-        if isinstance(message,
-                      messages.ProvenOffer) and message.offer.offer_id == self.offer.offer_id:  # TODO check more
+        if message.offer.offer_id == self.offer.offer_id:  # TODO check more
             return message
         else:
             return None
@@ -69,28 +91,26 @@ class TakerListener(MessageListener):
 
 class CancellationListener(MessageListener):
 
+    message_types = messages.CancellationProof  # TODO check more
+
     def __init__(self, offer, message_broker):
         self.offer = offer
         MessageListener.__init__(self, message_broker, message_broker.address)
 
-    def _transform(self, message):
-        if isinstance(message,
-                      messages.CancellationProof):  # TODO check more
-            return message
-        else:
-            return None
-
 
 class OfferListener(MessageListener):
     """Listens for new offers"""
 
+    message_types = messages.ProvenOffer
+
     def __init__(self, market, message_broker, topic='broadcast'):
         self.market = market
         MessageListener.__init__(self, message_broker, topic)
 
     def _transform(self, message):
-        if not isinstance(message, messages.ProvenOffer):
-            return None
+        return self.create_offer_entry(message, message.sender)
+
+    def create_offer_entry(self, message, initiator):
         offer_msg = message.offer
 
         ask_token = offer_msg.ask_token
@@ -112,62 +132,76 @@ class OfferListener(MessageListener):
                            timeout_date=offer_msg.timeout)
 
         commitment_proof = message.commitment_proof
-        initiator = message.sender
         return OfferBookEntry(offer, initiator, commitment_proof)
 
 
+class VerifiedOfferListener(OfferListener):
+    """Listens for new offers, the senders are recovered in batches by a SignatureVerifier"""
+
+    def __init__(self, market, message_broker, topic='broadcast', **verifier_kwargs):
+        self.verifier_kwargs = verifier_kwargs
+        self.verifier = None
+        OfferListener.__init__(self, market, message_broker, topic)
+
+    def get(self, *args, **kwargs):
+        message, sender = self.verifier.get(*args, **kwargs)
+        return self.create_offer_entry(message, sender)
+
+    def start(self):
+        OfferListener.start(self)
+        self.verifier = SignatureVerifier(self.listener.message_queue_async.get,
+                                          **self.verifier_kwargs)
+        self.verifier.start()
+
+    def stop(self):
+        if self.verifier is not None:
+            self.verifier.kill()
+        OfferListener.stop(self)
+
+    # the offer entries are created once the senders are recovered
+    _transform = None
+
+
 class OfferTakenListener(MessageListener):
     """Listens for Taken Messages"""
 
-    def _transform(self, message):
-        if not isinstance(message, messages.OfferTaken):
-            return None
+    message_types = messages.OfferTaken
+
+    @staticmethod
+    def _transform(message):
         return message.offer_id
 
 
 class SwapExecutionListener(MessageListener):
 
-    def _transform(self, message):
-        if not isinstance(message, messages.SwapExecution):
-            return None
-        return message
+    message_types = messages.SwapExecution
 
 
 class TakerCommitmentListener(MessageListener):
 
-    def _transform(self, message):
-        if not isinstance(message, messages.Commitment):
-            return None
-        return message
+    message_types = messages.Commitment
+
 
 class CancellationListener(MessageListener):
 
-    def _transform(self, message):
-        if not isinstance(message, messages.Cancellation):
-            return None
-        return message
+    message_types = messages.Cancellation
 
 
 class CommitmentListener(MessageListener):
 
-    def _transform(self, message):
-        if not isinstance(message, messages.Commitment):
-            return None
-        return message
+    message_types = messages.Commitment
 
 
 class SwapCompletedListener(MessageListener):
     """ Listens for Completed Swaps to fill the Trade-book"""
 
-    def _transform(self, message):
-        if not isinstance(message, messages.SwapCompleted):
-            return None
+    message_types = messages.SwapCompleted
+
+    @staticmethod
+    def _transform(message):
         return SwapCompleted(message.offer_id, message.timestamp)
 
 
 class CommitmentProofListener(MessageListener):
 
-    def _transform(self, message):
-        if not isinstance(message, (messages.CommitmentProof, messages.CancellationProof)):
-            return None
-        return message
+    message_types = (messages.CommitmentProof, messages.CancellationProof)
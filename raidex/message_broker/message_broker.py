@@ -1,17 +1,87 @@
-from collections import namedtuple, defaultdict
-from eth_utils import encode_hex
+from collections import namedtuple
 import structlog
 from gevent.queue import Queue
 
 log = structlog.get_logger('message_broker.global')
 
-Listener = namedtuple('Listener', 'topic message_queue_async transform')
+
+class Listener(namedtuple('Listener', 'topic message_queue_async transform message_types')):
+    """
+    transform: None to receive the messages as they are
+    message_types: class or tuple of classes of the messages the listener accepts,
+                   None accepts every message
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, topic, message_queue_async, transform=None, message_types=None):
+        return super(Listener, cls).__new__(cls, topic, message_queue_async, transform,
+                                            message_types)
+
+
+class TopicListeners(object):
+    """
+    The listeners of a topic, indexed by the message classes they accept.
+
+    A message is only offered to the listeners accepting its class.
+    Listeners sharing the same transform, e.g. a staticmethod of a listener class,
+    get the result of a single transform call.
+    """
+
+    def __init__(self):
+        self.listeners = list()
+        self._by_class = dict()
+
+    def __len__(self):
+        return len(self.listeners)
+
+    def __iter__(self):
+        return iter(self.listeners)
+
+    def add(self, listener):
+        self.listeners.append(listener)
+        self._by_class.clear()
+
+    def remove(self, listener):
+        self.listeners.remove(listener)
+        self._by_class.clear()
+
+    def for_class(self, message_class):
+        try:
+            return self._by_class[message_class]
+        except KeyError:
+            accepting = tuple(listener for listener in self.listeners
+                              if listener.message_types is None or
+                              issubclass(message_class, listener.message_types))
+            self._by_class[message_class] = accepting
+            return accepting
+
+    def dispatch(self, message):
+        """:return: number of listeners the message was put to"""
+        listeners = self.for_class(message.__class__)
+        results = dict() if len(listeners) > 1 else None
+        nof_delivered = 0
+        for listener in listeners:
+            transform = listener.transform
+            if transform is None:
+                transformed_message = message
+            elif results is None:
+                transformed_message = transform(message)
+            else:
+                try:
+                    transformed_message = results[transform]
+                except KeyError:
+                    transformed_message = results[transform] = transform(message)
+            if transformed_message is not None:
+                listener.message_queue_async.put(transformed_message)
+                nof_delivered += 1
+        return nof_delivered
 
 
 class MessageBroker(object):
 
     def __init__(self):
-        self.listeners = defaultdict(list)
+        self.listeners = dict()  # topic -> TopicListeners
 
     def send(self, topic, message):
         # HACK, allow 'broadcast' as non-binary input, everything else should be
@@ -21,46 +91,48 @@ class MessageBroker(object):
         return self._send(topic, message)
 
     def _send(self, topic, message):
-        queues = self.listeners[topic]
+        topic_listeners = self.listeners.get(topic)
         # DEBUGGING check - provide log output to easily check if an expected listener is not listening
         # this is not always harmful but can help debugging
-        if not queues:
-            log.debug('DEBUG-CODE: no listener waiting on topic {}, msg={}'.format(topic, message))
+        if not topic_listeners:
+            log.debug('DEBUG-CODE: no listener waiting on topic', topic=topic, msg=message)
             # XXX: in the mock implementation we know if someone is listening or not,
             # even if it's a broadcasting scheme but in real life we don't know that
             # TODO: use direct communication without message-broker later on
             return False
-        for listener in queues:
-            topic, message_queue_async, transform = listener
-            transformed_message = message
-            if transform is not None:
-                transformed_message = transform(transformed_message)
-            if transformed_message is not None:
-                if not isinstance(topic, str):
-                    encode_hex(topic)
-                log.debug('Sending message: msg={}, topic={}'.format(message, topic))
-                message_queue_async.put(transformed_message)
+        nof_delivered = topic_listeners.dispatch(message)
+        if nof_delivered:
+            log.debug('Sending message', msg=message, topic=topic, nof_listeners=nof_delivered)
         return True
 
-    def listen_on(self, topic, transform=None):
+    def listen_on(self, topic, transform=None, message_types=None, message_queue_async=None):
+        """
+        :param message_queue_async: queue the messages are put to,
+                                    e.g. shared by the listeners of several topics,
+                                    a new one by default
+        """
         # HACK, allow 'broadcast' as non-binary input, everything else should be
         # binary data/ decoded addresses
         if topic == 'broadcast':
-            return self.listen_on_broadcast(transform)
-        return self._listen_on(topic, transform)
+            return self.listen_on_broadcast(transform, message_types, message_queue_async)
+        return self._listen_on(topic, transform, message_types, message_queue_async)
 
-    def _listen_on(self, topic, transform=None):
-        message_queue_async = Queue()
+    def _listen_on(self, topic, transform=None, message_types=None, message_queue_async=None):
+        if message_queue_async is None:
+            message_queue_async = Queue()
 
-        listener = Listener(topic, message_queue_async, transform)
-        self.listeners[topic].append(listener)
+        listener = Listener(topic, message_queue_async, transform, message_types)
+        topic_listeners = self.listeners.get(topic)
+        if topic_listeners is None:
+            topic_listeners = self.listeners[topic] = TopicListeners()
+        topic_listeners.add(listener)
         return listener
 
     def broadcast(self, message):
         return self._send('broadcast', message)
 
-    def listen_on_broadcast(self, transform=None):
-        return self._listen_on('broadcast', transform)
+    def listen_on_broadcast(self, transform=None, message_types=None, message_queue_async=None):
+        return self._listen_on('broadcast', transform, message_types, message_queue_async)
 
     def stop_listen(self, listener):
         self.listeners[listener.topic].remove(listener)
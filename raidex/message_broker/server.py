@@ -2,14 +2,27 @@
 
 from gevent import monkey; monkey.patch_all()
 
+import argparse
 import json
+import socket
 
 from flask import Flask, jsonify, request, Response
-from gevent.pywsgi import WSGIServer
+import gevent
+from gevent.pywsgi import WSGIServer, WSGIHandler
+from gevent.queue import Queue, Empty, Full
 
 from eth_utils import decode_hex
 from raidex.message_broker.message_broker import MessageBroker
-from raidex.message_broker.listeners import MessageListener
+from raidex.messages import Envelope
+from raidex.message_broker import stream
+from raidex.message_broker.broadcast_log import BroadcastLog
+from raidex.constants import (
+    STREAM_KEEPALIVE_INTERVAL,
+    STREAM_CONNECT_TIMEOUT,
+    BROKER_QUEUE_SIZE,
+    BROKER_QUEUE_POLICY,
+    BROKER_BLOCK_TIMEOUT
+)
 
 import structlog
 
@@ -19,40 +32,461 @@ app = Flask(__name__)
 message_broker = MessageBroker()
 
 nof_listeners = 0
+streams = dict()  # stream id -> TopicStream
+subscriptions = set()
+broadcast_log = None  # BroadcastLog, if the broadcasts are logged
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DISCONNECT = 'disconnect'
+SNAPSHOT = 'snapshot'
+POLICIES = (BLOCK, DROP_OLDEST, DISCONNECT, SNAPSHOT)
+
+# markers yielded by Subscription.items, between the messages
+SNAPSHOT_MARKER = object()
+KEEPALIVE_MARKER = object()
+_CLOSED = object()
+
+
+class NoDelayHandler(WSGIHandler):
+    """
+    Disables Nagle's algorithm,
+    otherwise every response on a keep-alive connection waits for the delayed ACK
+    """
+
+    def handle(self):
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super(NoDelayHandler, self).handle()
+
+
+class Subscription(object):
+    """
+    The pending messages of one subscriber, at most `queue_size` of them.
+
+    The policy decides what happens to a message for a subscriber which doesn't keep up:
+        block:          the publisher waits for space,
+                        after `block_timeout` seconds the subscriber is disconnected
+        drop_oldest:    the oldest pending message is dropped
+        disconnect:     the subscriber is disconnected,
+                        the client reconnects and loses the messages in between
+        snapshot:       the backlog is dropped and replaced by a snapshot marker,
+                        the subscriber reloads its state instead of working through stale messages
+    """
+
+    def __init__(self, name, queue_size=BROKER_QUEUE_SIZE, policy=BROKER_QUEUE_POLICY,
+                 block_timeout=BROKER_BLOCK_TIMEOUT):
+        self.name = name
+        self.queue = Queue(maxsize=queue_size)
+        self.policy = None
+        self.block_timeout = block_timeout
+        self.closed = False
+        self.nof_delivered = 0
+        self.nof_dropped = 0
+        self.nof_snapshots = 0
+        self.max_lag = 0
+        self.configure(queue_size, policy)
+
+    def configure(self, queue_size=None, policy=None):
+        queue_size = queue_size if queue_size is not None else self.queue.maxsize
+        policy = policy if policy is not None else self.policy
+        if policy not in POLICIES:
+            raise ValueError('Unknown policy: {}'.format(policy))
+        # the snapshot marker and the message following it need space
+        if queue_size < (2 if policy == SNAPSHOT else 1):
+            raise ValueError('Queue size too small: {}'.format(queue_size))
+        self.queue.maxsize = queue_size
+        self.policy = policy
+
+    @property
+    def lag(self):
+        return self.queue.qsize()
+
+    def put(self, item):
+        if self.closed:
+            self.nof_dropped += 1
+            return
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self._overflow(item)
+        self.max_lag = max(self.max_lag, self.queue.qsize())
+
+    def _overflow(self, item):
+        if self.policy == BLOCK:
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+                return
+            except Full:
+                if self.closed:
+                    self.nof_dropped += 1
+                    return
+        elif self.policy == DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.put_nowait(item)
+            self.nof_dropped += 1
+            return
+        elif self.policy == SNAPSHOT:
+            nof_dropped = self._drain()
+            self.queue.put_nowait(SNAPSHOT_MARKER)
+            self.queue.put_nowait(item)
+            self.nof_dropped += nof_dropped
+            self.nof_snapshots += 1
+            log.warning('Subscriber lagging, replaced its backlog by a snapshot',
+                        subscription=self.name, nof_dropped=nof_dropped)
+            return
+        log.warning('Subscriber lagging, disconnecting', subscription=self.name)
+        self.nof_dropped += 1
+        self.close()
+
+    def _drain(self):
+        nof_drained = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                return nof_drained
+            nof_drained += 1
+
+    def close(self):
+        """ends the items, pending messages are dropped"""
+        if self.closed:
+            return
+        self.closed = True
+        self.nof_dropped += self._drain()
+        self.queue.put_nowait(_CLOSED)
+
+    def items(self, keepalive_interval=None):
+        """
+        Yields the pending messages and markers,
+        a keepalive marker if nothing happened within the interval
+        """
+        while True:
+            try:
+                item = self.queue.get(timeout=keepalive_interval)
+            except Empty:
+                yield KEEPALIVE_MARKER
+                continue
+            if item is _CLOSED:
+                return
+            if item is not SNAPSHOT_MARKER:
+                self.nof_delivered += 1
+            yield item
+
+    def metrics(self):
+        return dict(
+            name=self.name,
+            policy=self.policy,
+            queue_size=self.queue.maxsize,
+            lag=self.lag,
+            max_lag=self.max_lag,
+            delivered=self.nof_delivered,
+            dropped=self.nof_dropped,
+            snapshots=self.nof_snapshots,
+            closed=self.closed,
+        )
+
+
+def subscription_options(args):
+    """:return: the queue size and policy a subscriber asked for, None for the defaults"""
+    queue_size = args.get('queue_size')
+    policy = args.get('policy')
+    if queue_size is not None:
+        try:
+            queue_size = int(queue_size)
+        except ValueError:
+            raise ValueError('Invalid queue size: {}'.format(queue_size))
+    if policy is not None and policy not in POLICIES:
+        raise ValueError('Unknown policy: {}'.format(policy))
+    return queue_size, policy
+
+
+def replay(topic, from_offset, binary, follow=True):
+    """
+    Streams the logged broadcasts from the offset on,
+    followed by the new ones as they are logged if `follow` is set
+    """
+    try:
+        from_offset = replay_offset(topic, from_offset)
+    except ValueError as e:
+        return make_error(400, str(e))
+    if binary:
+        return Response(replay_frames(from_offset, follow),
+                        content_type='application/octet-stream')
+    return Response(replay_lines(from_offset, follow), content_type='application/x-json-stream')
+
+
+def replay_offset(topic, from_offset):
+    """
+    :return: the offset to replay the topic from,
+             ValueError if the topic can't be replayed from it
+    """
+    if topic != 'broadcast' or broadcast_log is None:
+        raise ValueError('Only logged broadcasts can be replayed')
+    try:
+        return int(from_offset)
+    except ValueError:
+        raise ValueError('Invalid offset: {}'.format(from_offset))
+
+
+def logged_broadcasts(from_offset, follow=True, keepalive_interval=STREAM_KEEPALIVE_INTERVAL):
+    """
+    Yields (offset, message) of the logged broadcasts from the offset on,
+    waiting for the new ones if `follow` is set.
+    Yields (None, None) if no broadcast was logged within the keepalive interval.
+    """
+    if not follow:
+        for item in broadcast_log.read(from_offset):
+            yield item
+        return
+    offset = from_offset
+    while True:
+        end_offset = broadcast_log.next_offset
+        for item in broadcast_log.read(offset, end_offset):
+            yield item
+        offset = max(end_offset, offset)
+        if not broadcast_log.wait(offset, timeout=keepalive_interval):
+            yield None, None
+
+
+def replay_lines(from_offset, follow):
+    # the lines carry the offsets to resume from, empty ones keep the connection alive
+    for offset, message in logged_broadcasts(from_offset, follow):
+        if offset is None:
+            yield '\n'
+        else:
+            yield json.dumps({'data': Envelope.to_json(message), 'offset': offset}) + '\n'
+
+
+def replay_frames(from_offset, follow):
+    # plain envelope frames carry neither offsets nor keepalives
+    for offset, message in logged_broadcasts(from_offset, follow):
+        if offset is not None:
+            yield Envelope.to_frame(message)
 
 
 @app.route('/api/topics/<string:topic>', methods=['GET'])
 def messages_for(topic):
     global nof_listeners
 
-    listener = MessageListener(message_broker, topic)
-    listener.start()
+    # subscribers can ask for binary envelope frames, instead of json lines
+    binary = request.args.get('encoding') == 'binary'
 
-    def generate():
-        while True:
-            yield json.dumps({'data': listener.get()}) + '\n'
+    # subscribers of a logged topic can replay it from an offset, the log is their backlog,
+    # with `follow=false` the response ends after the messages logged so far
+    from_offset = request.args.get('from_offset')
+    if from_offset is not None:
+        return replay(topic, from_offset, binary, request.args.get('follow') != 'false')
+
+    try:
+        queue_size, policy = subscription_options(request.args)
+        subscription = Subscription('topic {}'.format(topic))
+        subscription.configure(queue_size, policy)
+    except ValueError as e:
+        return make_error(400, str(e))
+    listener = message_broker.listen_on(topic, message_queue_async=subscription)
+    subscriptions.add(subscription)
 
     def on_close():  # stop listener on closed connection
         global nof_listeners
         nof_listeners -= 1
         print('Nof-listeners: {}'.format(nof_listeners))
-        listener.stop()
+        message_broker.stop_listen(listener)
+        subscription.close()
+        subscriptions.discard(subscription)
 
-    r = Response(generate(), content_type='application/x-json-stream')
+    r = subscription_response(subscription, binary)
     nof_listeners += 1
     print('Nof-listeners: {} new for topic: {}'.format(nof_listeners, topic))
     r.call_on_close(on_close)
     return r
 
 
+def subscription_response(subscription, binary):
+    """
+    :return: the streaming response of the subscription to one topic,
+             binary frames or json lines
+    """
+
+    def generate():
+        for message in subscription.items():
+            if message is SNAPSHOT_MARKER:
+                yield json.dumps({'event': 'snapshot', 'data': None}) + '\n'
+            else:
+                yield json.dumps({'data': Envelope.to_json(message)}) + '\n'
+
+    def generate_frames():
+        # plain envelope frames can't carry the snapshot marker
+        for message in subscription.items():
+            if message is not SNAPSHOT_MARKER:
+                yield Envelope.to_frame(message)
+
+    if binary:
+        return Response(generate_frames(), content_type='application/octet-stream')
+    return Response(generate(), content_type='application/x-json-stream')
+
+
+class TopicStream(object):
+    """
+    The topics a client subscribed to,
+    their messages are delivered in order over one streaming response
+    """
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.subscription = Subscription('stream {}'.format(stream_id))  # (kind, topic, message)
+        self.listeners = dict()  # topic -> Listener
+        self.connected = False
+        subscriptions.add(self.subscription)
+
+    def subscribe(self, topic):
+        if topic not in self.listeners:
+            self.listeners[topic] = message_broker.listen_on(
+                topic, lambda message, topic_=topic: (stream.MESSAGE, topic_, message),
+                message_queue_async=self.subscription)
+        self.subscription.put((stream.SUBSCRIBED, topic, None))
+
+    def unsubscribe(self, topic):
+        listener = self.listeners.pop(topic, None)
+        if listener is not None:
+            message_broker.stop_listen(listener)
+        self.subscription.put((stream.UNSUBSCRIBED, topic, None))
+
+    def close(self):
+        for listener in self.listeners.values():
+            message_broker.stop_listen(listener)
+        self.listeners.clear()
+        self.subscription.close()
+        subscriptions.discard(self.subscription)
+
+    def items(self, keepalive_interval=STREAM_KEEPALIVE_INTERVAL):
+        for item in self.subscription.items(keepalive_interval):
+            if item is KEEPALIVE_MARKER:
+                # writing to a closed connection ends the response
+                yield stream.KEEPALIVE, '', None
+            elif item is SNAPSHOT_MARKER:
+                yield stream.SNAPSHOT, '', None
+            else:
+                yield item
+
+
+def get_stream(stream_id, connect_timeout=STREAM_CONNECT_TIMEOUT):
+    topic_stream = streams.get(stream_id)
+    if topic_stream is None:
+        topic_stream = streams[stream_id] = TopicStream(stream_id)
+        # a stream which is subscribed to but never connected,
+        # e.g. after its connection was closed, is dropped
+        gevent.spawn_later(connect_timeout, expire_stream, stream_id, topic_stream)
+    return topic_stream
+
+
+def expire_stream(stream_id, topic_stream):
+    if streams.get(stream_id) is topic_stream and not topic_stream.connected:
+        close_stream(stream_id)
+
+
+def close_stream(stream_id):
+    topic_stream = streams.pop(stream_id, None)
+    if topic_stream is not None:
+        topic_stream.close()
+
+
+@app.route('/api/streams/<string:stream_id>', methods=['GET'])
+def stream_messages(stream_id):
+    # subscribers can ask for binary frames, instead of json lines
+    binary = request.args.get('encoding') == 'binary'
+
+    try:
+        queue_size, policy = subscription_options(request.args)
+    except ValueError as e:
+        return make_error(400, str(e))
+
+    topic_stream = get_stream(stream_id)
+    if topic_stream.connected:
+        return make_error(409, 'The stream is already connected')
+    try:
+        topic_stream.subscription.configure(queue_size, policy)
+    except ValueError as e:
+        return make_error(400, str(e))
+    topic_stream.connected = True
+
+    r = stream_response(topic_stream, binary)
+    r.call_on_close(lambda: close_stream(stream_id))
+    return r
+
+
+def stream_response(topic_stream, binary):
+    """:return: the streaming response of the topic stream, binary frames or json lines"""
+
+    def generate():
+        for kind, topic, message in topic_stream.items():
+            data = Envelope.to_json(message) if kind == stream.MESSAGE else None
+            yield stream.pack_line(kind, topic, data)
+
+    def generate_frames():
+        for kind, topic, message in topic_stream.items():
+            payload = Envelope.to_frame(message) if kind == stream.MESSAGE else b''
+            yield stream.pack_frame(kind, topic, payload)
+
+    if binary:
+        return Response(generate_frames(), content_type='application/octet-stream')
+    return Response(generate(), content_type='application/x-json-stream')
+
+
+@app.route('/api/streams/<string:stream_id>', methods=['DELETE'])
+def delete_stream(stream_id):
+    close_stream(stream_id)
+    return jsonify({'data': True})
+
+
+@app.route('/api/streams/<string:stream_id>/topics/<string:topic>', methods=['PUT'])
+def subscribe(stream_id, topic):
+    # the stream is created by the first of its subscriptions or its connection
+    get_stream(stream_id).subscribe(topic)
+    return jsonify({'data': True})
+
+
+@app.route('/api/streams/<string:stream_id>/topics/<string:topic>', methods=['DELETE'])
+def unsubscribe(stream_id, topic):
+    topic_stream = streams.get(stream_id)
+    if topic_stream is None:
+        return make_error(404, 'Unknown stream')
+    topic_stream.unsubscribe(topic)
+    return jsonify({'data': True})
+
+
+@app.route('/api/subscriptions', methods=['GET'])
+def subscription_metrics():
+    """the lag of every subscriber, and the messages dropped for it"""
+    return jsonify({'data': [subscription.metrics() for subscription in subscriptions]})
+
+
+def publish(topic, message):
+    """logged broadcasts are not lost without listeners, they can still be replayed"""
+    if topic == 'broadcast' and broadcast_log is not None:
+        broadcast_log.append(message)
+        message_broker.send(topic, message)
+        return True
+    return message_broker.send(topic, message)
+
+
 @app.route('/api/topics/<string:topic>', methods=['POST'])
 def send_message(topic):
 
-    message = request.json.get('message')
-    status = message_broker.send(topic, message)
+    if request.mimetype == 'application/octet-stream':
+        message = request.get_data()
+    else:
+        message = request.json.get('message')
+    status = publish(topic, message)
     return jsonify({'data': status})
 
 
+@app.route('/api/topics/<string:topic>/bulk', methods=['POST'])
+def send_messages(topic):
+    # concatenated binary envelope frames, sent to the topic in order
+    statuses = [publish(topic, frame) for frame in stream.iter_frames([request.get_data()])]
+    return jsonify({'data': statuses})
+
+
 def make_error_obj(status_code, message):
     return {
         'status': status_code,
@@ -76,6 +510,19 @@ def internal_error(error):
     return make_error(500,
                       'The server encountered an internal error and was unable to complete your request: ' + str(error))
 
+
 if __name__ == '__main__':
-    http_server = WSGIServer(('', 5000), app)
-    http_server.serve_forever()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--broadcast-log',
+                        help='directory of the broadcast log, broadcasts are not logged without')
+    args = parser.parse_args()
+
+    if args.broadcast_log is not None:
+        broadcast_log = BroadcastLog(args.broadcast_log)
+    http_server = WSGIServer(('', args.port), app, handler_class=NoDelayHandler)
+    try:
+        http_server.serve_forever()
+    finally:
+        if broadcast_log is not None:
+            broadcast_log.close()
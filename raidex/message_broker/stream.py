@@ -0,0 +1,81 @@
+"""
+Framing of the topic stream, over which the message broker server delivers the messages
+of all topics a client subscribed to. Every item carries its topic, subscriptions and
+unsubscriptions are acknowledged in-band, so the client knows from which item on a topic is
+(no longer) delivered. A subscriber which didn't keep up gets a snapshot item in place of the
+messages it missed, it has to reload its state.
+
+Binary streams consist of frames
+`kind (1 byte) | topic length (2) | payload length (4) | topic | payload`,
+the payload of a message is a binary envelope frame. JSON streams consist of lines
+`{"topic": ..., "event": ..., "data": ...}`, with the JSON envelope of a message as data.
+"""
+import json
+import struct
+
+from raidex.messages import Envelope
+
+STREAM_FRAME_HEADER = struct.Struct('>BHI')
+
+MESSAGE = 0
+SUBSCRIBED = 1
+UNSUBSCRIBED = 2
+KEEPALIVE = 3
+SNAPSHOT = 4
+
+EVENTS = {
+    MESSAGE: 'message',
+    SUBSCRIBED: 'subscribed',
+    UNSUBSCRIBED: 'unsubscribed',
+    KEEPALIVE: 'keepalive',
+    SNAPSHOT: 'snapshot',
+}
+EVENT_KINDS = {event: kind for kind, event in EVENTS.items()}
+
+
+def pack_frame(kind, topic, payload=b''):
+    encoded_topic = topic.encode('utf-8')
+    header = STREAM_FRAME_HEADER.pack(kind, len(encoded_topic), len(payload))
+    return header + encoded_topic + payload
+
+
+def iter_stream_frames(chunks):
+    """Splits a stream of bytes chunks into (kind, topic, payload) items"""
+    header_size = STREAM_FRAME_HEADER.size
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= header_size:
+            kind, topic_length, payload_length = STREAM_FRAME_HEADER.unpack_from(buffer)
+            frame_size = header_size + topic_length + payload_length
+            if len(buffer) < frame_size:
+                break
+            topic = buffer[header_size:header_size + topic_length].decode('utf-8')
+            payload = bytes(buffer[header_size + topic_length:frame_size])
+            del buffer[:frame_size]
+            yield kind, topic, payload
+
+
+def iter_frames(chunks):
+    """Splits a stream of bytes chunks into binary envelope frames"""
+    header_size = Envelope.frame_header.size
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= header_size:
+            _, _, length = Envelope.read_frame_header(buffer)
+            frame_size = header_size + length
+            if len(buffer) < frame_size:
+                break
+            yield bytes(buffer[:frame_size])
+            del buffer[:frame_size]
+
+
+def pack_line(kind, topic, data=None):
+    return json.dumps({'topic': topic, 'event': EVENTS[kind], 'data': data}) + '\n'
+
+
+def parse_line(line):
+    """:return: (kind, topic, data) of a JSON stream line"""
+    item = json.loads(line)
+    return EVENT_KINDS[item['event']], item['topic'], item['data']
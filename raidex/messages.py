@@ -1,13 +1,16 @@
 import json
 import base64
+import struct
 
 from copy import deepcopy
+from functools import lru_cache
 import rlp
 from rlp.sedes import BigEndianInt, Binary
 from eth_utils import (keccak, big_endian_to_int, int_to_big_endian, encode_hex, decode_hex)
 from eth_keys import keys
 from raidex.utils import pex
 from raidex.utils import timestamp
+from raidex.constants import SENDER_CACHE_SIZE
 
 
 sig65 = Binary.fixed_length(65, allow_empty=True)
@@ -27,8 +30,19 @@ def sign(messagedata, private_key):
     return privkey_instance.sign_msg(messagedata).to_bytes()
 
 
+@lru_cache(maxsize=SENDER_CACHE_SIZE)
+def recover_sender(signature, messagedata):
+    """
+    Recovers the signer's address,
+    cached process-wide so that rebroadcasted messages are recovered once
+    """
+    public_key = keys.Signature(signature_bytes=signature).recover_public_key_from_msg(messagedata)
+    return decode_hex(public_key.to_address())
+
+
 class RLPHashable(rlp.Serializable):
     # _cached_rlp caches serialized object
+    # _hash_cache caches the hash, only set while the object is immutable
 
     _mutable = True
 
@@ -36,9 +50,26 @@ class RLPHashable(rlp.Serializable):
 
     fields = [('cmdid', int32)]
 
+    def __setattr__(self, attr, value):
+        super(RLPHashable, self).__setattr__(attr, value)
+        # field values don't start with an underscore,
+        # changing them or the mutability invalidates the caches
+        if attr == '_mutable' or not attr.startswith('_'):
+            self._invalidate_caches()
+
+    def _invalidate_caches(self):
+        self.__dict__.pop('_hash_cache', None)
+
     @property
     def hash(self):
-        return keccak(rlp.encode(self))  # this was `cached=True`, but made the obj immutable e.g. on every comparison
+        # this was `cached=True`, but made the obj immutable e.g. on every comparison
+        if self._mutable:
+            return keccak(rlp.encode(self))
+        hash_ = self.__dict__.get('_hash_cache')
+        if hash_ is None:
+            hash_ = keccak(rlp.encode(self))
+            self.__dict__['_hash_cache'] = hash_
+        return hash_
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.hash == other.hash
@@ -83,9 +114,20 @@ class Signed(RLPHashable):
             return self._hash_without_signature
         return super(Signed, self).hash
 
+    def _invalidate_caches(self):
+        super(Signed, self)._invalidate_caches()
+        self.__dict__.pop('_unsigned_hash_cache', None)
+        self.__dict__.pop('_sender', None)
+
     @property
     def _hash_without_signature(self):
-        return keccak(rlp.encode(self, self.__class__.exclude(['signature'])))
+        if self._mutable:
+            return keccak(rlp.encode(self, self.__class__.exclude(['signature'])))
+        hash_ = self.__dict__.get('_unsigned_hash_cache')
+        if hash_ is None:
+            hash_ = keccak(rlp.encode(self, self.__class__.exclude(['signature'])))
+            self.__dict__['_unsigned_hash_cache'] = hash_
+        return hash_
 
     def sign(self, privkey):
         assert self.is_mutable()
@@ -103,16 +145,19 @@ class Signed(RLPHashable):
 
     @property
     def sender(self):
-        if not self._sender:
-            if not self.signature:
-                raise SignatureMissingError()
-            if isinstance(self.signature, bytes):
-                signature_obj = keys.Signature(signature_bytes=self.signature)
-            else:
-                signature_obj = self.signature
-            pub = signature_obj.recover_public_key_from_msg(self._hash_without_signature)
-            self._sender = decode_hex(pub.to_address())
-        return self._sender
+        sender = self.__dict__.get('_sender')
+        if sender:
+            return sender
+        if not self.signature:
+            raise SignatureMissingError()
+        if isinstance(self.signature, bytes):
+            signature = self.signature
+        else:
+            signature = self.signature.to_bytes()
+        sender = recover_sender(signature, self._hash_without_signature)
+        if not self._mutable:
+            self.__dict__['_sender'] = sender
+        return sender
 
     @classmethod
     def deserialize(cls, serial, exclude=[], **kwargs):
@@ -448,19 +493,35 @@ def get_cmdid_for_class(klass):
     return cmdid
 
 
+cmdid_types_map = {cmdid: msg_types_map[msg] for msg, cmdid in msg_cmdid_map.items()}
+cmdid_msg_map = {cmdid: msg for msg, cmdid in msg_cmdid_map.items()}
+
+
 class Envelope(object):
-    """Class to pack (`Envelope.envelop`) and unpack (`Envelope.open`) rlp messages
-    in a broadcastable JSON-envelope. The rlp-data fields will be base64 encoded.
+    """Class to pack (`Envelope.envelop`) and unpack (`Envelope.open`) rlp messages.
+
+    Two formats are supported, distinguished by their version:
+
+        version 1: a broadcastable JSON-envelope, the rlp-data fields will be base64 encoded.
+            Human readable, meant for debugging.
+        version 2: a binary frame without any JSON or base64 overhead:
+            <version: uint8><cmdid: uint8><length: uint32 big endian><rlp data>
+
+    A version 1 JSON-envelope can also be carried inside a binary frame, with a cmdid of 0,
+    so that streams of binary frames can transport both formats.
     """
 
     version = 1
+    binary_version = 2
+
+    frame_header = struct.Struct('>BBI')
 
     def __init__(self):
         pass
 
     @staticmethod
     def encode(data):
-        return base64.encodebytes(rlp.encode(data)).decode(encoding="utf-8")
+        return base64.b64encode(rlp.encode(data)).decode(encoding="utf-8")
 
     @staticmethod
     def decode(data):
@@ -469,7 +530,11 @@ class Envelope(object):
     @classmethod
     def open(cls, data):
         """Unpack the message data and return a message instance.
+        `data` is either a JSON-envelope (str) or a binary frame (bytes).
         """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return cls.open_frame(data)
+
         try:
             envelope = json.loads(data)
             assert isinstance(envelope, dict)
@@ -478,7 +543,7 @@ class Envelope(object):
 
         if envelope['version'] != cls.version:
             raise ValueError("Message version mismatch! want:{} got:{}".format(
-                Envelope.version, envelope['msg']))
+                Envelope.version, envelope['version']))
 
         klass = msg_types_map[envelope['msg']]
         message = klass.deserialize(cls.decode(envelope['data']))
@@ -486,13 +551,91 @@ class Envelope(object):
         return message
 
     @classmethod
-    def envelop(cls, message):
-        """Wrap the message in a json envelope.
+    def open_frame(cls, frame):
+        """Unpack a binary frame and return a message instance.
+        """
+        version, cmdid, length = cls.read_frame_header(frame)
+        payload = bytes(frame[cls.frame_header.size:cls.frame_header.size + length])
+        if len(payload) != length:
+            raise ValueError("Binary frame is truncated")
+
+        if version == cls.version:
+            return cls.open(payload.decode('utf-8'))
+
+        klass = cmdid_types_map.get(cmdid)
+        if klass is None:
+            raise ValueError("Unknown cmdid: {}".format(cmdid))
+        return klass.deserialize(rlp.decode(payload))
+
+    @classmethod
+    def read_frame_header(cls, frame):
+        """
+        :return: (version, cmdid, payload length) of the binary frame
+        """
+        if len(frame) < cls.frame_header.size:
+            raise ValueError("Binary frame is truncated")
+        version, cmdid, length = cls.frame_header.unpack_from(frame)
+        if version not in (cls.version, cls.binary_version):
+            raise ValueError("Message version mismatch! want:{} got:{}".format(
+                Envelope.binary_version, version))
+        return version, cmdid, length
+
+    @classmethod
+    def envelop(cls, message, version=None):
+        """Wrap the message in a json envelope,
+        or in a binary frame if `version` is the binary_version.
         """
         assert isinstance(message, RLPHashable)
+        if version == cls.binary_version:
+            return cls.envelop_frame(message)
         envelope = dict(
                 version=Envelope.version,
                 msg=types_msg_map[message.__class__],
                 data=cls.encode(message.serialize(message)),
                 )
         return json.dumps(envelope)
+
+    @classmethod
+    def envelop_frame(cls, message):
+        """Wrap the message in a binary frame.
+        """
+        assert isinstance(message, RLPHashable)
+        payload = rlp.encode(message)
+        return cls.frame_header.pack(cls.binary_version, message.cmdid, len(payload)) + payload
+
+    @classmethod
+    def to_frame(cls, data):
+        """Convert an enveloped message of either format to a binary frame,
+        without decoding the rlp data.
+        """
+        if isinstance(data, bytes):
+            return data
+        try:
+            envelope = json.loads(data)
+        except ValueError:
+            envelope = None
+        if not isinstance(envelope, dict) or envelope.get('version') != cls.version \
+                or envelope.get('msg') not in msg_cmdid_map:
+            # not a message envelope, pass the data on unchanged inside of the frame
+            payload = data.encode('utf-8')
+            return cls.frame_header.pack(cls.version, 0, len(payload)) + payload
+        cmdid = msg_cmdid_map[envelope['msg']]
+        payload = base64.decodebytes(envelope['data'].encode('utf-8'))
+        return cls.frame_header.pack(cls.binary_version, cmdid, len(payload)) + payload
+
+    @classmethod
+    def to_json(cls, data):
+        """Convert an enveloped message of either format to a JSON-envelope,
+        without decoding the rlp data.
+        """
+        if not isinstance(data, bytes):
+            return data
+        version, cmdid, length = cls.read_frame_header(data)
+        payload = data[cls.frame_header.size:cls.frame_header.size + length]
+        if version == cls.version:
+            return payload.decode('utf-8')
+        return json.dumps(dict(
+                version=Envelope.version,
+                msg=cmdid_msg_map[cmdid],
+                data=base64.b64encode(payload).decode(encoding='utf-8'),
+                ))
@@ -1,8 +1,9 @@
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, Response
 from flask.views import MethodView
 
 from raidex.raidex_node.raidex_node import RaidexNode
 from raidex.raidex_node.handle_api_call import on_api_call
+from raidex.raidex_node.offer_grouping import PRICE_GROUP_PRECISION
 
 # API-Resources - the json encoding and decoding is handled manually for simplicity and readability
 # Type-checking, encoding/decoding and error-responses are kept very basic
@@ -14,29 +15,35 @@ class Offers(MethodView):
         self.raidex_node = raidex_node
 
     def get(self):
-        # the grouped offers are sorted, with lowest price first
-        buys = self.raidex_node.grouped_buys()
-        sells = reversed(self.raidex_node.grouped_sells())
-        dict_ = dict(
-            data=dict(
-                buys=[
-                    dict(
-                        amount=offer.amount,
-                        price=offer.price,
-                        timeout=offer.avg_timeout
-                    ) for offer in buys
-                ],
-
-                sells=[
-                    dict(
-                        amount=offer.amount,
-                        price=offer.price,
-                        timeout=offer.avg_timeout
-                    ) for offer in sells
-                ],
-            ),
-        )
-        return jsonify(dict_)
+        # buys are sorted with lowest price first, sells with highest price first
+        precision = request.args.get('precision', PRICE_GROUP_PRECISION)
+        try:
+            precision = int(precision)
+            version, body = self.raidex_node.depth_snapshot(precision)
+        except (ValueError, KeyError):
+            abort(400, 'unsupported precision')
+
+        # the serialized snapshot only changes with the offer book version
+        etag = '{}-{}'.format(precision, version)
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': '"{}"'.format(etag)})
+        return Response(body, mimetype='application/json', headers={'ETag': '"{}"'.format(etag)})
+
+
+class MarketStream(MethodView):
+    """
+    Chunked json lines: a snapshot of the grouped offers, then the price level and trade deltas
+    """
+
+    def __init__(self, raidex_node: RaidexNode):
+        self.raidex_node = raidex_node
+
+    def get(self):
+        market_feed = self.raidex_node.market_feed
+        subscription = market_feed.subscribe()
+        response = Response(subscription.iter_lines(), mimetype='application/x-json-stream')
+        response.call_on_close(lambda: market_feed.unsubscribe(subscription))
+        return response
 
 
 class Trades(MethodView):
@@ -205,3 +212,12 @@ class Channels(MethodView):
             data=True
         )
         return jsonify(dict_)
+
+
+class Metrics(MethodView):
+
+    def __init__(self, raidex_node: RaidexNode):
+        self.raidex_node = raidex_node
+
+    def get(self):
+        return jsonify(dict(data=self.raidex_node.metrics()))
@@ -3,7 +3,8 @@ import structlog
 from raidex.raidex_node.order.offer_manager import OfferManager
 from raidex.raidex_node.matching.matching_engine import MatchingEngine
 from raidex.raidex_node.order.limit_order import LimitOrder
-from raidex.raidex_node.matching.match import MatchFactory
+from raidex.raidex_node.matching.match import Match, MatchFactory
+from raidex.raidex_node.order.offer import OfferFactory
 from raidex.constants import MATCHING_ALGORITHM
 from raidex.exceptions import OfferTimedOutException
 from raidex.utils.greenlet_helper import TimeoutHandler
@@ -61,3 +62,43 @@ class DataManager:
             self.timeout_handler.create_new_timeout(make_offer)
             order.add_offer(make_offer)
 
+    def snapshot(self):
+        """ Returns the orders, offers, matches and the offer book as plain, picklable data """
+
+        offers = [(offer.offer_id, offer.type, offer.base_amount, offer.quote_amount,
+                   offer.timeout_date, offer.trader_role, offer.state, offer.proof)
+                  for offer in self.offer_manager.offers.values()]
+
+        orders = [(order.order_id, order.order_type, order.amount, order.price, order.lifetime,
+                   list(order.corresponding_offers.keys()))
+                  for order in self.orders.values()]
+
+        matches = [(offer_id, match.trader_role, match.target, match.target_data.commitment_proof)
+                   for offer_id, match in self.matches.items()]
+
+        offer_book = self.matching_engine.offer_book
+        offer_book_entries = list(offer_book.buys.values()) + list(offer_book.sells.values())
+
+        return dict(offers=offers, orders=orders, matches=matches,
+                    offer_book_entries=offer_book_entries)
+
+    def restore(self, snapshot):
+
+        for offer_data in snapshot['offers']:
+            offer = OfferFactory.restore_offer(*offer_data)
+            self.offer_manager.add_offer(offer)
+            if offer.status in ('open', 'pending'):
+                self.timeout_handler.create_new_timeout(offer)
+
+        for order_id, order_type, amount, price, lifetime, offer_ids in snapshot['orders']:
+            order = LimitOrder(order_id, order_type, amount, price, lifetime)
+            for offer_id in offer_ids:
+                order.corresponding_offers[offer_id] = self.offer_manager.get_offer(offer_id)
+            self.orders[order_id] = order
+
+        for offer_id, trader_role, target, commitment_proof in snapshot['matches']:
+            offer = self.offer_manager.get_offer(offer_id)
+            self.matches[offer_id] = Match(offer, trader_role, target, commitment_proof)
+
+        for offer_entry in snapshot['offer_book_entries']:
+            self.matching_engine.offer_book.insert_offer(offer_entry)
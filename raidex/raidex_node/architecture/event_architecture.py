@@ -1,7 +1,37 @@
+from contextlib import contextmanager
+
 from gevent.greenlet import Greenlet
 from gevent.queue import Queue
 
 
+# optional callable(event, processor), called for every event before a consumer handles it
+_event_trace = None
+
+
+def set_event_trace(trace_func):
+    global _event_trace
+    _event_trace = trace_func
+
+
+def print_event_trace(event, processor):
+    print(f'EVENT: {event.__class__.__name__}, {processor.__class__.__name__}')
+
+
+# events are dropped instead of dispatched while muted,
+# e.g. when replaying already handled state changes
+_events_muted = False
+
+
+@contextmanager
+def mute_events():
+    global _events_muted
+    _events_muted = True
+    try:
+        yield
+    finally:
+        _events_muted = False
+
+
 class Processor:
 
     def __init__(self, event_types):
@@ -24,7 +54,8 @@ class Consumer(Greenlet):
     def _run(self):
         while True:
             event = self.queue.get()
-            print(f'EVENT: {event.__class__.__name__}, {self.processor.__class__.__name__}')
+            if _event_trace is not None:
+                _event_trace(event, self.processor)
             self.on_event(self.processor, event)
 
     def get_types(self):
@@ -34,10 +65,22 @@ class Consumer(Greenlet):
 class Dispatch:
 
     consumer_tasks = list()
+    # event class -> queues of the consumers processing that class
+    routing_table = dict()
 
     @staticmethod
     def connect_consumer(consumer: Processor, handle_event):
         Dispatch.consumer_tasks.append(Consumer(Queue(), consumer, handle_event))
+        Dispatch.routing_table.clear()
+
+    @staticmethod
+    def get_routes(event_class):
+        routes = Dispatch.routing_table.get(event_class)
+        if routes is None:
+            routes = [consumer.queue for consumer in Dispatch.consumer_tasks
+                      if issubclass(event_class, consumer.get_types())]
+            Dispatch.routing_table[event_class] = routes
+        return routes
 
     @staticmethod
     def start_consumer_tasks():
@@ -50,6 +93,8 @@ state_change_dispatch = Dispatch()
 
 
 def dispatch_events(events):
+    if _events_muted:
+        return
     _dispatch(event_dispatch, events)
 
 
@@ -58,10 +103,13 @@ def dispatch_state_changes(state_changes):
 
 
 def _dispatch(handler, events):
+    routing_table = handler.routing_table
     for state_change in events:
-        for consumer in handler.consumer_tasks:
-            if isinstance(state_change, consumer.get_types()):
-                consumer.queue.put(state_change)
+        queues = routing_table.get(state_change.__class__)
+        if queues is None:
+            queues = handler.get_routes(state_change.__class__)
+        for queue in queues:
+            queue.put(state_change)
 
 
 
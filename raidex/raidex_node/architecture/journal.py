@@ -0,0 +1,128 @@
+import os
+import pickle
+
+import structlog
+
+from raidex.raidex_node.architecture.event_architecture import mute_events
+from raidex.raidex_node.architecture.state_change import NewLimitOrderStateChange
+from raidex.utils.journal import Journal
+from raidex.constants import JOURNAL_FSYNC_BATCH_SIZE, JOURNAL_FSYNC_INTERVAL, SNAPSHOT_INTERVAL
+
+log = structlog.get_logger('node.journal')
+
+SNAPSHOT_FILE = 'snapshot'
+JOURNAL_FILE = 'journal.{}'
+
+# handling these state changes creates offers with random ids and wall clock timeouts,
+# they can't be replayed deterministically and are always followed by a snapshot
+SNAPSHOT_STATE_CHANGES = (NewLimitOrderStateChange,)
+
+
+class StateStorage:
+    """
+    Persists the node state in `directory` as the latest DataManager snapshot plus
+    the journal of all StateChanges handled after that snapshot.
+
+    Every snapshot starts a new journal generation, the journals of older generations are removed.
+    """
+
+    def __init__(self, directory, snapshot_interval=SNAPSHOT_INTERVAL,
+                 fsync_batch_size=JOURNAL_FSYNC_BATCH_SIZE, fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval = fsync_interval
+        self.generation = 0
+        self.journal = None
+        self._nof_since_snapshot = 0
+        self._replaying = False
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    def journal_path(self, generation):
+        return os.path.join(self.directory, JOURNAL_FILE.format(generation))
+
+    def restore(self, raidex_node, handle_state_change):
+        """
+        Loads the latest snapshot into the node's DataManager and replays the journal tail.
+        Events dispatched while replaying are dropped,
+        they were already processed before the restart.
+
+        :return: number of replayed StateChanges
+        """
+        nof_replayed = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+            self.generation = snapshot['generation']
+            raidex_node.data_manager.restore(snapshot['data'])
+
+        self._replaying = True
+        try:
+            with mute_events():
+                for state_change in Journal.read(self.journal_path(self.generation)):
+                    try:
+                        handle_state_change(raidex_node, state_change)
+                    except Exception as e:
+                        log.warning('Replaying state change failed',
+                                    state_change=state_change, error=e)
+                    nof_replayed += 1
+        finally:
+            self._replaying = False
+
+        self.journal = self._open_journal(self.generation)
+        self._nof_since_snapshot = nof_replayed
+        log.info('Restored node state', generation=self.generation, replayed=nof_replayed)
+        return nof_replayed
+
+    def record(self, state_change):
+        if self._replaying:
+            return
+        if self.journal is None:
+            self.journal = self._open_journal(self.generation)
+        self.journal.append(state_change)
+
+    def after_state_change(self, data_manager, state_change):
+        if self._replaying:
+            return
+        self._nof_since_snapshot += 1
+        if (self._nof_since_snapshot >= self.snapshot_interval or
+                isinstance(state_change, SNAPSHOT_STATE_CHANGES)):
+            self.snapshot(data_manager)
+
+    def snapshot(self, data_manager):
+        generation = self.generation + 1
+        snapshot = dict(generation=generation, data=data_manager.snapshot())
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as snapshot_file:
+            pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        old_journal_path = self.journal_path(self.generation)
+        if os.path.exists(old_journal_path):
+            os.remove(old_journal_path)
+
+        self.generation = generation
+        self.journal = self._open_journal(generation)
+        self._nof_since_snapshot = 0
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def _open_journal(self, generation):
+        return Journal(self.journal_path(generation), fsync_batch_size=self.fsync_batch_size,
+                       fsync_interval=self.fsync_interval)
@@ -0,0 +1,178 @@
+from raidex.raidex_node.offer_grouping import PRICE_GROUP_PRECISION
+from raidex.constants import CANDLE_RESOLUTIONS, CANDLE_HISTORY
+
+EMPTY = -1
+
+
+class Candle(object):
+    """OHLC values of one time bucket, same interface as offer_grouping.PriceBin"""
+
+    __slots__ = [
+        'timestamp',
+        'amount',
+        '_open',
+        '_high',
+        '_low',
+        '_close',
+        '_scale',
+    ]
+
+    def __init__(self, timestamp_bin, open_price, high, low, close, amount, scale):
+        self.timestamp = timestamp_bin  # int, representing ms
+        self.amount = amount
+        self._open = open_price
+        self._high = high
+        self._low = low
+        self._close = close
+        self._scale = scale
+
+    @property
+    def open_price(self):
+        return self._open / self._scale
+
+    @property
+    def close_price(self):
+        return self._close / self._scale
+
+    @property
+    def min_price(self):
+        return self._low / self._scale
+
+    @property
+    def max_price(self):
+        return self._high / self._scale
+
+    def __repr__(self):
+        return 'Candle<timestamp={} open={} close={} min={} max={} amount={}>'.format(
+            self.timestamp, self.open_price, self.close_price, self.min_price, self.max_price,
+            self.amount)
+
+
+class CandleRing(object):
+    """
+    The candles of the last `size` buckets of one resolution, kept in preallocated lists.
+    Prices are integers, scaled by 10 ** price precision.
+
+    The close price of a bucket is the average price of the trades at its latest trade timestamp.
+    """
+
+    def __init__(self, resolution, size):
+        self.resolution = resolution
+        self.size = size
+        self.starts = [EMPTY] * size
+        self.high = [0] * size
+        self.low = [0] * size
+        self.close_sum = [0] * size
+        self.close_count = [0] * size
+        self.close_timestamp = [0] * size
+        self.amount = [0] * size
+
+    def add(self, timestamp_, price, amount):
+        start = timestamp_ - timestamp_ % self.resolution
+        slot = (start // self.resolution) % self.size
+        slot_start = self.starts[slot]
+
+        if slot_start > start:
+            # older than the history that is kept
+            return False
+        if slot_start != start:
+            self.starts[slot] = start
+            self.high[slot] = price
+            self.low[slot] = price
+            self.close_sum[slot] = price
+            self.close_count[slot] = 1
+            self.close_timestamp[slot] = timestamp_
+            self.amount[slot] = amount
+            return True
+
+        if price > self.high[slot]:
+            self.high[slot] = price
+        if price < self.low[slot]:
+            self.low[slot] = price
+        self.amount[slot] += amount
+        if timestamp_ > self.close_timestamp[slot]:
+            self.close_timestamp[slot] = timestamp_
+            self.close_sum[slot] = price
+            self.close_count[slot] = 1
+        elif timestamp_ == self.close_timestamp[slot]:
+            self.close_sum[slot] += price
+            self.close_count[slot] += 1
+        return True
+
+    def slot_of(self, start):
+        """
+        :return: slot index of the bucket starting at `start`,
+                 None if there were no trades in the bucket
+        :raises KeyError: if the bucket was already overwritten by a newer one
+        """
+        slot = (start // self.resolution) % self.size
+        slot_start = self.starts[slot]
+        if slot_start == start:
+            return slot
+        if slot_start > start:
+            raise KeyError(start)
+        return None
+
+
+class CandleStore(object):
+    """
+    Aggregates completed trades incrementally into OHLC candles at fixed resolutions,
+    so that price charts don't have to group all trades on every request.
+    """
+
+    def __init__(self, resolutions=CANDLE_RESOLUTIONS, history=CANDLE_HISTORY,
+                 price_group_precision=PRICE_GROUP_PRECISION):
+        # resolutions in seconds, rings are ordered from the coarsest to the finest resolution
+        self.rings = [CandleRing(int(resolution * 1000), history)
+                      for resolution in sorted(resolutions, reverse=True)]
+        self.scale = 10 ** price_group_precision
+
+    def add_trade(self, trade):
+        offer = trade.offer
+        price = offer.quote_amount * self.scale // offer.base_amount
+        for ring in self.rings:
+            ring.add(trade.timestamp, price, offer.base_amount)
+
+    def price_bins(self, nof_buckets, interval, current_timestamp):
+        """
+        Same bins as offer_grouping.make_price_bins: `nof_buckets` buckets of `interval` ms,
+        the last one ending at the start of the current bucket.
+
+        :return: list of Candles, None if no kept resolution can serve the interval
+        """
+        for ring in self.rings:
+            if interval % ring.resolution == 0:
+                try:
+                    return self._price_bins(ring, nof_buckets, interval, current_timestamp)
+                except KeyError:
+                    return None
+        return None
+
+    def _price_bins(self, ring, nof_buckets, interval, current_timestamp):
+        end = current_timestamp - current_timestamp % interval
+        # an additional first bucket to determine the first open price
+        start = end - (nof_buckets + 1) * interval
+
+        bins = list()
+        last_close = 0
+        for bin_start in range(start, end, interval):
+            high = low = None
+            close = last_close
+            amount = 0
+            for part_start in range(bin_start, bin_start + interval, ring.resolution):
+                slot = ring.slot_of(part_start)
+                if slot is None:
+                    continue
+                if high is None or ring.high[slot] > high:
+                    high = ring.high[slot]
+                if low is None or ring.low[slot] < low:
+                    low = ring.low[slot]
+                amount += ring.amount[slot]
+                close = ring.close_sum[slot] / ring.close_count[slot]
+            if high is None:
+                high = low = last_close
+            bins.append(Candle(bin_start, last_close, high, low, close, amount, self.scale))
+            last_close = close
+
+        # throw away the first bin again, it was there just to determine the first open price
+        return bins[1:]
@@ -6,7 +6,6 @@ from raidex.raidex_node.architecture.event_architecture import dispatch_events
 from raidex.raidex_node.transport.events import SendProvenOfferEvent
 from raidex.raidex_node.matching.match import MatchFactory
 from raidex.raidex_node.architecture.data_manager import DataManager
-from raidex.constants import OFFER_THRESHOLD_TIME
 from raidex.raidex_node.trader.events import MakeChannelEvent
 from raidex.raidex_node.raidex_node import RaidexNode
 
@@ -16,6 +15,20 @@ logger = structlog.get_logger('StateChangeHandler')
 
 def handle_state_change(raidex_node, state_change):
 
+    data_manager = raidex_node.data_manager
+    state_storage = raidex_node.state_storage
+
+    if state_storage is not None:
+        state_storage.record(state_change)
+
+    dispatch_state_change(raidex_node, state_change)
+
+    if state_storage is not None:
+        state_storage.after_state_change(data_manager, state_change)
+
+
+def dispatch_state_change(raidex_node, state_change):
+
     data_manager = raidex_node.data_manager
 
     if isinstance(state_change, OfferStateChange):
@@ -55,8 +68,10 @@ def handle_offer_timeout(data_manager: DataManager, state_change: OfferTimeoutSt
         offer = data_manager.offer_manager.get_offer(state_change.offer_id)
         offer.timeout()
         logger.info(f'Offer timeout: {offer.offer_id}, timeout at: {state_change.timeout_date}')
-    elif data_manager.matching_engine.offer_book.contains(state_change.offer_id):
-        data_manager.matching_engine.offer_book.remove_offer(state_change.offer_id)
+    else:
+        # foreign offers are evicted by the OfferEvictionTask,
+        # journals can still hold timeouts for them
+        data_manager.matching_engine.offer_book.remove_offers([state_change.offer_id])
 
     data_manager.timeout_handler.clean_up_timeout(state_change.offer_id)
 
@@ -79,8 +94,8 @@ def handle_offer_published(data_manager: DataManager, event: OfferPublishedState
         offer = data_manager.offer_manager.get_offer(offer_id)
         offer.received_offer()
     else:
+        # evicted by the OfferEvictionTask when it times out
         data_manager.matching_engine.offer_book.insert_offer(offer_book_entry)
-        data_manager.timeout_handler.create_new_timeout(offer_book_entry.offer, OFFER_THRESHOLD_TIME)
 
 
 def handle_commitment_proof(data_manager: DataManager, offer, state_change: CommitmentProofStateChange):
@@ -124,8 +139,6 @@ def handle_transfer_received(data_manager: DataManager, state_change: TransferRe
 
     if match.offer.state == 'completed':
         data_manager.timeout_handler.clean_up_timeout(offer_id)
-        from raidex.raidex_node.order import fsm_offer
-        fsm_offer.remove_model(match.offer)
 
 
 def handle_channel_status_update(raidex_node: RaidexNode, state_change: ChannelStatusStateChange):
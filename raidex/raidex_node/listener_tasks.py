@@ -1,10 +1,19 @@
 import gevent
 import structlog
 
-from raidex.message_broker.listeners import OfferTakenListener, OfferListener, SwapCompletedListener
+from raidex.message_broker.listeners import (
+    OfferTakenListener,
+    VerifiedOfferListener,
+    SwapCompletedListener
+)
 from raidex.raidex_node.architecture.state_change import OfferPublishedStateChange
 from raidex.raidex_node.architecture.event_architecture import dispatch_state_changes
-from raidex.utils import pex
+from raidex.utils import pex, timestamp
+from raidex.constants import (
+    OFFER_THRESHOLD_TIME,
+    OFFER_EVICTION_INTERVAL,
+    OFFER_EVICTION_BATCH_SIZE
+)
 from eth_utils import int_to_big_endian
 
 log = structlog.get_logger('node.listener_tasks')
@@ -27,25 +36,79 @@ class ListenerTask(gevent.Greenlet):
 
 
 class OfferTakenTask(ListenerTask):
+    """Removes the taken offers from the book, all taken ones received so far in one batch"""
+
     def __init__(self, offer_book, trades, message_broker):
         self.trades = trades
         self.offer_book = offer_book
         super(OfferTakenTask, self).__init__(OfferTakenListener(message_broker))
 
+    def _run(self):
+        self.listener.start()
+        while True:
+            self.process(self.listener.get_all())
+
     def process(self, data):
-        offer_id = data
-        if self.offer_book.contains(offer_id):
-            log.debug('Offer {} is taken'.format(offer_id))
-            offer = self.offer_book.get_offer_by_id(offer_id)
-            self.trades.add_pending(offer)
-            self.offer_book.remove_offer(offer_id)
+        offer_ids = data
+        for offer_entry in self.offer_book.remove_offers(offer_ids):
+            log.debug('Offer {} is taken'.format(offer_entry.offer_id))
+            self.trades.add_pending(offer_entry.offer)
+
+
+class OfferEvictionTask(gevent.Greenlet):
+    """
+    Evicts the timed out offers from the book, in batches so that many offers timing out at once
+    don't block the other greenlets. Offers are evicted `threshold` seconds before their timeout,
+    when taking them is no longer safe.
+    Taken offers whose swap did not complete `threshold` seconds after their timeout
+    are dropped from the pending trades.
+    """
+
+    def __init__(self, offer_book, trades=None, threshold=OFFER_THRESHOLD_TIME,
+                 interval=OFFER_EVICTION_INTERVAL, batch_size=OFFER_EVICTION_BATCH_SIZE):
+        self.offer_book = offer_book
+        self.trades = trades
+        self.threshold = threshold
+        self.interval = interval
+        self.batch_size = batch_size
+        self.nof_evicted = 0
+        gevent.Greenlet.__init__(self)
+
+    def evict(self, now=None):
+        """:return: number of evicted offers"""
+        if now is None:
+            now = timestamp.time()
+        expired_at = now + int(timestamp.to_milliseconds(self.threshold))
+        nof_evicted = 0
+        while True:
+            evicted = self.offer_book.evict_expired(expired_at, self.batch_size)
+            nof_evicted += len(evicted)
+            if len(evicted) < self.batch_size:
+                break
+            gevent.idle()
+        self.nof_evicted += nof_evicted
+        if self.trades is not None:
+            self.trades.expire_pending(now - int(timestamp.to_milliseconds(self.threshold)))
+        return nof_evicted
+
+    def _run(self):
+        while True:
+            self.evict()
+            # wake up early if the next offer times out before the interval passed
+            delay = self.interval
+            next_timeout_date = self.offer_book.next_timeout_date
+            if next_timeout_date is not None:
+                expired_at = next_timeout_date - int(timestamp.to_milliseconds(self.threshold))
+                delay = min(delay, max(timestamp.to_seconds(expired_at - timestamp.time()), 0))
+            gevent.sleep(delay)
 
 
 class OfferBookTask(ListenerTask):
 
-    def __init__(self, offer_book, market, message_broker):
+    def __init__(self, offer_book, market, message_broker, **verifier_kwargs):
         self.offer_book = offer_book
-        super(OfferBookTask, self).__init__(OfferListener(market, message_broker))
+        listener = VerifiedOfferListener(market, message_broker, **verifier_kwargs)
+        super(OfferBookTask, self).__init__(listener)
 
     def process(self, data):
         offer_entry = data
@@ -0,0 +1,120 @@
+import json
+
+from gevent.queue import Queue, Full, Empty
+
+from raidex.raidex_node.offer_grouping import PRICE_GROUP_PRECISION
+from raidex.raidex_node.order.offer import OfferType
+from raidex.raidex_node.offer_book import DepthView
+from raidex.constants import FEED_QUEUE_SIZE, FEED_KEEPALIVE_INTERVAL
+
+SIDES = {
+    OfferType.BUY: 'buys',
+    OfferType.SELL: 'sells',
+}
+
+
+def encode_line(obj):
+    return json.dumps(obj) + '\n'
+
+
+def serialize_level(bucket):
+    return dict(price=bucket.price, amount=bucket.amount, count=bucket.count,
+                timeout=bucket.avg_timeout)
+
+
+class FeedSubscription(object):
+    """The pending, already serialized lines of one client of the MarketFeed"""
+
+    def __init__(self, queue_size):
+        self.queue = Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, line):
+        try:
+            self.queue.put_nowait(line)
+        except Full:
+            self.overflowed = True
+            return False
+        return True
+
+    def iter_lines(self, keepalive_interval=FEED_KEEPALIVE_INTERVAL):
+        """
+        Yields the pending lines,
+        and an empty line if nothing happened within the keepalive interval.
+        Ends when the client didn't keep up, it has to reconnect and start from a new snapshot.
+        """
+        while not self.overflowed:
+            try:
+                yield self.queue.get(timeout=keepalive_interval)
+            except Empty:
+                yield '\n'
+
+
+class MarketFeed(object):
+    """
+    Streams the price levels of the offer book and the completed trades to many clients.
+
+    A new subscription starts with a snapshot of the grouped book. Afterwards every change of
+    a price level and every completed trade is sent as a delta with a consecutive sequence number,
+    the snapshot carries the sequence number of the last delta it already contains.
+    Deltas are serialized once and shared by all subscriptions.
+    """
+
+    def __init__(self, offer_book, trades_view, price_group_precision=PRICE_GROUP_PRECISION,
+                 queue_size=FEED_QUEUE_SIZE):
+        self.offer_book = offer_book
+        self.price_group_precision = price_group_precision
+        self.queue_size = queue_size
+        self.sequence = 0
+        self.subscriptions = set()
+
+        offer_book.observers.append(self.on_offer_change)
+        trades_view.observers.append(self.on_trade)
+
+    def subscribe(self):
+        # snapshot and registration happen without a context switch,
+        # no delta can get lost in between
+        subscription = FeedSubscription(self.queue_size)
+        subscription.put(encode_line(self.snapshot()))
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def snapshot(self):
+        buys = self.offer_book.buys.depth.levels(self.price_group_precision)
+        sells = self.offer_book.sells.depth.levels(self.price_group_precision)
+        return dict(
+            type='snapshot',
+            seq=self.sequence,
+            buys=[serialize_level(bucket) for bucket in buys],
+            sells=[serialize_level(bucket) for bucket in reversed(sells)],
+        )
+
+    def on_offer_change(self, offer_view, offer_entry, added):
+        bucket = offer_view.depth.bucket_of(offer_entry, self.price_group_precision)
+        delta = dict(type='level', side=SIDES[offer_entry.offer.type])
+        if bucket is None:
+            price = DepthView.price_of(offer_entry, self.price_group_precision)
+            delta.update(action='remove', price=price, amount=0, count=0)
+        else:
+            action = 'add' if added and bucket.count == 1 else 'change'
+            delta.update(action=action, **serialize_level(bucket))
+        self.publish(delta)
+
+    def on_trade(self, trade):
+        offer = trade.offer
+        self.publish(dict(type='trade', timestamp=trade.timestamp, price=offer.price,
+                          amount=offer.base_amount, side=offer.type.name))
+
+    def publish(self, delta):
+        self.sequence += 1
+        if not self.subscriptions:
+            return
+        delta['seq'] = self.sequence
+        line = encode_line(delta)
+        for subscription in list(self.subscriptions):
+            if not subscription.put(line):
+                # the client is too slow, drop it instead of buffering without limits
+                self.subscriptions.discard(subscription)
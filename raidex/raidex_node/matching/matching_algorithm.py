@@ -1,12 +1,19 @@
-
-
 def match_limit(offer_book, order):
 
-    matching_offers = offer_book.get_offers_by_price(order.price, order.order_type)
-    matching_offers.sort(key=lambda x: x.base_amount, reverse=True)
     amount_left = order.amount
     take_offers = list()
 
+    price_level = offer_book.get_price_level(order.price, order.order_type)
+    if price_level is None:
+        return take_offers, amount_left
+
+    # the whole price level fits into the order, take all offers in FIFO order
+    if price_level.amount <= amount_left:
+        take_offers.extend(price_level.values())
+        return take_offers, amount_left - price_level.amount
+
+    matching_offers = sorted(price_level.values(), key=lambda x: x.base_amount, reverse=True)
+
     for offer in matching_offers:
 
         if amount_left >= offer.base_amount:
@@ -14,3 +21,38 @@ def match_limit(offer_book, order):
             amount_left -= offer.base_amount
 
     return take_offers, amount_left
+
+
+def match_limit_crossing(offer_book, order):
+    """
+    Matches the order against all counter offers with an equal or better price,
+    starting at the best price level (price-time priority).
+
+    An order that can't be filled completely is filled partially, the returned amount_left
+    is the part of the order that remains unfilled.
+    Offers in the book can only be taken as a whole,
+    offers bigger than the amount left are skipped.
+
+    :param offer_book: the OfferBook to match against
+    :param order: the incoming LimitOrder
+    :return: tuple of the OfferBookEntries to take, in matching order, and the amount left
+    """
+
+    amount_left = order.amount
+    take_offers = list()
+
+    for price_level in offer_book.iter_crossing_price_levels(order.price, order.order_type):
+
+        if price_level.amount <= amount_left:
+            take_offers.extend(price_level.values())
+            amount_left -= price_level.amount
+        else:
+            for offer in price_level.values():
+                if amount_left >= offer.base_amount:
+                    take_offers.append(offer)
+                    amount_left -= offer.base_amount
+
+        if amount_left == 0:
+            break
+
+    return take_offers, amount_left
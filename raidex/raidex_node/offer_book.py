@@ -1,11 +1,18 @@
 from __future__ import print_function
 import random
+import sys
+from collections import OrderedDict
 
-from sortedcontainers import SortedDict
+import rlp
+
+from sortedcontainers import SortedDict, SortedList
 import structlog
 from raidex.utils import pex
+from raidex.utils.address import InternedAddresses
+from raidex.messages import CommitmentProof
 from raidex.utils.timestamp import to_str_repr
 from raidex.raidex_node.order.offer import OfferType
+from raidex.constants import DEPTH_PRECISIONS
 
 from eth_utils import int_to_big_endian
 
@@ -74,11 +81,37 @@ class OfferDeprecated(object):
 
 
 class OfferBookEntry:
+    """
+    An offer in the book. There are many of them, the entries are kept compact:
+    the price is calculated once, the commitment proof is kept rlp encoded until it is needed
+    for taking the offer, and the book shares the initiator addresses between the offers of
+    a maker.
+    """
+
+    __slots__ = [
+        'offer',
+        'initiator',
+        'price',
+        'commitment_proof_data',
+        '_commitment_proof',
+    ]
 
     def __init__(self, offer, initiator, commitment_proof):
+        """:param commitment_proof: CommitmentProof, or already rlp encoded, None if unknown"""
         self.offer = offer
         self.initiator = initiator
-        self.commitment_proof = commitment_proof
+        self.price = offer.price
+        if commitment_proof is not None and not isinstance(commitment_proof, bytes):
+            commitment_proof = rlp.encode(commitment_proof)
+        self.commitment_proof_data = commitment_proof
+        self._commitment_proof = None
+
+    @property
+    def commitment_proof(self):
+        """decoded on the first access, e.g. when the offer is taken"""
+        if self._commitment_proof is None and self.commitment_proof_data is not None:
+            self._commitment_proof = rlp.decode(self.commitment_proof_data, CommitmentProof)
+        return self._commitment_proof
 
     @property
     def offer_id(self):
@@ -92,13 +125,156 @@ class OfferBookEntry:
     def quote_amount(self):
         return self.offer.quote_amount
 
+    @property
+    def timeout_date(self):
+        return self.offer.timeout_date
+
+    def __getstate__(self):
+        return self.offer, self.initiator, self.commitment_proof_data
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def memory_size(self):
+        """
+        :return: approximate bytes of the entry and its offer,
+                 without the shared initiator and a decoded commitment proof
+        """
+        offer = self.offer
+        values = (offer.offer_id, offer.base_amount, offer.quote_amount, offer.timeout_date,
+                  self.price)
+        size = sys.getsizeof(self) + sys.getsizeof(offer)
+        size += sum(sys.getsizeof(value) for value in values)
+        if self.commitment_proof_data is not None:
+            size += sys.getsizeof(self.commitment_proof_data)
+        return size
+
+
+class PriceLevel(object):
+    """
+    Holds all OfferBookEntries with the same price in FIFO order,
+    together with the accumulated base_amount of the level.
+
+    """
+
+    __slots__ = [
+        'price',
+        'amount',
+        'entries',
+    ]
+
+    def __init__(self, price):
+        self.price = price
+        self.amount = 0
+        self.entries = OrderedDict()
+
+    def append(self, entry):
+        self.entries[entry.offer_id] = entry
+        self.amount += entry.base_amount
+
+    def remove(self, entry):
+        del self.entries[entry.offer_id]
+        self.amount -= entry.base_amount
+
+    def values(self):
+        # returns the entries in the order they were added
+        return self.entries.values()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "PriceLevel<price={} amount={} offers={}>".format(
+            self.price, self.amount, len(self))
+
+
+class DepthBucket(object):
+    """
+    Aggregates of all offers whose price falls into the same bucket
+    when grouped with a price precision.
+    Same interface as offer_grouping.GroupedOffer, as far as it is used by the API.
+    """
+
+    __slots__ = [
+        'key',
+        'scale',
+        'amount',
+        'count',
+        'timeout_sum',
+    ]
+
+    def __init__(self, key, scale):
+        self.key = key
+        self.scale = scale
+        self.amount = 0
+        self.count = 0
+        self.timeout_sum = 0
+
     @property
     def price(self):
-        return self.offer.price
+        return self.key / self.scale
 
     @property
-    def timeout_date(self):
-        return self.offer.timeout_date
+    def avg_timeout(self):
+        return self.timeout_sum / self.count
+
+    def __repr__(self):
+        return "DepthBucket<price={} amount={} offers={}>".format(
+            self.price, self.amount, self.count)
+
+
+class DepthView(object):
+    """
+    Market depth of one side of the book, aggregated per price bucket for every configured
+    precision. The buckets are kept up to date on every added and removed offer,
+    instead of being regrouped per request.
+
+    """
+
+    def __init__(self, precisions=DEPTH_PRECISIONS):
+        self.buckets = {precision: SortedDict() for precision in precisions}
+
+    def add(self, entry):
+        for precision, buckets in self.buckets.items():
+            key = self._key(entry, precision)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = DepthBucket(key, 10 ** precision)
+                buckets[key] = bucket
+            bucket.amount += entry.base_amount
+            bucket.count += 1
+            bucket.timeout_sum += entry.timeout_date
+
+    def remove(self, entry):
+        for precision, buckets in self.buckets.items():
+            key = self._key(entry, precision)
+            bucket = buckets[key]
+            bucket.amount -= entry.base_amount
+            bucket.count -= 1
+            bucket.timeout_sum -= entry.timeout_date
+            if bucket.count == 0:
+                del buckets[key]
+
+    def bucket_of(self, entry, precision):
+        """:return: the DepthBucket the entry's price falls into, None if the bucket is empty"""
+        return self.buckets[precision].get(self._key(entry, precision))
+
+    def levels(self, precision):
+        """
+        :return: the DepthBuckets with the lowest price first
+        :raises KeyError: if the precision is not aggregated
+        """
+        return list(self.buckets[precision].values())
+
+    @classmethod
+    def price_of(cls, entry, precision):
+        """:return: the price of the bucket the entry falls into"""
+        return cls._key(entry, precision) / 10 ** precision
+
+    @staticmethod
+    def _key(entry, precision):
+        # floor of the price with `precision` digits after the decimal point, as scaled integer
+        return entry.quote_amount * 10 ** precision // entry.base_amount
 
 
 class OfferView(object):
@@ -106,11 +282,16 @@ class OfferView(object):
     Holds a collection of Offers in an RBTree for faster search.
     One OfferView instance holds either BUYs or SELLs
 
+    Additionally the offers are grouped by their price in `price_levels`,
+    so that lookups by price don't have to walk over the single offers.
+
     """
 
     def __init__(self):
         self.offer_entries = SortedDict()
         self.offer_entries_by_id = dict()
+        self.price_levels = SortedDict()
+        self.depth = DepthView()
 
     def add_offer(self, entry):
         assert isinstance(entry, OfferBookEntry)
@@ -118,12 +299,25 @@ class OfferView(object):
         offer_id = entry.offer_id
         offer_price = entry.price
 
+        # a re-added offer replaces the previous entry,
+        # its amount must not be counted twice in its level
+        self.remove_offer(offer_id)
+
         # inserts in the SortedDict
         self.offer_entries[(offer_price, offer_id)] = entry
 
         # inserts in the dict for retrieval by offer_id
         self.offer_entries_by_id[offer_id] = entry
 
+        # appends to the price level, creates the level if it is the first offer for that price
+        price_level = self.price_levels.get(offer_price)
+        if price_level is None:
+            price_level = PriceLevel(offer_price)
+            self.price_levels[offer_price] = price_level
+        price_level.append(entry)
+
+        self.depth.add(entry)
+
         return offer_id
 
     def remove_offer(self, offer_id):
@@ -136,20 +330,56 @@ class OfferView(object):
             # remove from the dict
             del self.offer_entries_by_id[offer_id]
 
+            # remove from the price level, drop the level if it is empty
+            price_level = self.price_levels[entry.price]
+            price_level.remove(entry)
+            if len(price_level) == 0:
+                del self.price_levels[entry.price]
+
+            self.depth.remove(entry)
+
     def get_offer_by_id(self, offer_id):
         return self.offer_entries_by_id.get(offer_id)
 
-    def get_offers_by_price(self, price):
+    def get_price_level(self, price):
+        return self.price_levels.get(price)
 
-        matched_offers = list()
+    def get_offers_by_price(self, price):
+        price_level = self.price_levels.get(price)
+        if price_level is None:
+            return list()
+        return list(price_level.values())
 
-        for offer in self.offer_entries.values():
-            if offer.price == price:
-                matched_offers.append(offer)
-            if offer.price > price:
-                break
+    @property
+    def lowest_price_level(self):
+        if not self.price_levels:
+            return None
+        _, price_level = self.price_levels.peekitem(0)
+        return price_level
 
-        return matched_offers
+    @property
+    def highest_price_level(self):
+        if not self.price_levels:
+            return None
+        _, price_level = self.price_levels.peekitem(-1)
+        return price_level
+
+    def iter_price_levels(self, min_price=None, max_price=None, reverse=False):
+        """
+        :param min_price: lowest price to include, unbounded if None
+        :param max_price: highest price to include, unbounded if None
+        :param reverse: iterate from the highest to the lowest price
+        :return: generator of PriceLevels within the given bounds, sorted by price
+        """
+        prices = self.price_levels.irange(minimum=min_price, maximum=max_price, reverse=reverse)
+        for price in prices:
+            yield self.price_levels[price]
+
+    def get_offers_in_range(self, min_price=None, max_price=None):
+        offers = list()
+        for price_level in self.iter_price_levels(min_price, max_price):
+            offers.extend(price_level.values())
+        return offers
 
     def __len__(self):
         return len(self.offer_entries)
@@ -167,18 +397,39 @@ class OfferBook(object):
     def __init__(self):
         self.buys = OfferView()
         self.sells = OfferView()
+        # (timeout_date, offer_id) of all offers, the first to time out first
+        self.expiries = SortedList()
         self.tasks = dict()
+        # incremented on every change, lets readers detect an unchanged book
+        self.version = 0
+        # callables observer(offer_view, offer_entry, added), called after every insert and remove
+        self.observers = list()
+        # the initiators of the entries, shared between the offers of a maker
+        self.initiators = InternedAddresses()
 
     def insert_offer(self, offer_entry):
         offer = offer_entry.offer
         assert isinstance(offer.type, OfferType)
         if offer.type is OfferType.BUY:
-            self.buys.add_offer(offer_entry)
+            offer_view = self.buys
         elif offer.type is OfferType.SELL:
-            self.sells.add_offer(offer_entry)
+            offer_view = self.sells
         else:
             raise Exception('unsupported offer-type')
-
+        # a rebroadcasted or replayed offer replaces the entry already in the book,
+        # the view replaces it in its levels, its expiry is dropped here
+        replaced = offer_view.get_offer_by_id(offer.offer_id)
+        if offer_entry.initiator is not None:
+            offer_entry.initiator = self.initiators.acquire(offer_entry.initiator)
+        offer_view.add_offer(offer_entry)
+        if replaced is not None:
+            self._release(replaced)
+            self.expiries.discard((replaced.timeout_date, replaced.offer_id))
+            self._notify(replaced, False)
+        self.expiries.add((offer_entry.timeout_date, offer_entry.offer_id))
+
+        self.version += 1
+        self._notify(offer_entry, True)
         return offer_entry.offer_id
 
     def get_offer_by_id(self, offer_id):
@@ -191,18 +442,87 @@ class OfferBook(object):
         return offer_id in self.buys.offer_entries_by_id or offer_id in self.sells.offer_entries_by_id
 
     def remove_offer(self, offer_id):
-        if offer_id in self.buys.offer_entries_by_id:
-            offer_view = self.buys
-        elif offer_id in self.sells.offer_entries_by_id:
-            offer_view = self.sells
-        else:
+        if not self.contains(offer_id):
             raise Exception('offer_id not found')
-
+        self._remove(offer_id)
+        self.version += 1
+
+    def remove_offers(self, offer_ids):
+        """
+        Removes the offers in one batch, offer_ids which are not in the book are ignored.
+        :return: the removed OfferBookEntries
+        """
+        removed = [self._remove(offer_id) for offer_id in offer_ids if self.contains(offer_id)]
+        if removed:
+            self.version += 1
+        return removed
+
+    def _remove(self, offer_id):
+        offer_view = self.buys if offer_id in self.buys.offer_entries_by_id else self.sells
+        offer_entry = offer_view.get_offer_by_id(offer_id)
         offer_view.remove_offer(offer_id)
+        self._release(offer_entry)
+        self.expiries.discard((offer_entry.timeout_date, offer_id))
+        self._notify(offer_entry, False)
+        return offer_entry
+
+    def _release(self, offer_entry):
+        if offer_entry.initiator is not None:
+            self.initiators.release(offer_entry.initiator)
+
+    @property
+    def next_timeout_date(self):
+        """:return: the timeout_date of the offer timing out first, None if the book is empty"""
+        if not self.expiries:
+            return None
+        return self.expiries[0][0]
+
+    def evict_expired(self, now, max_batch=None):
+        """
+        Removes the offers whose timeout_date is not after `now`, those timing out first at first.
+
+        :param max_batch: maximum number of offers to remove, all expired ones if None
+        :return: the removed OfferBookEntries
+        """
+        end = self.expiries.bisect_right((now, float('inf')))
+        if max_batch is not None:
+            end = min(end, max_batch)
+        expired = self.expiries[:end]
+        # drops the entries of offers which are not in the book anymore as well,
+        # otherwise next_timeout_date would stay in the past
+        del self.expiries[:end]
+        return self.remove_offers([offer_id for _, offer_id in expired])
+
+    def _notify(self, offer_entry, added):
+        offer_view = self.buys if offer_entry.offer.type is OfferType.BUY else self.sells
+        for observer in self.observers:
+            observer(offer_view, offer_entry, added)
 
     def get_offers_by_price(self, price, offer_type):
         offer_list = self.buys if offer_type == OfferType.SELL else self.sells
         return offer_list.get_offers_by_price(price)
 
+    def get_price_level(self, price, offer_type):
+        offer_list = self.buys if offer_type == OfferType.SELL else self.sells
+        return offer_list.get_price_level(price)
+
+    def get_best_price_level(self, offer_type):
+        # the best counter offers for a BUY are the cheapest SELLs,
+        # and for a SELL the most expensive BUYs
+        if offer_type == OfferType.BUY:
+            return self.sells.lowest_price_level
+        return self.buys.highest_price_level
+
+    def iter_crossing_price_levels(self, limit_price, offer_type):
+        # iterates the counter price levels from the best price up to the limit price
+        if offer_type == OfferType.BUY:
+            return self.sells.iter_price_levels(max_price=limit_price)
+        return self.buys.iter_price_levels(min_price=limit_price, reverse=True)
+
+    def memory_usage(self):
+        """:return: (number of entries, approximate bytes of the entries)"""
+        entries = list(self.buys.values()) + list(self.sells.values())
+        return len(entries), sum(entry.memory_size() for entry in entries)
+
     def __repr__(self):
         return "OfferBook<buys={} sells={}>".format(len(self.buys), len(self.sells))
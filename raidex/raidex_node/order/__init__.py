@@ -1,8 +1,6 @@
 __all__ = ['offer', 'fsm_offer', 'limit_order']
 
-from transitions.extensions.nesting import NestedState
-from transitions.extensions import HierarchicalMachine as Machine
-
+from raidex.raidex_node.order.fsm import OfferMachine, OfferState
 from raidex.raidex_node.order.offer import Offer
 from raidex.raidex_node.order import events as dispatch
 
@@ -11,31 +9,6 @@ ENTER_PUBLISHED = dispatch.on_enter_published
 ENTER_PROVED = Offer.set_proof.__name__
 ENTER_CANCELLATION = dispatch.on_enter_cancellation
 ENTER_WAIT_FOR_REFUND = dispatch.initiate_refund
-AFTER_STATE_CHANGE = Offer.log_state.__name__
-
-
-class OfferMachine(Machine):
-
-    def set_state(self, state, model=None):
-        super(OfferMachine, self).set_state(state, model)
-        if isinstance(state, str):
-            state = self.get_state(state)
-        model.status = state.parent.name if state.parent else state.name
-
-
-class OfferState(NestedState):
-
-    def __repr__(self):
-        return self.name
-
-    @property
-    def initial(self):
-        if len(self.children) > 0:
-            return self.children[0]
-        return None
-
-    def name(self):
-        return self._name
 
 
 OPEN = OfferState('open')
@@ -96,7 +69,6 @@ TRANSITIONS = [
 
 fsm_offer = OfferMachine(states=OFFER_STATES,
                          transitions=TRANSITIONS,
-                         initial=OPEN,
-                         after_state_change=AFTER_STATE_CHANGE,
-                         send_event=True)
+                         initial=OPEN)
+fsm_offer.add_triggers(Offer)
 
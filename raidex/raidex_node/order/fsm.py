@@ -0,0 +1,210 @@
+class MachineError(Exception):
+    """Raised if a trigger is not valid in the current state of the model"""
+
+
+class OfferState(object):
+    """
+    A state of the offer state machine,
+    states with children are entered in their first (initial) child.
+    The `on_enter` callbacks are called with an EventData,
+    they are either callables or names of model methods.
+    """
+
+    def __init__(self, name, on_enter=None, parent=None):
+        self.name = name
+        self.on_enter = tuple(on_enter or ())
+        self.parent = parent
+        self.children = list()
+        if parent is not None:
+            parent.children.append(self)
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def initial(self):
+        if len(self.children) > 0:
+            return self.children[0]
+        return None
+
+    @property
+    def ancestors(self):
+        """the state itself and its parents, outermost last"""
+        state = self
+        while state is not None:
+            yield state
+            state = state.parent
+
+
+class EventData(object):
+
+    __slots__ = [
+        'machine',
+        'model',
+        'event',
+        'args',
+        'kwargs',
+    ]
+
+    def __init__(self, machine, model, event, args, kwargs):
+        self.machine = machine
+        self.model = model
+        self.event = event
+        self.args = args
+        self.kwargs = kwargs
+
+
+class OfferMachine(object):
+    """
+    Table driven hierarchical state machine, shared by all offers.
+
+    The states and transitions are compiled once into integer state codes and a dispatch table
+    trigger -> [(destination code, on_enter callbacks) per source code].
+    A model only carries its state code and a reference to the machine,
+    the trigger methods are bound to the model class once by `add_triggers`.
+
+    Transitions of a parent state apply to all of its children,
+    a transition defined on the child itself takes precedence.
+    Entering a state calls the `on_enter` callbacks of the state and of the parents
+    that are entered with it, also if the state is entered again from itself.
+    Models that reach a state without outgoing transitions are removed from the machine.
+    """
+
+    def __init__(self, states, transitions, initial):
+        self.states = list()
+        for state in states:
+            self._add_state(state)
+        self.codes = {state.name: code for code, state in enumerate(self.states)}
+        # status of a state is the name of its outermost parent
+        self.statuses = [list(state.ancestors)[-1].name for state in self.states]
+        self.initial = self._leaf_code(initial)
+
+        self.table = dict()
+        self._compile(transitions)
+        self.terminal = frozenset(code for code, state in enumerate(self.states)
+                                  if not state.children and
+                                  not any(row[code] for row in self.table.values()))
+        self.models = dict()
+
+    def _add_state(self, state):
+        self.states.append(state)
+        for child in state.children:
+            self._add_state(child)
+
+    def _get_state(self, state):
+        if isinstance(state, OfferState):
+            return state
+        return self.states[self.codes[state]]
+
+    def _leaf_code(self, state):
+        state = self._get_state(state)
+        while state.children:
+            state = state.initial
+        return self.codes[state.name]
+
+    def _leaves(self, state):
+        if not state.children:
+            return [state]
+        return [leaf for child in state.children for leaf in self._leaves(child)]
+
+    def _compile(self, transitions):
+        def depth(transition):
+            return len(list(self._get_state(transition['source']).ancestors))
+
+        # deepest sources first,
+        # so that transitions of a child take precedence over those of its parent
+        for transition in sorted(transitions, key=depth, reverse=True):
+            row = self.table.setdefault(transition['trigger'], [None] * len(self.states))
+            dest_code = self._leaf_code(transition['dest'])
+            dest = self.states[dest_code]
+            for source in self._leaves(self._get_state(transition['source'])):
+                source_code = self.codes[source.name]
+                if row[source_code] is not None:
+                    continue
+                row[source_code] = (dest_code, self._entered_callbacks(source, dest))
+
+    @staticmethod
+    def _entered_callbacks(source, dest):
+        source_ancestors = set(source.ancestors)
+        # a state entered from itself is left and entered again, its parents are not
+        source_ancestors.discard(dest)
+        entered = [state for state in dest.ancestors if state not in source_ancestors]
+        return tuple(callback for state in reversed(entered) for callback in state.on_enter)
+
+    def add_triggers(self, model_class):
+        """
+        Binds a method for every trigger and a `to_<state>` method for every state
+        to the model class
+        """
+        for trigger in self.table:
+            setattr(model_class, trigger, _make_trigger(trigger))
+        for state in self.states:
+            setattr(model_class, 'to_' + state.name, _make_to_state(state.name))
+
+    def add_model(self, model, initial=None):
+        model._machine = self
+        model._state_code = self.initial if initial is None else self._leaf_code(initial)
+        self.models[id(model)] = model
+
+    def remove_model(self, model):
+        self.models.pop(id(model), None)
+
+    def set_state(self, state, model):
+        """Puts the model into `state` without calling any callbacks"""
+        model._state_code = code = self._leaf_code(state)
+        if code in self.terminal:
+            self.remove_model(model)
+
+    def state_of(self, model):
+        return self.states[model._state_code].name
+
+    def status_of(self, model):
+        return self.statuses[model._state_code]
+
+    def trigger(self, model, trigger, *args, **kwargs):
+        row = self.table.get(trigger)
+        transition = row[model._state_code] if row is not None else None
+        if transition is None:
+            raise MachineError("Can't trigger event {} from state {}!".format(
+                trigger, self.state_of(model)))
+
+        dest_code, callbacks = transition
+        return self._enter(model, dest_code, callbacks, trigger, args, kwargs)
+
+    def to_state(self, model, state, *args, **kwargs):
+        """Enters `state` from any state, calling the `on_enter` callbacks like a transition"""
+        dest_code = self._leaf_code(state)
+        callbacks = self._entered_callbacks(self.states[model._state_code], self.states[dest_code])
+        trigger = 'to_' + self.states[dest_code].name
+        return self._enter(model, dest_code, callbacks, trigger, args, kwargs)
+
+    def _enter(self, model, dest_code, callbacks, trigger, args, kwargs):
+        model._state_code = dest_code
+        if callbacks:
+            event_data = EventData(self, model, trigger, args, kwargs)
+            for callback in callbacks:
+                if isinstance(callback, str):
+                    getattr(model, callback)(event_data)
+                else:
+                    callback(event_data)
+        if dest_code in self.terminal:
+            self.remove_model(model)
+        return True
+
+
+def _make_trigger(trigger):
+
+    def trigger_method(model, *args, **kwargs):
+        return model._machine.trigger(model, trigger, *args, **kwargs)
+
+    trigger_method.__name__ = trigger
+    return trigger_method
+
+
+def _make_to_state(state):
+
+    def to_state_method(model, *args, **kwargs):
+        return model._machine.to_state(model, state, *args, **kwargs)
+
+    to_state_method.__name__ = 'to_' + state
+    return to_state_method
@@ -27,6 +27,14 @@ class OfferType(Enum):
 
 class BasicOffer:
 
+    __slots__ = [
+        'offer_id',
+        'type',
+        'base_amount',
+        'quote_amount',
+        'timeout_date',
+    ]
+
     def __init__(self, offer_id, offer_type, base_amount, quote_amount, timeout_date):
         self.offer_id = offer_id
         self.type = offer_type
@@ -38,6 +46,15 @@ class BasicOffer:
     def price(self):
         return float(self.quote_amount) / self.base_amount
 
+    def __getstate__(self):
+        state = dict(getattr(self, '__dict__', ()))
+        state.update((name, getattr(self, name)) for name in BasicOffer.__slots__)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __repr__(self):
         return "Offer<pex(id)={} amount={} price={} type={} timeout={}>".format(
             pex(int_to_big_endian(self.offer_id)),
@@ -105,11 +122,13 @@ class Offer(BasicOffer):
         if 'proof' in event_data.kwargs:
             self.proof = event_data.kwargs['proof']
 
-    def log_state(self, *args):
-        if hasattr(self, 'state'):
-            print(f'Offer {self.offer_id} - State Changed to: {self.state}')
-        if hasattr(self, 'status'):
-            print(f'Status: {self.status}')
+    @property
+    def state(self):
+        return self._machine.state_of(self)
+
+    @property
+    def status(self):
+        return self._machine.status_of(self)
 
 
 class OfferFactory:
@@ -141,7 +160,18 @@ class OfferFactory:
         fsm_offer.add_model(offer_model)
         return offer_model
 
-
-
-
-
+    @staticmethod
+    def restore_offer(offer_id, offer_type, base_amount, quote_amount, timeout_date, trader_role,
+                      state, proof=None):
+        # puts the offer into `state` without triggering any state change callbacks
+        offer_model = Offer(offer_id,
+                            offer_type,
+                            base_amount,
+                            quote_amount,
+                            timeout_date,
+                            trader_role)
+        offer_model.proof = proof
+        from raidex.raidex_node.order import fsm_offer
+        fsm_offer.add_model(offer_model)
+        fsm_offer.set_state(state, model=offer_model)
+        return offer_model
@@ -1,16 +1,29 @@
 from __future__ import print_function
+import json
 from gevent import monkey
 import structlog
 
 from raidex.raidex_node.architecture.event_architecture import Processor
 from raidex.raidex_node.architecture.state_change import StateChange
 from raidex.raidex_node.offer_book import OfferBook
-from raidex.raidex_node.listener_tasks import OfferBookTask
+from raidex.raidex_node.listener_tasks import (
+    OfferBookTask,
+    OfferTakenTask,
+    OfferEvictionTask,
+    SwapCompletedTask
+)
 from raidex.raidex_node.trades import TradesView
+from raidex.raidex_node.market_feed import MarketFeed
 from raidex.raidex_node.trader.raiden_info import RaidenInfo
-from raidex.raidex_node.offer_grouping import group_offers, group_trades_from, make_price_bins, get_n_recent_trades
+from raidex.raidex_node.offer_grouping import (
+    PRICE_GROUP_PRECISION,
+    group_trades_from,
+    make_price_bins,
+    get_n_recent_trades
+)
 from raidex.raidex_node.architecture.data_manager import DataManager
 from raidex.constants import CS_ADDRESS
+from raidex.utils import timestamp
 
 monkey.patch_all()
 log = structlog.get_logger('node')
@@ -37,10 +50,18 @@ class RaidexNode(Processor):
         self._get_trades = self._trades_view.trades
         self.data_manager = DataManager(self.offer_book, token_pair)
         self.raiden_info = RaidenInfo()
+        # optional StateStorage, journals the handled state changes and snapshots the data manager
+        self.state_storage = None
+        # (offer book version, precision) -> serialized market depth
+        self._depth_snapshots = dict()
+        self.market_feed = MarketFeed(self.offer_book, self._trades_view)
 
     def start(self):
         log.info('Starting raidex node')
         OfferBookTask(self.offer_book, self.token_pair, self.message_broker).start()
+        OfferTakenTask(self.offer_book, self._trades_view, self.message_broker).start()
+        SwapCompletedTask(self._trades_view, self.message_broker).start()
+        OfferEvictionTask(self.offer_book, self._trades_view).start()
         self.raiden_info.start()
 
     def _process_finished_limit_order(self, order_task):
@@ -88,11 +109,53 @@ class RaidexNode(Processor):
     def sells(self):
         return self.offer_book.sells.values()
 
-    def grouped_buys(self):
-        return group_offers(self.buys())
+    def grouped_buys(self, price_group_precision=PRICE_GROUP_PRECISION):
+        return self.offer_book.buys.depth.levels(price_group_precision)
 
-    def grouped_sells(self):
-        return group_offers(self.sells())
+    def grouped_sells(self, price_group_precision=PRICE_GROUP_PRECISION):
+        return self.offer_book.sells.depth.levels(price_group_precision)
+
+    def depth_snapshot(self, price_group_precision=PRICE_GROUP_PRECISION):
+        """
+        The grouped buys (lowest price first) and sells (highest price first) as serialized json,
+        only encoded again when the offer book changed.
+
+        :return: (offer book version, json bytes)
+        """
+        version = self.offer_book.version
+        snapshot = self._depth_snapshots.get(price_group_precision)
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+
+        def serialize(buckets):
+            return [dict(amount=bucket.amount, price=bucket.price, timeout=bucket.avg_timeout)
+                    for bucket in buckets]
+
+        data = dict(
+            buys=serialize(self.grouped_buys(price_group_precision)),
+            sells=serialize(reversed(self.grouped_sells(price_group_precision))),
+        )
+        snapshot = (version, json.dumps(dict(data=data, version=version)).encode('utf-8'))
+        self._depth_snapshots[price_group_precision] = snapshot
+        return snapshot
+
+    def offer_book_memory(self):
+        """
+        :return: the number of offers in the book and the approximate bytes they take,
+                 in total and per entry
+        """
+        nof_entries, size = self.offer_book.memory_usage()
+        return dict(entries=nof_entries, bytes=size,
+                    bytes_per_entry=size / nof_entries if nof_entries else 0)
+
+    def metrics(self):
+        metrics = dict(
+            nof_offers=len(self.offer_book.buys) + len(self.offer_book.sells),
+            nof_pending_trades=len(self._trades_view.pending_offer_by_id),
+            offer_book_memory=self.offer_book_memory(),
+        )
+        metrics.update(self.data_manager.timeout_handler.gauges())
+        return metrics
 
     def trades(self, from_timestamp=None):
         return self._get_trades(from_timestamp=from_timestamp)
@@ -106,7 +169,13 @@ class RaidexNode(Processor):
     def price_chart_bins(self, nof_buckets, interval):
         if nof_buckets < 1 or interval < 0.:
             raise ValueError()
-        return make_price_bins(self._get_trades, nof_buckets, interval)
+        price_bins = self._trades_view.candles.price_bins(nof_buckets,
+                                                          int(timestamp.to_milliseconds(interval)),
+                                                          timestamp.time())
+        if price_bins is None:
+            # interval isn't a multiple of a candle resolution or reaches beyond the kept candles
+            price_bins = make_price_bins(self._get_trades, nof_buckets, interval)
+        return price_bins
 
     def market_price(self, trade_count=20):
         """Calculate a market price based on the most recent trades.
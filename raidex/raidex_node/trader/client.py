@@ -1,13 +1,9 @@
 from __future__ import print_function
 
 
-import json
 from gevent import monkey; monkey.patch_socket()
-from gevent import Greenlet
 from gevent.queue import Queue
-from polling import poll
 
-import requests
 from eth_utils import encode_hex
 from raidex.raidex_node.trader.events import TraderEvent
 from raidex.utils.address import encode_address
@@ -20,10 +16,12 @@ from raidex.trader_mock.trader import (
     BalanceUpdateTask
 )
 from raidex.utils.gevent_helpers import make_async
+from raidex.utils.http_session import make_session
+from raidex.raidex_node.trader.listener.payment_poller import PaymentPoller
 from raidex.raidex_node.architecture.event_architecture import Processor
 import structlog
 
-from raidex.constants import RAIDEN_POLL_INTERVAL
+from raidex.constants import HTTP_TIMEOUT
 
 log = structlog.get_logger('trader client')
 
@@ -31,7 +29,8 @@ log = structlog.get_logger('trader client')
 class TraderClient(Processor):
     """Handles the actual token swap. A client/server mock for now. Later will use a raiden node"""
 
-    def __init__(self, address, host='localhost', port=5001, market: TokenPair = None, api_version='v1' , commitment_amount=10):
+    def __init__(self, address, host='localhost', port=5001, market: TokenPair = None,
+                 api_version='v1', commitment_amount=10, session=None, timeout=HTTP_TIMEOUT):
         super(TraderClient, self).__init__(TraderEvent)
         self.address = address
         self.market = market
@@ -39,6 +38,9 @@ class TraderClient(Processor):
         self.api_version = api_version
         self.apiUrl = 'http://{}:{}/api/{}'.format(host, port, api_version)
         self.commitment_balance = commitment_amount
+        # keep-alive connections to the raiden node, shared by payments and event polling
+        self.session = session if session is not None else make_session()
+        self.timeout = timeout
         self._is_running = False
 
     @property
@@ -141,7 +143,8 @@ class TraderClient(Processor):
             body['secret_hash'] = encode_hex(secret_hash)
             log.debug(f'Secret Hash given: {body["secret_hash"]}')
 
-        result = requests.post('{}/payments/{}/{}'.format(self.apiUrl, encoded_token, encoded_target), json=body)
+        url = '{}/payments/{}/{}'.format(self.apiUrl, encoded_token, encoded_target)
+        result = self.session.post(url, json=body, timeout=self.timeout)
 
         log.debug(f'TOKEN: {encoded_token}, ADDRESS: {encoded_target}, AMOUNT: {amount}, IDENTIFIER: {identifier}')
 
@@ -158,10 +161,8 @@ class TraderClient(Processor):
             'settle_timeout': 500
         }
 
-
-        requests.put(f'{self.apiUrl}/channels', headers={'Content-Type': 'application/json', },
-                     json=body)
-
+        self.session.put(f'{self.apiUrl}/channels', headers={'Content-Type': 'application/json'},
+                         json=body, timeout=self.timeout)
 
     def listen_for_events(self, transform=None):
         """Starts listening for new messages on this topic
@@ -179,35 +180,13 @@ class TraderClient(Processor):
 
         listener = Listener(self.address, event_queue_async, transform)
 
-        events = {}
-
-        def request_events(events):
-
-            r = requests.get('{}/payments'.format(self.apiUrl))
-
-            for line in r.iter_lines():
-                # filter out keep-alive new lines
-                if line:
-                    decoded_line = line.decode('utf-8')
-                    raw_data = json.loads(decoded_line)
-
-                    for e in raw_data:
-                        event = encode(e, e['event'])
-                        if event is None:
-                            continue
-
-                        event_id = event.identifier_tuple
-
-                        if event_id in events:
-                            continue
-
-                        transformed_event = transform(event)
-                        events[event_id] = transformed_event
-
-                        if transformed_event is not None:
-                            event_queue_async.put(transformed_event)
+        def on_event(event):
+            transformed_event = transform(event) if transform is not None else event
+            if transformed_event is not None:
+                event_queue_async.put(transformed_event)
 
-        Greenlet.spawn(poll, target=request_events, args=(events,), step=RAIDEN_POLL_INTERVAL, poll_forever=True)
+        PaymentPoller(self.session, '{}/payments'.format(self.apiUrl), encode, on_event,
+                      timeout=self.timeout).start()
 
         return listener
 
@@ -20,7 +20,11 @@ class ChannelFilterEvent(RaidenListenerEvent):
 
 # Events coming from Raiden
 class RaidenEvent(RaidenListenerEvent):
-    pass
+
+    @property
+    def index_key(self):
+        # key of the filters interested in this event, see RaidenEventFilter.index_key
+        return None
 
 
 class PaymentReceivedEvent(RaidenEvent):
@@ -38,6 +42,10 @@ class PaymentReceivedEvent(RaidenEvent):
     def identifier_tuple(self):
         return self.initiator, self.identifier
 
+    @property
+    def index_key(self):
+        return self.identifier_tuple
+
     def as_dict(self):
         return dict(amount=self.amount, initiator=self.initiator, identifier=self.identifier)
 
@@ -4,6 +4,16 @@ from raidex.raidex_node.architecture.filter import Filter
 
 
 class RaidenEventFilter(Filter):
+    # the RaidenEvent classes the filter can match, an empty tuple means any event
+    event_types = ()
+
+    def index_key(self):
+        """
+        The filter only matches events with this `index_key`,
+        None if it has to see all events of its types
+        """
+        return None
+
     def _filter(self, event):
         raise NotImplementedError
 
@@ -16,6 +26,8 @@ class RaidenEventFilter(Filter):
 
 class TransferReceivedFilter(RaidenEventFilter):
 
+    event_types = (PaymentReceivedEvent,)
+
     def __init__(self, initiator, identifier):
         self.initiator = initiator
         self.identifier = identifier
@@ -29,6 +41,9 @@ class TransferReceivedFilter(RaidenEventFilter):
             return False
         return True
 
+    def index_key(self):
+        return self.initiator, self.identifier
+
     def _transform(self, event: PaymentReceivedEvent):
         return TransferReceivedStateChange(event)
 
@@ -38,6 +53,8 @@ class TransferReceivedFilter(RaidenEventFilter):
 
 class ChannelFilter(RaidenEventFilter):
 
+    event_types = (ChannelStatusRaidenEvent,)
+
     def __init__(self, channel_data_raw):
         self.channel_data_raw = channel_data_raw
 
@@ -0,0 +1,208 @@
+import json
+import time
+from collections import OrderedDict
+
+import gevent
+import structlog
+from requests import RequestException
+
+from raidex.constants import (
+    RAIDEN_POLL_INTERVAL,
+    RAIDEN_POLL_MAX_INTERVAL,
+    RAIDEN_POLL_PAGE_SIZE,
+    RAIDEN_DEDUPE_WINDOW,
+    RAIDEN_DEDUPE_SIZE,
+    HTTP_TIMEOUT,
+)
+
+log = structlog.get_logger('trader.payment_poller')
+
+_WHITESPACE = ' \t\n\r'
+_SEPARATORS = _WHITESPACE + '[],'
+
+
+def iter_json_items(chunks):
+    """
+    Decodes the items of JSON arrays while their text arrives in chunks,
+    without holding the whole response in memory.
+    Several arrays in a row (one per line) are flattened into one sequence of items.
+
+    :param chunks: iterable of str
+    :raises ValueError: if the text is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos == len(buffer):
+                break
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # most likely the item is not complete yet, wait for the next chunk
+                break
+            yield item
+        buffer = buffer[pos:]
+    if buffer.strip(_SEPARATORS):
+        # not completed by the end of the stream, raise the decoding error
+        decoder.raw_decode(buffer.lstrip(_SEPARATORS))
+
+
+class RecentIds(object):
+    """
+    Remembers ids for `window` seconds after they were last seen, but never more than `max_size`
+    of them, the oldest ids are forgotten first.
+    """
+
+    def __init__(self, window=RAIDEN_DEDUPE_WINDOW, max_size=RAIDEN_DEDUPE_SIZE,
+                 clock=time.monotonic):
+        self.window = window
+        self.max_size = max_size
+        self.clock = clock
+        self._expiry = OrderedDict()
+
+    def __contains__(self, id_):
+        return id_ in self._expiry
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def add(self, id_):
+        """:return: False if the id was already seen within the window"""
+        now = self.clock()
+        self._evict(now)
+        seen = id_ in self._expiry
+        self._expiry[id_] = now + self.window
+        self._expiry.move_to_end(id_)
+        if seen:
+            return False
+        if len(self._expiry) > self.max_size:
+            self._expiry.popitem(last=False)
+        return True
+
+    def _evict(self, now):
+        expiry = self._expiry
+        while expiry:
+            id_, expires_at = next(iter(expiry.items()))
+            if expires_at > now:
+                break
+            del expiry[id_]
+
+
+class PaymentPoller(gevent.Greenlet):
+    """
+    Polls the payment events of a raiden node incrementally.
+
+    The poller keeps a cursor on the event history of the node and asks only for the events
+    after it, paging with raiden's `offset` and `limit` query parameters. A full page is followed
+    up immediately, otherwise the interval between polls doubles while there are no new events,
+    up to `max_interval`, and resets as soon as events arrive.
+    Events are handed to `on_event` once, the ids of recently seen events are kept for
+    `dedupe_window` seconds to filter events that are delivered twice.
+
+    A node which ignores `offset` and `limit` returns its whole history on every poll,
+    this is detected by a response longer than a page. The cursor is then reset and counts the
+    events of the history, the ones before it are skipped, so expired ids are not delivered again.
+    """
+
+    def __init__(self, session, url, encode, on_event, timeout=HTTP_TIMEOUT,
+                 interval=RAIDEN_POLL_INTERVAL, max_interval=RAIDEN_POLL_MAX_INTERVAL,
+                 page_size=RAIDEN_POLL_PAGE_SIZE, dedupe_window=RAIDEN_DEDUPE_WINDOW,
+                 dedupe_size=RAIDEN_DEDUPE_SIZE):
+        """
+        :param encode: callable(raw_event, type_) returning the event
+                       or None if not interested in it, the event needs an `identifier_tuple`
+        :param on_event: callable(event), called for every new event
+        """
+        self.session = session
+        self.url = url
+        self.encode = encode
+        self.on_event = on_event
+        self.timeout = timeout
+        self.min_interval = interval
+        self.max_interval = max_interval
+        self.page_size = page_size
+        self.interval = interval
+        self.cursor = 0
+        self.paginated = True
+        self.seen = RecentIds(dedupe_window, dedupe_size)
+        self.nof_polls = 0
+        gevent.Greenlet.__init__(self)
+
+    def _run(self):
+        while True:
+            try:
+                nof_raw, nof_new = self.poll()
+            except (RequestException, ValueError) as e:
+                log.warning('polling payments failed', url=self.url, error=str(e))
+                nof_raw, nof_new = 0, 0
+            if self.paginated and nof_raw == self.page_size:
+                # a full page, more events are waiting
+                continue
+            self._adapt_interval(nof_new)
+            gevent.sleep(self.interval)
+
+    def poll(self):
+        """
+        Requests the events after the cursor and hands the new ones to `on_event`.
+
+        :return: (number of events received, number of new events)
+        """
+        self.nof_polls += 1
+        offset = self.cursor if self.paginated else 0
+        params = dict(offset=offset, limit=self.page_size)
+        nof_raw = 0
+        nof_new = 0
+        # the events of a page are handled once it is known that the node honors the pagination
+        page = list()
+        with self.session.get(self.url, params=params, timeout=self.timeout,
+                              stream=True) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            chunks = response.iter_content(chunk_size=8192, decode_unicode=True)
+            for index, raw_event in enumerate(iter_json_items(chunks)):
+                nof_raw += 1
+                if self.paginated:
+                    if index < self.page_size:
+                        page.append(raw_event)
+                        continue
+                    self._pagination_unsupported()
+                    offset = 0
+                    nof_new += self._handle_all(offset, page)
+                    page = list()
+                nof_new += self._handle(offset + index, raw_event)
+        nof_new += self._handle_all(offset, page)
+        return nof_raw, nof_new
+
+    def _pagination_unsupported(self):
+        log.warning('raiden ignores offset and limit, polling the whole history', url=self.url)
+        self.paginated = False
+        # the cursor moved by the whole history on every poll, the seen ids filter the events
+        # handed out before
+        self.cursor = 0
+
+    def _handle_all(self, offset, raw_events):
+        return sum(self._handle(offset + index, raw_event)
+                   for index, raw_event in enumerate(raw_events))
+
+    def _handle(self, position, raw_event):
+        """:return: True if the event at the position of the history is new"""
+        if position < self.cursor:
+            return False
+        # the cursor counts every event of the history, also those we are not interested in
+        self.cursor = position + 1
+        event = self.encode(raw_event, raw_event.get('event'))
+        if event is None or not self.seen.add(event.identifier_tuple):
+            return False
+        self.on_event(event)
+        return True
+
+    def _adapt_interval(self, nof_new):
+        if nof_new:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
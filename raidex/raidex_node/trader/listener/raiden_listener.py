@@ -4,22 +4,81 @@ from raidex.raidex_node.trader.listener.filter import RaidenEventFilter
 
 
 class RaidenListener(Processor):
+    """
+    Matches the incoming RaidenEvents against the registered filters.
+
+    Filters are indexed by the event types they match and, if they have one, by their `index_key`,
+    e.g. the (initiator, identifier) of an expected transfer. An event only visits the filters
+    registered for its key and the generic filters of its type. Filters without event types see
+    every event.
+    """
 
     def __init__(self, trader):
         super(RaidenListener, self).__init__(RaidenListenerEvent)
         self.trader = trader
-        self.event_filters = list()
+        # (event type, index key) -> filters
+        self.keyed_filters = dict()
+        # event type -> filters without an index key
+        self.typed_filters = dict()
+        self.generic_filters = list()
 
     def new_raiden_event(self, event):
         state_changes = list()
-        copied_list = self.event_filters.copy()
-        for event_filter in copied_list:
-            state_change = event_filter.process(event)
-            if state_change is not None:
-                state_changes.append(state_change)
-                self.event_filters.remove(event_filter)
+
+        for filters in self._candidates(event):
+            for event_filter in list(filters):
+                state_change = event_filter.process(event)
+                if state_change is not None:
+                    state_changes.append(state_change)
+                    if event_filter.removable():
+                        self.remove_event_filter(event_filter)
 
         dispatch_state_changes(state_changes)
 
     def add_event_filter(self, new_filter: RaidenEventFilter):
-        self.event_filters.append(new_filter)
+        for filters in self._filter_lists(new_filter):
+            filters.append(new_filter)
+
+    def remove_event_filter(self, event_filter: RaidenEventFilter):
+        for filters in self._filter_lists(event_filter):
+            filters.remove(event_filter)
+        key = event_filter.index_key()
+        if key is not None:
+            # drop the emptied key lists, there is one per expected transfer
+            for event_type in event_filter.event_types:
+                if not self.keyed_filters[(event_type, key)]:
+                    del self.keyed_filters[(event_type, key)]
+
+    @property
+    def nof_filters(self):
+        event_filters = set(self.generic_filters)
+        for filters in self.keyed_filters.values():
+            event_filters.update(filters)
+        for filters in self.typed_filters.values():
+            event_filters.update(filters)
+        return len(event_filters)
+
+    def _filter_lists(self, event_filter):
+        key = event_filter.index_key()
+        if not event_filter.event_types:
+            return [self.generic_filters]
+        if key is None:
+            return [self.typed_filters.setdefault(event_type, list())
+                    for event_type in event_filter.event_types]
+        return [self.keyed_filters.setdefault((event_type, key), list())
+                for event_type in event_filter.event_types]
+
+    def _candidates(self, event):
+        key = event.index_key
+        candidates = list()
+        for event_type in type(event).__mro__:
+            if key is not None:
+                filters = self.keyed_filters.get((event_type, key))
+                if filters:
+                    candidates.append(filters)
+            filters = self.typed_filters.get(event_type)
+            if filters:
+                candidates.append(filters)
+        if self.generic_filters:
+            candidates.append(self.generic_filters)
+        return candidates
@@ -1,9 +1,10 @@
 from collections import namedtuple
 
-from sortedcontainers import SortedDict
+from sortedcontainers import SortedDict, SortedList
 import structlog
 
 from raidex.raidex_node.order.offer import BasicOffer
+from raidex.raidex_node.candles import CandleStore
 
 
 log = structlog.get_logger('node.trades')
@@ -22,11 +23,34 @@ class TradesView(object):
 
     def __init__(self):
         self.pending_offer_by_id = {}
+        # (timeout_date, offer_id) of the pending offers,
+        # to expire those whose swap never completed
+        self._pending_expiries = SortedList()
         self.trade_by_id = {}
         self._trades = SortedDict()
+        self.candles = CandleStore()
+        # callables observer(trade), called for every completed trade
+        self.observers = list()
 
     def add_pending(self, offer):
+        assert isinstance(offer, BasicOffer)
+        previous = self.pending_offer_by_id.get(offer.offer_id)
+        if previous is not None:
+            self._pending_expiries.discard((previous.timeout_date, previous.offer_id))
         self.pending_offer_by_id[offer.offer_id] = offer
+        self._pending_expiries.add((offer.timeout_date, offer.offer_id))
+
+    def expire_pending(self, now):
+        """
+        Removes the pending offers whose timeout_date is not after `now`,
+        their swaps can't complete anymore.
+        :return: the removed offers
+        """
+        end = self._pending_expiries.bisect_right((now, float('inf')))
+        expired = [self.pending_offer_by_id.pop(offer_id)
+                   for _, offer_id in self._pending_expiries[:end]]
+        del self._pending_expiries[:end]
+        return expired
 
     def report_completed(self, offer_id, completed_timestamp):
         offer = self.pending_offer_by_id.get(offer_id)
@@ -34,13 +58,16 @@ class TradesView(object):
             return False
 
         del self.pending_offer_by_id[offer_id]
+        self._pending_expiries.discard((offer.timeout_date, offer_id))
 
-        assert isinstance(offer, BasicOffer)
         trade = Trade(offer, completed_timestamp)
 
         self._trades[(trade.timestamp, offer.offer_id)] = trade
         # inserts in the dict for retrieval by offer_id
         self.trade_by_id[offer.offer_id] = trade
+        self.candles.add_trade(trade)
+        for observer in self.observers:
+            observer(trade)
         return offer.offer_id
 
     def get_trade_by_id(self, offer_id):
@@ -1,106 +1,221 @@
 from __future__ import print_function
-import structlog
 import json
-import requests
+import uuid
+
+import structlog
 import gevent
 from gevent import monkey
 from gevent.queue import Queue
+from requests import RequestException
 from raidex.utils.address import encode_topic
 
-from raidex.message_broker.message_broker import Listener
+from raidex.message_broker import stream
+from raidex.message_broker.message_broker import Listener, TopicListeners
+from raidex.utils.http_session import make_session
+from raidex.constants import (
+    HTTP_TIMEOUT,
+    STREAM_READ_TIMEOUT,
+    STREAM_RECONNECT_BACKOFF_BASE,
+    STREAM_RECONNECT_BACKOFF_MAX
+)
 import raidex.messages as messages
 
 monkey.patch_socket()
 log = structlog.get_logger("TOPIC")
 
 
-class StreamingRequestIterator(object):
-
-    def __init__(self, response):
-        self.response = response
-        self._line_generator = response.iter_lines()
-        self.closed = False
-
-    def __next__(self):
-        if self.closed is False:
-            return next(self._line_generator)
-        if self.closed is True:
-            self.response.close()
-            raise StopIteration
-
-    def next(self):
-        return self.__next__()
-
-    def __iter__(self):
-        return self
-
-    # FIXME
-    def close(self):
-        self.closed = True
+class TopicStreamTask(gevent.Greenlet):
+    """
+    Receives the messages of all topics the client listens on over a single streaming connection.
 
+    The topics are subscribed and unsubscribed with requests on the keep-alive session,
+    the broker tags every item of the stream with its topic. If the client didn't keep up,
+    the broker drops the messages it missed and sends a snapshot item instead.
 
-def iter_streaming_response(response):
-    return StreamingRequestIterator(response)
+    When the stream ends or fails, e.g. because the broker restarted, a new stream is connected
+    after an exponential backoff and all topics are subscribed to again. The broadcasts missed in
+    between, or dropped for a snapshot, are replayed from the broadcast log of the broker,
+    the messages of all other topics are lost.
+    """
 
-
-class StreamingRequestTask(gevent.Greenlet):
-
-    def __init__(self, api_url, topic, transform_func=None):
-        self.listeners = []
+    def __init__(self, api_url, binary=False, session=None, timeout=HTTP_TIMEOUT,
+                 backoff_base=STREAM_RECONNECT_BACKOFF_BASE,
+                 backoff_max=STREAM_RECONNECT_BACKOFF_MAX):
         self.api_url = api_url
-        self.topic = topic
-        self.transform = transform_func
-        self.response_iter = None
+        self.stream_url = self._new_stream_url()
+        self.binary = binary
+        self.session = session if session is not None else make_session()
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.topics = dict()  # topic -> TopicListeners
+        self.response = None
+        self.nof_snapshots = 0
+        self.nof_reconnects = 0
+        self.nof_resyncs = 0
         gevent.Greenlet.__init__(self)
 
+    def _new_stream_url(self):
+        # a new stream id, the broker may still hold the stream of a broken connection
+        return '{0}/streams/{1}'.format(self.api_url, uuid.uuid4().hex)
+
     @property
     def has_listeners(self):
-        return bool(self.listeners)
+        return bool(self.topics)
+
+    def backoff(self, attempt):
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
 
     def _run(self):
-        # this initially blocks until something is sent on that topic
-        response = requests.get('{0}/topics/{1}'.format(self.api_url, self.topic), stream=True)
-        self.response_iter = iter_streaming_response(response)
-        for line in self.response_iter:
-            # filter out keep-alive new lines
-            if line:
-                decoded_line = line.decode('utf-8')
-                message = decode(json.loads(decoded_line)['data'])
-                for listener in self.listeners:
-                    message_for_listener = message
-                    if listener.transform is not None:
-                        message_for_listener = listener.transform(message_for_listener)
-                    if message_for_listener is not None:
-                        listener.message_queue_async.put(message_for_listener)
-
-    def create_listener(self, transform=None):
-        message_queue_async = Queue()
-        listener = Listener(self.topic, message_queue_async, transform)
-        self.listeners.append(listener)
+        attempt = 0
+        while True:
+            try:
+                if attempt > 0:
+                    self._resubscribe()
+                    self._resync()
+                self._connect()
+                attempt = 0
+                self._receive()
+                log.warning('Stream closed by the broker, reconnecting')
+            except RequestException as e:
+                log.error('Stream failed, reconnecting', error=e, attempt=attempt + 1)
+            attempt += 1
+            self.nof_reconnects += 1
+            gevent.sleep(self.backoff(attempt))
+
+    def _resubscribe(self):
+        self.stream_url = self._new_stream_url()
+        for topic in list(self.topics):
+            self._subscribe(topic)
+
+    def _connect(self):
+        params = {'encoding': 'binary'} if self.binary else None
+        # the broker sends keepalives on an idle stream, a stream silent for longer is broken
+        self.response = self.session.get(self.stream_url, params=params, stream=True,
+                                         timeout=(self.timeout[0], STREAM_READ_TIMEOUT))
+        self.response.raise_for_status()
+
+    def _receive(self):
+        if self.binary:
+            chunks = self.response.iter_content(chunk_size=None)
+            for kind, topic, payload in stream.iter_stream_frames(chunks):
+                if kind == stream.MESSAGE:
+                    self._dispatch(topic, decode(payload))
+                elif kind == stream.SNAPSHOT:
+                    self._on_snapshot()
+        else:
+            for line in self.response.iter_lines():
+                # filter out keep-alive new lines
+                if line:
+                    kind, topic, data = stream.parse_line(line.decode('utf-8'))
+                    if kind == stream.MESSAGE:
+                        self._dispatch(topic, decode(data))
+                    elif kind == stream.SNAPSHOT:
+                        self._on_snapshot()
+
+    def _resync(self):
+        """
+        Replays the logged broadcasts to the broadcast listeners.
+        The broadcasts received before are delivered again, the offer book handles them
+        idempotently.
+        """
+        if 'broadcast' not in self.topics:
+            return
+        params = {'from_offset': 0, 'follow': 'false'}
+        if self.binary:
+            params['encoding'] = 'binary'
+        response = self.session.get('{0}/topics/broadcast'.format(self.api_url), params=params,
+                                    stream=True, timeout=(self.timeout[0], STREAM_READ_TIMEOUT))
+        if response.status_code == 400:
+            response.close()
+            log.error('The broker does not log the broadcasts, the missed ones are lost')
+            return
+        response.raise_for_status()
+        with response:
+            if self.binary:
+                for frame in stream.iter_frames(response.iter_content(chunk_size=None)):
+                    self._dispatch('broadcast', decode(frame))
+            else:
+                for line in response.iter_lines():
+                    if line:
+                        data = json.loads(line.decode('utf-8'))['data']
+                        self._dispatch('broadcast', decode(data))
+        self.nof_resyncs += 1
+
+    def _dispatch(self, topic, message):
+        topic_listeners = self.topics.get(topic)
+        # messages of a topic can still arrive until its unsubscription is acknowledged
+        if topic_listeners is not None:
+            topic_listeners.dispatch(message)
+
+    def _on_snapshot(self):
+        self.nof_snapshots += 1
+        log.warning('Messages were dropped by the broker, the stream lagged behind',
+                    nof_snapshots=self.nof_snapshots)
+        self._resync()
+
+    def create_listener(self, topic, transform=None, message_types=None):
+        topic_listeners = self.topics.get(topic)
+        if topic_listeners is None:
+            topic_listeners = self.topics[topic] = TopicListeners()
+            try:
+                self._subscribe(topic)
+            except RequestException:
+                del self.topics[topic]
+                raise
+
+        listener = Listener(topic, Queue(), transform, message_types)
+        topic_listeners.add(listener)
         return listener
 
+    def _subscribe(self, topic):
+        self.session.put('{0}/topics/{1}'.format(self.stream_url, topic), timeout=self.timeout)
+
     def stop_listen(self, listener):
-        self.listeners.remove(listener)
+        topic_listeners = self.topics[listener.topic]
+        topic_listeners.remove(listener)
+        if not topic_listeners:
+            del self.topics[listener.topic]
+            self.session.delete('{0}/topics/{1}'.format(self.stream_url, listener.topic),
+                                timeout=self.timeout)
 
-    # FIXME this isn't working yet,
-    # we want the server to notice the closed connection
-    # and the _run generator loop of the response to raise a StopIteration
     def stop(self):
-        if self.response_iter is not None:
-            self.response_iter.close()
-            self.response_iter = None
+        """closes the stream on the broker and the connection"""
+        try:
+            self.session.delete(self.stream_url, timeout=self.timeout)
+        except RequestException as e:
+            log.warning('Closing the stream failed', error=e)
+        if self.response is not None:
+            self.response.close()
+        self.kill(block=False)
 
 
 class MessageBrokerClient:
-    """Handles the communication with other nodes"""
+    """Handles the communication with other nodes
+
+    Messages are exchanged as JSON-envelopes, set `envelope_version` to `Envelope.binary_version`
+    to exchange the compact binary envelope frames instead.
 
-    def __init__(self, host='localhost', port=5000, address=''):
+    All requests go through one keep-alive session, its connection pools can be configured by
+    passing a session created with `make_session`. The messages of all topics listened on are
+    received over one streaming connection, which is closed when the last listener stopped.
+    """
+
+    def __init__(self, host='localhost', port=5000, address='',
+                 envelope_version=messages.Envelope.version, session=None,
+                 timeout=HTTP_TIMEOUT):
         self.port = port
         self.host = host
         self.apiUrl = 'http://{}:{}/api'.format(host, port)
-        self.topic_task_map = {}
-        self.listener_task_map = {}
+        self.topic_stream = None
         self.address = address
+        self.envelope_version = envelope_version
+        self.session = session if session is not None else make_session()
+        self.timeout = timeout
+
+    @property
+    def binary(self):
+        return self.envelope_version == messages.Envelope.binary_version
 
     def send(self, topic, message):
         # HACK, allow 'broadcast' as non-binary input, everything else should be
@@ -115,19 +230,52 @@ class MessageBrokerClient:
             topic (str): the topic you want the message been send to
             message (Union[str, messages.Signed]): the message to send
 
+        Returns:
+            bool: the send status of the message
         """
 
-        body = {'message': encode(message)}
-        result = requests.post('{0}/topics/{1}'.format(self.apiUrl, topic), json=body)
-        return result.json()
+        encoded_message = encode(message, self.envelope_version)
+        url = '{0}/topics/{1}'.format(self.apiUrl, topic)
+        if isinstance(encoded_message, bytes):
+            result = self.session.post(url, data=encoded_message,
+                                       headers={'Content-Type': 'application/octet-stream'},
+                                       timeout=self.timeout)
+        else:
+            result = self.session.post(url, json={'message': encoded_message},
+                                       timeout=self.timeout)
+        return result.json()['data']
+
+    def send_bulk(self, topic, messages_):
+        """Sends several messages to the topic in a single request, in order
 
-    def listen_on(self, topic, transform=None):
+        Args:
+            topic (str): the topic you want the messages been send to
+            messages_ (List[Union[str, messages.Signed]]): the messages to send
+
+        Returns:
+            list: the send status of every message
+        """
+        encoded_topic = encode_topic(topic)
+        return self._send_bulk(encoded_topic, messages_)
+
+    def _send_bulk(self, topic, messages_):
+        # the messages are always sent as binary frames,
+        # json envelopes and plain text are wrapped into frames
+        data = b''.join(messages.Envelope.to_frame(encode(message, self.envelope_version))
+                        for message in messages_)
+        url = '{0}/topics/{1}/bulk'.format(self.apiUrl, topic)
+        result = self.session.post(url, data=data,
+                                   headers={'Content-Type': 'application/octet-stream'},
+                                   timeout=self.timeout)
+        return result.json()['data']
+
+    def listen_on(self, topic, transform=None, message_types=None):
         # HACK, allow 'broadcast' as non-binary input, everything else should be
         # binary data/ decoded addresses
         topic = encode_topic(topic)
-        return self._listen_on(topic, transform)
+        return self._listen_on(topic, transform, message_types)
 
-    def _listen_on(self, topic, transform=None):
+    def _listen_on(self, topic, transform=None, message_types=None):
         """Starts listening for new messages on this topic
 
         Args:
@@ -135,21 +283,19 @@ class MessageBrokerClient:
             transform : A function that filters and transforms the message
                         should return None if not interested in the message, message will not be returned,
                         otherwise should return the message in a format as needed
+            message_types : class or tuple of classes of the messages to receive,
+                            None for all messages
 
         Returns:
             Listener: an object gathering all settings of this listener
 
         """
-        task = self.topic_task_map.get(topic)
-        if task is None:
-            task = StreamingRequestTask(self.apiUrl, topic, transform)
-            self.topic_task_map[topic] = task
-            task.start()
-
-        listener = task.create_listener(transform)
-        self.listener_task_map[listener] = task
+        if self.topic_stream is None:
+            self.topic_stream = TopicStreamTask(self.apiUrl, self.binary, self.session,
+                                                self.timeout)
+            self.topic_stream.start()
 
-        return listener
+        return self.topic_stream.create_listener(topic, transform, message_types)
 
     def broadcast(self, message):
         """Sends a message to all listeners of the special topic broadcast
@@ -157,29 +303,47 @@ class MessageBrokerClient:
             Args:
                 message (Union[str, messages.Signed]): the message to send
 
+            Returns:
+                bool: the send status of the message
+        """
+        return self._send('broadcast', message)
+
+    def broadcast_bulk(self, messages_):
+        """Sends several messages to all listeners of the special topic broadcast,
+        in a single request
+
+            Args:
+                messages_ (List[Union[str, messages.Signed]]): the messages to send
+
+            Returns:
+                list: the send status of every message
         """
-        self._send('broadcast', message)
+        return self._send_bulk('broadcast', messages_)
 
     def stop_listen(self, listener):
-        task = self.listener_task_map.get(listener)
-        if task is None:
+        if self.topic_stream is None or listener.topic not in self.topic_stream.topics:
             raise Exception('Listener not found')
-        task.stop_listen(listener)
-        del self.listener_task_map[listener]
-        if not task.has_listeners:
-            task.stop()
+        self.topic_stream.stop_listen(listener)
+        if not self.topic_stream.has_listeners:
+            self.topic_stream.stop()
+            self.topic_stream = None
 
 
-def encode(message):
+def encode(message, envelope_version=None):
     if isinstance(message, str):
         return message
     elif isinstance(message, messages.Signed):
-        return messages.Envelope.envelop(message)
+        return messages.Envelope.envelop(message, envelope_version)
     else:
         raise Exception("not supported type")
 
 
 def decode(message):
+    if isinstance(message, bytes):
+        version, _, _ = messages.Envelope.read_frame_header(message)
+        if version == messages.Envelope.version:
+            # json data inside of a binary frame, this is not necessarily an enveloped message
+            message = messages.Envelope.to_json(message)
     try:
         message = messages.Envelope.open(message)
     except ValueError:
@@ -0,0 +1,40 @@
+"""
+Append and replay throughput of the broadcast log of the message broker server
+with binary ProvenOffer frames, replaying is what a starting node reads to warm its offer book.
+
+    python -m raidex.tests.benchmarks.bench_broadcast_log
+"""
+import tempfile
+import time
+
+from raidex.messages import Envelope
+from raidex.utils import timestamp
+from raidex.message_broker.broadcast_log import BroadcastLog
+from raidex.tests.benchmarks.bench_envelope import make_proven_offer
+
+NOF_MESSAGES = 100000
+
+
+def main():
+    frame = Envelope.envelop(make_proven_offer(), Envelope.binary_version)
+    now = timestamp.time()
+    with tempfile.TemporaryDirectory() as directory:
+        broadcast_log = BroadcastLog(directory, segment_size=4 * 1024 * 1024)
+
+        start = time.monotonic()
+        for _ in range(NOF_MESSAGES):
+            broadcast_log.append(frame)
+        seconds = time.monotonic() - start
+        print('append   {:>9.0f} msg/s   {} segments'.format(
+            NOF_MESSAGES / seconds, len(broadcast_log.segments)))
+
+        # the offer expires after 30 seconds, replay it as of its creation
+        start = time.monotonic()
+        nof_replayed = sum(1 for _ in broadcast_log.read(now=now))
+        seconds = time.monotonic() - start
+        print('replay   {:>9.0f} msg/s'.format(nof_replayed / seconds))
+        broadcast_log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Messages per second through the in-process MessageBroker on the broadcast topic with 1, 10 and 100
+typed listeners, the previous broker offering every message to every listener's transform,
+against the broker indexing the listeners by message type.
+
+    python -m raidex.tests.benchmarks.bench_broker_fanout
+"""
+import time
+from collections import defaultdict
+
+import structlog
+from gevent.queue import Queue
+
+from raidex import messages
+from raidex.utils import timestamp
+from raidex.message_broker import listeners
+from raidex.message_broker.message_broker import MessageBroker, Listener
+from raidex.tests.benchmarks.bench_broker_send import drop_debug
+
+NOF_MESSAGES = 10000
+
+LISTENER_CLASSES = [
+    listeners.OfferTakenListener,
+    listeners.SwapCompletedListener,
+    listeners.SwapExecutionListener,
+    listeners.CommitmentListener,
+    listeners.CancellationListener,
+    listeners.CommitmentProofListener,
+]
+
+log = structlog.get_logger('message_broker.global')
+
+
+class LegacyMessageBroker(object):
+    """the previous MessageBroker._send"""
+
+    def __init__(self):
+        self.listeners = defaultdict(list)
+
+    def broadcast(self, message):
+        for listener in self.listeners['broadcast']:
+            topic, message_queue_async, transform, _ = listener
+            transformed_message = message
+            if transform is not None:
+                transformed_message = transform(transformed_message)
+            if transformed_message is not None:
+                log.debug('Sending message: msg={}, topic={}'.format(message, topic))
+                message_queue_async.put(transformed_message)
+        return True
+
+    def listen_on(self, topic, transform=None, message_types=None):
+        def legacy_transform(message):
+            # the listeners used to check the message type in their transform
+            if message_types is not None and not isinstance(message, message_types):
+                return None
+            return transform(message) if transform is not None else message
+
+        listener = Listener(topic, Queue(), legacy_transform)
+        self.listeners[topic].append(listener)
+        return listener
+
+
+def make_messages():
+    # mostly offer traffic, which only some of the listeners are interested in
+    messages_ = list()
+    for offer_id in range(NOF_MESSAGES):
+        if offer_id % 4 == 0:
+            messages_.append(messages.SwapCompleted(offer_id, timestamp.time()))
+        elif offer_id % 4 == 1:
+            messages_.append(messages.OfferTaken(offer_id))
+        else:
+            messages_.append(messages.Cancellation(offer_id))
+    return messages_
+
+
+def bench(broker, nof_listeners, messages_):
+    started = [LISTENER_CLASSES[index % len(LISTENER_CLASSES)](broker)
+               for index in range(nof_listeners)]
+    for listener in started:
+        listener.start()
+
+    start = time.monotonic()
+    for message in messages_:
+        broker.broadcast(message)
+    seconds = time.monotonic() - start
+    return NOF_MESSAGES / seconds
+
+
+def main():
+    structlog.configure(processors=[drop_debug] + structlog.get_config()['processors'])
+    messages_ = make_messages()
+    for nof_listeners in (1, 10, 100):
+        legacy = bench(LegacyMessageBroker(), nof_listeners, messages_)
+        indexed = bench(MessageBroker(), nof_listeners, messages_)
+        print('{:>3} listeners   legacy {:>8.0f} msg/s   indexed {:>8.0f} msg/s'.format(
+            nof_listeners, legacy, indexed))
+
+
+if __name__ == '__main__':
+    main()
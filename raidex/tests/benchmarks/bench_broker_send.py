@@ -0,0 +1,74 @@
+"""
+Send throughput to the message broker server, with a new connection per message,
+with the keep-alive session of the MessageBrokerClient and with bulk sends.
+
+    python -m raidex.tests.benchmarks.bench_broker_send
+"""
+import time
+
+import gevent
+import requests
+import structlog
+from gevent.pywsgi import WSGIServer
+
+from raidex.message_broker import server
+from raidex.messages import Envelope
+from raidex.raidex_node.transport.client import MessageBrokerClient
+from raidex.tests.benchmarks.bench_envelope import make_proven_offer
+
+NOF_MESSAGES = 1000
+BULK_SIZE = 100
+
+
+def drop_debug(logger, method_name, event_dict):
+    if method_name == 'debug':
+        raise structlog.DropEvent
+    return event_dict
+
+
+def bench(name, func):
+    start = time.monotonic()
+    func()
+    seconds = time.monotonic() - start
+    print('{:<12} {:>8.0f} msg/s'.format(name, NOF_MESSAGES / seconds))
+
+
+def main():
+    # the broker logs every message on debug level
+    structlog.configure(processors=[drop_debug] + structlog.get_config()['processors'])
+    http_server = WSGIServer(('127.0.0.1', 0), server.app, log=None,
+                             handler_class=server.NoDelayHandler)
+    http_server.start()
+    # a subscriber that drains the broadcast topic, like the streaming clients do
+    listener = server.message_broker.listen_on('broadcast')
+    drain = gevent.spawn(lambda: [listener.message_queue_async.get() for _ in iter(int, 1)])
+    client = MessageBrokerClient(host='127.0.0.1', port=http_server.server_port,
+                                 envelope_version=Envelope.binary_version)
+    proven_offer = make_proven_offer()
+    frame = Envelope.envelop(proven_offer, Envelope.binary_version)
+    url = '{}/topics/broadcast'.format(client.apiUrl)
+
+    def send_unpooled():
+        for _ in range(NOF_MESSAGES):
+            requests.post(url, data=frame,
+                          headers={'Content-Type': 'application/octet-stream'}).json()
+
+    def send_pooled():
+        for _ in range(NOF_MESSAGES):
+            client.broadcast(proven_offer)
+
+    def send_bulk():
+        for _ in range(NOF_MESSAGES // BULK_SIZE):
+            client.broadcast_bulk([proven_offer] * BULK_SIZE)
+
+    try:
+        bench('unpooled', send_unpooled)
+        bench('keep-alive', send_pooled)
+        bench('bulk', send_bulk)
+    finally:
+        drain.kill()
+        http_server.stop()
+
+
+if __name__ == '__main__':
+    main()
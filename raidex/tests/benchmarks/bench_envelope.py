@@ -0,0 +1,53 @@
+"""
+Decode throughput of broadcast ProvenOffers in the JSON- and the binary envelope format,
+including the json line framing of the message broker stream.
+
+    python -m raidex.tests.benchmarks.bench_envelope
+"""
+import json
+import timeit
+
+from eth_utils import keccak, big_endian_to_int
+
+from raidex.messages import Envelope, SwapOffer, Commitment, CommitmentProof, ProvenOffer
+from raidex.signing import generate_random_privkey
+from raidex.utils import make_address, random_secret, timestamp
+
+NOF_DECODES = 2000
+
+
+def make_proven_offer():
+    maker_key, cs_key = generate_random_privkey(), generate_random_privkey()
+    offer_id = big_endian_to_int(keccak(text='offer id')) % 2 ** 32
+    offer = SwapOffer(make_address(), 10 ** 21, make_address(), 3 * 10 ** 18,
+                      offer_id, timestamp.time_plus(seconds=30))
+    commitment = Commitment(offer.offer_id, offer.hash, offer.timeout, 10 ** 18)
+    commitment.sign(maker_key)
+    secret = random_secret()
+    commitment_proof = CommitmentProof(commitment.signature, secret, keccak(secret),
+                                       offer.offer_id)
+    commitment_proof.sign(cs_key)
+    proven_offer = ProvenOffer(offer, commitment_proof)
+    proven_offer.sign(maker_key)
+    return proven_offer
+
+
+def bench(name, func, size):
+    seconds = timeit.timeit(func, number=NOF_DECODES)
+    print('{:<8} {:>5} bytes {:>10.0f} msg/s {:>8.2f} MB/s'.format(
+        name, size, NOF_DECODES / seconds, NOF_DECODES * size / seconds / 10 ** 6))
+
+
+def main():
+    proven_offer = make_proven_offer()
+
+    # what a subscriber of the broker reads per message, for both formats
+    json_line = json.dumps({'data': Envelope.envelop(proven_offer)}) + '\n'
+    frame = Envelope.envelop(proven_offer, Envelope.binary_version)
+
+    bench('json', lambda: Envelope.open(json.loads(json_line)['data']), len(json_line))
+    bench('binary', lambda: Envelope.open(frame), len(frame))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Commitment proofs per second from the commitment service's message queue
+to the message broker server:
+signing and sending one message after the other, like the MessageSenderTask used to,
+against the batched and pipelined MessageSenderTask,
+signing in the sending greenlet and on threads.
+
+    python -m raidex.tests.benchmarks.bench_message_sender
+"""
+import time
+
+import gevent
+import structlog
+from gevent.pywsgi import WSGIServer
+from gevent.queue import Queue
+from eth_utils import keccak
+
+from raidex import messages
+from raidex.signing import Signer
+from raidex.utils import random_secret
+from raidex.commitment_service.tasks import MessageSenderTask
+from raidex.message_broker import server
+from raidex.raidex_node.transport.client import MessageBrokerClient
+from raidex.utils.address import encode_topic
+from raidex.tests.benchmarks.bench_broker_send import drop_debug
+
+NOF_MESSAGES = 2000
+NOF_RECIPIENTS = 20
+
+
+def make_queue():
+    recipients = [Signer.random().address for _ in range(NOF_RECIPIENTS)]
+    # the broker only accepts messages for topics with listeners
+    for recipient in recipients:
+        server.message_broker.listen_on(encode_topic(recipient))
+    queue = Queue()
+    secret = random_secret()
+    for offer_id in range(NOF_MESSAGES):
+        proof = messages.CommitmentProof(bytes(65), secret, keccak(secret), offer_id)
+        queue.put((proof, recipients[offer_id % NOF_RECIPIENTS], time.monotonic()))
+    return queue
+
+
+def send_sequential(client, queue, sign):
+    while not queue.empty():
+        message, recipient, _ = queue.get()
+        sign(message)
+        client.send(topic=recipient, message=message)
+
+
+def send_batched(client, queue, sign, sign_pool_size):
+    task = MessageSenderTask(client, queue, sign, sign_pool_size=sign_pool_size)
+    task.start()
+    while task.nof_sent + task.nof_failed < NOF_MESSAGES:
+        gevent.sleep(0.001)
+    task.kill()
+    return task.latency
+
+
+def bench(name, func, *args):
+    queue = make_queue()
+    start = time.monotonic()
+    latency = func(*args[:1] + (queue,) + args[1:])
+    seconds = time.monotonic() - start
+    line = '{:<20} {:>8.0f} proofs/s'.format(name, NOF_MESSAGES / seconds)
+    if latency is not None:
+        line += '   latency p50 {:.3f}s p99 {:.3f}s'.format(
+            latency.percentile(0.5), latency.percentile(0.99))
+    print(line)
+
+
+def main():
+    # the broker logs every message on debug level
+    structlog.configure(processors=[drop_debug] + structlog.get_config()['processors'])
+    http_server = WSGIServer(('127.0.0.1', 0), server.app, log=None,
+                             handler_class=server.NoDelayHandler)
+    http_server.start()
+    client = MessageBrokerClient(host='127.0.0.1', port=http_server.server_port,
+                                 envelope_version=messages.Envelope.binary_version)
+    signer = Signer.random()
+
+    try:
+        bench('sequential', send_sequential, client, signer.sign)
+        bench('batched', send_batched, client, signer.sign, 0)
+        bench('batched, 4 threads', send_batched, client, signer.sign, 4)
+    finally:
+        http_server.stop()
+
+
+if __name__ == '__main__':
+    main()
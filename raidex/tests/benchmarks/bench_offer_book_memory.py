@@ -0,0 +1,105 @@
+"""
+Memory of a book of 100k foreign offers, with the previous OfferBookEntry and BasicOffer,
+which held a decoded CommitmentProof and an own initiator address per offer in a `__dict__`,
+against the compact, slotted entries.
+Also the time to read the price of every entry, as the grouping and sorting does.
+
+    python -m raidex.tests.benchmarks.bench_offer_book_memory
+"""
+import random
+import time
+import tracemalloc
+
+import rlp
+
+from raidex.messages import CommitmentProof
+from raidex.raidex_node.offer_book import OfferBook, OfferBookEntry
+from raidex.raidex_node.order.offer import BasicOffer, OfferType
+from raidex.tests.benchmarks.bench_envelope import make_proven_offer
+from raidex.utils import make_address, timestamp
+from raidex.utils.address import InternedAddresses
+
+NOF_OFFERS = 100000
+NOF_MAKERS = 100
+
+
+class LegacyBasicOffer(object):
+    """the previous BasicOffer"""
+
+    def __init__(self, offer_id, offer_type, base_amount, quote_amount, timeout_date):
+        self.offer_id = offer_id
+        self.type = offer_type
+        self.base_amount = base_amount
+        self.quote_amount = quote_amount
+        self.timeout_date = timeout_date
+
+    @property
+    def price(self):
+        return float(self.quote_amount) / self.base_amount
+
+
+class LegacyOfferBookEntry(object):
+    """the previous OfferBookEntry"""
+
+    def __init__(self, offer, initiator, commitment_proof):
+        self.offer = offer
+        self.initiator = initiator
+        self.commitment_proof = commitment_proof
+
+    @property
+    def price(self):
+        return self.offer.price
+
+
+def make_entries(offer_class, entry_class, proof_data, makers):
+    # every offer is decoded from its own message, with its own proof and initiator
+    timeout_date = timestamp.time_plus(seconds=60)
+    random.seed(0)
+    # the book shares the initiators of the compact entries
+    initiators = InternedAddresses()
+    entries = list()
+    for offer_id in range(NOF_OFFERS):
+        offer = offer_class(offer_id, OfferType.SELL if offer_id % 2 else OfferType.BUY,
+                            random.randint(10 ** 18, 10 ** 21), random.randint(10 ** 18, 10 ** 21),
+                            timeout_date)
+        initiator = bytes(bytearray(makers[offer_id % NOF_MAKERS]))
+        if entry_class is LegacyOfferBookEntry:
+            commitment_proof = rlp.decode(proof_data, CommitmentProof)
+        else:
+            initiator = initiators.acquire(initiator)
+            commitment_proof = bytes(bytearray(proof_data))
+        entries.append(entry_class(offer, initiator, commitment_proof))
+    return entries
+
+
+def bench(name, offer_class, entry_class, proof_data, makers):
+    tracemalloc.start()
+    entries = make_entries(offer_class, entry_class, proof_data, makers)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.monotonic()
+    for _ in range(10):
+        for entry in entries:
+            entry.price
+    seconds = time.monotonic() - start
+    print('{:<8} {:>7.1f} MB {:>6.0f} bytes/entry   price reads {:>6.1f} M/s'.format(
+        name, size / 2 ** 20, size / NOF_OFFERS, 10 * NOF_OFFERS / seconds / 10 ** 6))
+    return entries
+
+
+def main():
+    proof_data = rlp.encode(make_proven_offer().commitment_proof)
+    makers = [make_address() for _ in range(NOF_MAKERS)]
+    bench('legacy', LegacyBasicOffer, LegacyOfferBookEntry, proof_data, makers)
+    entries = bench('compact', BasicOffer, OfferBookEntry, proof_data, makers)
+
+    offer_book = OfferBook()
+    for entry in entries:
+        offer_book.insert_offer(entry)
+    nof_entries, size = offer_book.memory_usage()
+    print('reported {:>7.1f} MB {:>6.0f} bytes/entry'.format(size / 2 ** 20, size / nof_entries))
+
+
+if __name__ == '__main__':
+    main()
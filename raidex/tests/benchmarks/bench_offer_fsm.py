@@ -0,0 +1,117 @@
+"""
+Creating offers and running them through their whole lifecycle, with the compiled OfferMachine
+and with the transitions HierarchicalMachine it replaced. The on_enter callbacks are no-ops,
+so only the cost of the state machines is measured.
+
+    python -m raidex.tests.benchmarks.bench_offer_fsm
+"""
+import time
+
+from transitions.extensions.nesting import NestedState
+from transitions.extensions import HierarchicalMachine
+
+from raidex.raidex_node.order import TRANSITIONS
+from raidex.raidex_node.order.fsm import OfferMachine, OfferState
+
+NOF_OFFERS = 5000
+
+LIFECYCLE = [
+    ('initiating', {}),
+    ('payment_failed', {}),
+    ('receive_commitment_proof', {'proof': None}),
+    ('received_offer', {}),
+    ('found_match', {}),
+    ('received_inbound', {'raiden_event': None}),
+    ('received_inbound', {'raiden_event': None}),
+]
+
+
+def noop(event_data):
+    pass
+
+
+def make_states(state_class):
+    states = dict()
+
+    def add(name, parent=None, on_enter=None):
+        kwargs = dict(parent=states[parent]) if parent else dict()
+        if on_enter:
+            kwargs['on_enter'] = on_enter
+        states[name] = state_class(name, **kwargs)
+
+    add('open')
+    add('created', 'open')
+    for name in ('unproved', 'proved', 'published', 'cancellation_requested'):
+        add(name, 'open', [noop])
+    add('pending')
+    add('exchanging', 'pending')
+    add('wait_for_refund', 'pending', [noop])
+    add('completed')
+    add('canceled')
+
+    transitions = [dict(trigger=transition['trigger'],
+                        source=states[transition['source'].name],
+                        dest=states[transition['dest'].name]) for transition in TRANSITIONS]
+    return [states[name] for name in ('open', 'pending', 'canceled', 'completed')], transitions
+
+
+class LegacyState(NestedState):
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def initial(self):
+        if len(self.children) > 0:
+            return self.children[0]
+        return None
+
+
+class LegacyOfferMachine(HierarchicalMachine):
+    """The previous offer machine, keeps the status next to the state"""
+
+    def set_state(self, state, model=None):
+        super(LegacyOfferMachine, self).set_state(state, model)
+        if isinstance(state, str):
+            state = self.get_state(state)
+        model.status = state.parent.name if state.parent else state.name
+
+
+class Model(object):
+    pass
+
+
+def run(machine, remove):
+    for _ in range(NOF_OFFERS):
+        model = Model()
+        machine.add_model(model)
+        for trigger, kwargs in LIFECYCLE:
+            getattr(model, trigger)(**kwargs)
+        assert model.status == 'completed'
+        if remove:
+            machine.remove_model(model)
+
+
+def bench(name, machine, remove=False):
+    start = time.monotonic()
+    run(machine, remove)
+    seconds = time.monotonic() - start
+    print('{:<10} {:>10.1f} us/offer ({} transitions)'.format(
+        name, seconds / NOF_OFFERS * 10 ** 6, len(LIFECYCLE)))
+
+
+def main():
+    states, transitions = make_states(LegacyState)
+    legacy = LegacyOfferMachine(states=states, transitions=transitions, initial=states[0],
+                                send_event=True)
+    bench('legacy', legacy, remove=True)
+
+    states, transitions = make_states(OfferState)
+    compiled = OfferMachine(states=states, transitions=transitions, initial=states[0])
+    compiled.add_triggers(Model)
+    Model.status = property(compiled.status_of)
+    bench('compiled', compiled)
+
+
+if __name__ == '__main__':
+    main()
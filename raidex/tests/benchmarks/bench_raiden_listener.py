@@ -0,0 +1,58 @@
+"""
+Cost of matching incoming payments against 10k expected inbound transfers,
+with the indexed RaidenListener and with a linear scan over all filters.
+
+    python -m raidex.tests.benchmarks.bench_raiden_listener
+"""
+import time
+
+from raidex.raidex_node.trader.listener.events import PaymentReceivedEvent
+from raidex.raidex_node.trader.listener.filter import TransferReceivedFilter, ChannelFilter
+from raidex.raidex_node.trader.listener.raiden_listener import RaidenListener
+
+NOF_FILTERS = 10000
+INITIATOR = b'i' * 20
+
+
+class LinearRaidenListener(RaidenListener):
+    """The previous implementation, every event visits every filter"""
+
+    def __init__(self, trader):
+        super(LinearRaidenListener, self).__init__(trader)
+        self.event_filters = list()
+
+    def new_raiden_event(self, event):
+        state_changes = list()
+        for event_filter in self.event_filters.copy():
+            state_change = event_filter.process(event)
+            if state_change is not None:
+                state_changes.append(state_change)
+                self.event_filters.remove(event_filter)
+        return state_changes
+
+    def add_event_filter(self, new_filter):
+        self.event_filters.append(new_filter)
+
+
+def bench(name, raiden_listener):
+    raiden_listener.add_event_filter(ChannelFilter(dict()))
+    for identifier in range(NOF_FILTERS):
+        raiden_listener.add_event_filter(TransferReceivedFilter(INITIATOR, identifier))
+
+    # the payments arrive in a different order than they were expected
+    events = [PaymentReceivedEvent(INITIATOR, 1, identifier)
+              for identifier in reversed(range(NOF_FILTERS))]
+    start = time.monotonic()
+    for event in events:
+        raiden_listener.new_raiden_event(event)
+    seconds = time.monotonic() - start
+    print('{:<8} {:>10.1f} us/payment'.format(name, seconds / NOF_FILTERS * 10 ** 6))
+
+
+def main():
+    bench('linear', LinearRaidenListener(None))
+    bench('indexed', RaidenListener(None))
+
+
+if __name__ == '__main__':
+    main()
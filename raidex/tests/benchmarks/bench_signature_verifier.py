@@ -0,0 +1,58 @@
+"""
+Sender recovery throughput of the SignatureVerifier and the longest stall of the gevent hub
+meanwhile, recovering in the hub (pool size 0) versus on a thread pool.
+
+    python -m raidex.tests.benchmarks.bench_signature_verifier
+"""
+import time
+
+import gevent
+from gevent.queue import Queue
+
+from raidex.messages import ProvenOffer, recover_sender
+from raidex.utils.signature_verifier import SignatureVerifier
+from raidex.tests.benchmarks.bench_envelope import make_proven_offer
+
+NOF_OFFERS = 2000
+
+
+def make_offers():
+    # deserialized messages are immutable and have no cached sender, like the ones from the broker
+    return [ProvenOffer.deserialize(ProvenOffer.serialize(make_proven_offer()))
+            for _ in range(NOF_OFFERS)]
+
+
+def bench(pool_size, offers):
+    recover_sender.cache_clear()
+    source = Queue(items=offers)
+    verifier = SignatureVerifier(source.get, pool_size=pool_size)
+    max_stall = 0
+
+    def ticker():
+        nonlocal max_stall
+        while True:
+            before = time.monotonic()
+            gevent.sleep(0.001)
+            max_stall = max(max_stall, time.monotonic() - before)
+
+    ticker_greenlet = gevent.spawn(ticker)
+    start = time.monotonic()
+    verifier.start()
+    for _ in range(len(offers)):
+        verifier.get()
+    seconds = time.monotonic() - start
+    verifier.kill()
+    ticker_greenlet.kill()
+
+    print('pool size {:>2} {:>8.0f} msg/s  max hub stall {:>6.1f} ms'.format(
+        pool_size, len(offers) / seconds, max_stall * 1000))
+
+
+def main():
+    offers = make_offers()
+    for pool_size in (0, 1, 2, 4):
+        bench(pool_size, offers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Swaps per second through the commitment service tasks: CommitmentTask, TransferReceivedTask and
+SwapExecutionTask, connected to the in-process MessageBroker and the mocked trader.
+Every swap takes the full path from the maker commitment to `processed`. The messages are signed
+and their senders recovered in advance,
+so mostly the swap state machine and the task plumbing is measured.
+
+    python -m raidex.tests.benchmarks.bench_swap_throughput
+"""
+import contextlib
+import os
+import time
+
+import gevent
+from gevent.queue import Queue
+from eth_utils import keccak
+
+from raidex import messages
+from raidex.signing import Signer
+from raidex.utils import timestamp
+from raidex.commitment_service.tasks import CommitmentTask, TransferReceivedTask, SwapExecutionTask
+from raidex.message_broker.message_broker import MessageBroker
+from raidex.trader_mock.trader import Trader, TraderClientMock
+
+NOF_SWAPS = 2000
+AMOUNT = 5
+
+
+def signed(message, signer):
+    signer.sign(message)
+    # recover and cache the sender outside of the measurement
+    assert message.sender == signer.address
+    return message
+
+
+def make_messages(maker, taker):
+    timeout = timestamp.time_plus(seconds=3600)
+    swap_messages = list()
+    for offer_id in range(1, NOF_SWAPS + 1):
+        offer_hash = keccak(offer_id)
+        swap_messages.append((
+            offer_id,
+            signed(messages.Commitment(offer_id, offer_hash, timeout, AMOUNT), maker),
+            signed(messages.Commitment(offer_id, offer_hash, timeout, AMOUNT), taker),
+            signed(messages.SwapExecution(offer_id, timestamp.time()), maker),
+            signed(messages.SwapExecution(offer_id, timestamp.time()), taker),
+        ))
+    return swap_messages
+
+
+def main():
+    service, maker, taker = Signer.random(), Signer.random(), Signer.random()
+    broker = MessageBroker()
+    trader = Trader()
+    service_client = TraderClientMock(service.address, trader=trader)
+    balance = NOF_SWAPS * AMOUNT
+    maker_client = TraderClientMock(maker.address, commitment_balance=balance, trader=trader)
+    taker_client = TraderClientMock(taker.address, commitment_balance=balance, trader=trader)
+
+    swaps = dict()
+    refund_queue = Queue()
+    message_queue = Queue()
+    tasks = [
+        CommitmentTask(swaps, refund_queue, message_queue, broker, service.address),
+        TransferReceivedTask(swaps, service_client),
+        SwapExecutionTask(swaps, broker, service.address),
+    ]
+    swap_messages = make_messages(maker, taker)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for task in tasks:
+            task.start()
+        gevent.idle()
+
+        start = time.monotonic()
+        for offer_id, maker_commitment, _, _, _ in swap_messages:
+            broker.send(service.address, maker_commitment)
+        gevent.idle()
+        for offer_id, _, _, _, _ in swap_messages:
+            maker_client.transfer(service.address, AMOUNT, offer_id)
+        gevent.idle()
+        for offer_id, _, taker_commitment, _, _ in swap_messages:
+            broker.send(service.address, taker_commitment)
+        gevent.idle()
+        for offer_id, _, _, _, _ in swap_messages:
+            taker_client.transfer(service.address, AMOUNT, offer_id)
+        gevent.idle()
+        for offer_id, _, _, maker_execution, taker_execution in swap_messages:
+            broker.send(service.address, maker_execution)
+            broker.send(service.address, taker_execution)
+        gevent.idle()
+        seconds = time.monotonic() - start
+
+        gevent.killall(tasks)
+
+    assert not swaps, '{} swaps not processed'.format(len(swaps))
+    assert refund_queue.qsize() == 2 * NOF_SWAPS
+    print('{} swaps in {:.2f}s, {:.0f} swaps/s'.format(NOF_SWAPS, seconds, NOF_SWAPS / seconds))
+
+
+if __name__ == '__main__':
+    main()
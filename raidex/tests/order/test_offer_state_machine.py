@@ -2,6 +2,9 @@ import pytest
 
 from raidex.messages import CommitmentProof
 from raidex.utils import random_secret, keccak
+from raidex.raidex_node.order import fsm_offer
+from raidex.raidex_node.order.fsm import MachineError
+from raidex.raidex_node.commitment_service.events import CommitEvent
 
 
 @pytest.fixture
@@ -45,3 +48,41 @@ def test_receive_published_offer(internal_offer):
     internal_offer.received_offer()
     assert internal_offer.state == 'published'
     assert internal_offer.status == 'open'
+
+
+def test_invalid_trigger(internal_offer):
+    with pytest.raises(MachineError):
+        internal_offer.received_offer()
+    assert internal_offer.state == 'created'
+
+
+def test_enter_callbacks(internal_offer, mocker):
+    dispatch = mocker.patch('raidex.raidex_node.order.events.dispatch_events')
+
+    internal_offer.initiating()
+    internal_offer.payment_failed()
+    # entering unproved again commits again
+    assert [type(call[0][0][0]) for call in dispatch.call_args_list] == [CommitEvent, CommitEvent]
+
+    internal_offer.receive_commitment_proof(proof='proof')
+    assert internal_offer.proof == 'proof'
+
+
+@pytest.mark.parametrize('terminal_status', ['completed', 'canceled'])
+def test_terminal_states_remove_model(internal_offer, terminal_status, mocker):
+    mocker.patch('raidex.raidex_node.order.events.dispatch_events')
+    assert id(internal_offer) in fsm_offer.models
+
+    if terminal_status == 'completed':
+        internal_offer.initiating()
+        internal_offer.receive_commitment_proof(proof='proof')
+        internal_offer.found_match()
+        internal_offer.received_inbound(raiden_event=None)
+        assert internal_offer.status == 'pending'
+        internal_offer.received_inbound(raiden_event=None)
+    else:
+        internal_offer.timeout()
+        internal_offer.receive_cancellation_proof(None)
+
+    assert internal_offer.status == terminal_status
+    assert id(internal_offer) not in fsm_offer.models
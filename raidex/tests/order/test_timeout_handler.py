@@ -2,6 +2,7 @@ import pytest
 import gevent
 from raidex.utils.greenlet_helper import TimeoutHandler
 from raidex.utils.timestamp import seconds_to_timeout
+from raidex.raidex_node.order.offer import BasicOffer
 from raidex.exceptions import AlreadyTimedOutException
 
 
@@ -10,49 +11,79 @@ def timeout_handler():
     return TimeoutHandler()
 
 
+@pytest.fixture
+def dispatched(mocker):
+    dispatched = list()
+    mocker.patch('raidex.utils.greenlet_helper.dispatch_state_changes',
+                 side_effect=dispatched.append)
+    return dispatched
+
+
 def test_create_new_timeout(timeout_handler, basic_offer):
 
     success = timeout_handler.create_new_timeout(basic_offer)
 
     assert success
-    assert timeout_handler._has_greenlet(basic_offer.offer_id)
-    assert not timeout_handler.timeout_greenlets[basic_offer.offer_id].dead
-    assert not timeout_handler.timeout_greenlets[basic_offer.offer_id].ready()
+    assert timeout_handler.has_timeout(basic_offer.offer_id)
+    assert timeout_handler.is_pending(basic_offer.offer_id)
+    assert timeout_handler.queue_length == 1
 
 
 def test_create_new_timeout_of_existing(timeout_handler, basic_offer):
 
     success = timeout_handler.create_new_timeout(basic_offer, 10)
     assert success
-    old_timeout_greenlet = timeout_handler.timeout_greenlets[basic_offer.offer_id]
 
     success = timeout_handler.create_new_timeout(basic_offer)
     assert success
 
-    assert not timeout_handler.timeout_greenlets[basic_offer.offer_id].dead
-    assert old_timeout_greenlet.dead
+    assert timeout_handler.is_pending(basic_offer.offer_id)
+    assert timeout_handler.queue_length == 1
 
 
-def test_create_new_timeout_of_timeouted_offer(timeout_handler, basic_offer):
+def test_create_new_timeout_of_timeouted_offer(timeout_handler, basic_offer, dispatched):
     success = timeout_handler.create_new_timeout(basic_offer, seconds_to_timeout(basic_offer.timeout_date))
     assert success
-    timeout_greenlet = timeout_handler.timeout_greenlets[basic_offer.offer_id]
-    gevent.wait([timeout_greenlet])
-    assert timeout_greenlet.dead
+    gevent.sleep(0.05)
+
+    assert len(dispatched) == 1
+    assert dispatched[0][0].offer_id == basic_offer.offer_id
+    assert not timeout_handler.is_pending(basic_offer.offer_id)
 
     with pytest.raises(AlreadyTimedOutException):
         timeout_handler.create_new_timeout(basic_offer)
 
 
-def test_clean_up_timeout(timeout_handler, basic_offer):
-    offer_id = basic_offer.offer_id
+def test_batched_dispatch(timeout_handler, basic_offer, dispatched):
+    offers = [BasicOffer(offer_id, basic_offer.type, 1, 1, basic_offer.timeout_date)
+              for offer_id in range(3)]
+    threshold = seconds_to_timeout(basic_offer.timeout_date)
 
+    for offer in offers:
+        timeout_handler.create_new_timeout(offer, threshold)
     timeout_handler.create_new_timeout(basic_offer)
-    timeout_greenlet = timeout_handler.timeout_greenlets[offer_id]
-    timeout_handler.clean_up_timeout(offer_id)
+    gevent.sleep(0.05)
 
-    assert not timeout_handler._has_greenlet(offer_id)
-    assert timeout_greenlet.dead
+    assert len(dispatched) == 1
+    assert [state_change.offer_id for state_change in dispatched[0]] == [0, 1, 2]
+    assert timeout_handler.queue_length == 1
+    assert timeout_handler.last_lateness >= 0
 
+    gauges = timeout_handler.gauges()
+    assert gauges['timeouts_pending'] == 1
+    assert gauges['timeout_last_lateness'] == timeout_handler.last_lateness
+    assert gauges['timeout_max_lateness'] >= gauges['timeout_last_lateness']
+
+
+def test_clean_up_timeout(timeout_handler, basic_offer, dispatched):
+    offer_id = basic_offer.offer_id
+
+    threshold = seconds_to_timeout(basic_offer.timeout_date) - 0.02
+    timeout_handler.create_new_timeout(basic_offer, threshold)
+    timeout_handler.clean_up_timeout(offer_id)
 
+    assert not timeout_handler.has_timeout(offer_id)
+    assert timeout_handler.queue_length == 0
 
+    gevent.sleep(0.05)
+    assert dispatched == []
@@ -0,0 +1,61 @@
+from raidex.message_broker.broadcast_log import BroadcastLog, RECORD_HEADER
+from raidex.messages import Envelope, SwapOffer, ProvenOffer, CommitmentProof
+from raidex.signing import Signer
+from raidex.utils import make_address, timestamp
+
+
+def make_proven_offer(offer_id, timeout):
+    signer = Signer.random()
+    offer = SwapOffer(make_address(), 10, make_address(), 20, offer_id, timeout)
+    proof = CommitmentProof(b'\x00' * 65, b'\x00' * 32, b'\x00' * 32, offer_id)
+    signer.sign(proof)
+    proven_offer = ProvenOffer(offer, proof)
+    signer.sign(proven_offer)
+    return proven_offer
+
+
+def test_append_and_read(tmpdir):
+    broadcast_log = BroadcastLog(str(tmpdir), segment_size=256)
+    messages = [Envelope.to_frame('text {}'.format(index)) for index in range(10)] + ['plain text']
+    offsets = [broadcast_log.append(message) for message in messages]
+
+    assert offsets == list(range(11))
+    assert len(broadcast_log.segments) > 1
+    assert list(broadcast_log.read()) == list(enumerate(messages))
+    assert list(broadcast_log.read(9)) == [(9, messages[9]), (10, 'plain text')]
+    assert list(broadcast_log.read(3, 5)) == [(3, messages[3]), (4, messages[4])]
+    assert list(broadcast_log.read(11)) == []
+
+
+def test_reopen_recovers_offsets(tmpdir):
+    broadcast_log = BroadcastLog(str(tmpdir), segment_size=256)
+    for index in range(10):
+        broadcast_log.append('text {}'.format(index))
+    broadcast_log.close()
+
+    broadcast_log = BroadcastLog(str(tmpdir), segment_size=256)
+    assert broadcast_log.next_offset == 10
+    assert broadcast_log.append('text 10') == 10
+    expected = ['text {}'.format(index) for index in range(11)]
+    assert [data for _, data in broadcast_log.read()] == expected
+
+
+def test_retention(tmpdir):
+    now = timestamp.time()
+    broadcast_log = BroadcastLog(str(tmpdir), segment_size=RECORD_HEADER.size + 16, retention=10)
+    expired_offer = Envelope.envelop(make_proven_offer(1, now + 1000), Envelope.binary_version)
+    live_offer = Envelope.envelop(make_proven_offer(2, now + 60 * 1000), Envelope.binary_version)
+
+    broadcast_log.append('old', now=now - 60 * 1000)
+    broadcast_log.append(expired_offer, now=now)
+    broadcast_log.append(live_offer, now=now)
+    broadcast_log.append('new', now=now)
+
+    # offers expire with their timeout, other messages after the retention
+    assert list(broadcast_log.read(now=now + 2000)) == [(2, live_offer), (3, 'new')]
+
+    # the segments are deleted once everything in them expired
+    broadcast_log.enforce_retention(now + 2000)
+    assert broadcast_log.start_offset == 2
+    assert len(tmpdir.listdir()) == 2
+    assert list(broadcast_log.read(0, now=now + 2000)) == [(2, live_offer), (3, 'new')]
@@ -43,3 +43,39 @@ def test_stop_listen(message_broker):
     message_broker.stop_listen(listener)
     message_broker.send('test1', 'testmessage')
     assert listener.message_queue_async.empty(), 'Did receive a message it should not'
+
+
+def received(listener):
+    queue = listener.message_queue_async
+    return [queue.get() for _ in range(queue.qsize())]
+
+
+def test_listeners_only_receive_their_message_types(message_broker):
+    strings = message_broker.listen_on('test1', message_types=str)
+    numbers = message_broker.listen_on('test1', message_types=(int, float))
+    everything = message_broker.listen_on('test1')
+    for message in ['testmessage', 1, 2.5]:
+        message_broker.send('test1', message)
+
+    assert received(strings) == ['testmessage']
+    assert received(numbers) == [1, 2.5]
+    assert received(everything) == ['testmessage', 1, 2.5]
+
+    # listeners joining later are offered the messages of their type as well
+    late_numbers = message_broker.listen_on('test1', message_types=int)
+    message_broker.send('test1', 3)
+    assert late_numbers.message_queue_async.get() == 3
+
+
+def test_shared_transform_runs_once(message_broker):
+    calls = []
+
+    def transform(message):
+        calls.append(message)
+        return message.upper()
+
+    listeners = [message_broker.listen_on_broadcast(transform) for _ in range(3)]
+    message_broker.broadcast('testmessage')
+
+    assert calls == ['testmessage']
+    assert [listener.message_queue_async.get() for listener in listeners] == ['TESTMESSAGE'] * 3
@@ -0,0 +1,245 @@
+import json
+
+import gevent
+import pytest
+from gevent.pywsgi import WSGIServer
+
+from raidex.message_broker import server
+from raidex.message_broker.broadcast_log import BroadcastLog
+from raidex.raidex_node.transport.client import MessageBrokerClient
+from raidex.messages import Envelope, SwapOffer, Cancellation
+from raidex.signing import Signer
+from raidex.utils import make_address, timestamp
+from raidex.utils.http_session import make_session
+
+
+def test_bulk_send():
+    offers = [SwapOffer(make_address(), 10, make_address(), 20, offer_id,
+                        timestamp.time_plus(seconds=10))
+              for offer_id in range(3)]
+    data = b''.join(Envelope.envelop(offer, Envelope.binary_version) for offer in offers)
+    data += Envelope.to_frame('plain text')
+
+    listener = server.message_broker.listen_on('bulk')
+    try:
+        response = server.app.test_client().post('/api/topics/bulk/bulk', data=data,
+                                                 content_type='application/octet-stream')
+
+        assert response.status_code == 200
+        assert len(response.get_json()['data']) == 4
+        received = [listener.message_queue_async.get(block=False) for _ in range(4)]
+        assert [Envelope.open(frame) for frame in received[:3]] == offers
+        assert Envelope.to_json(received[3]) == 'plain text'
+    finally:
+        server.message_broker.stop_listen(listener)
+
+
+@pytest.fixture
+def http_server():
+    http_server = WSGIServer(('127.0.0.1', 0), server.app, log=None,
+                             handler_class=server.NoDelayHandler)
+    http_server.start()
+    yield http_server
+    http_server.stop()
+
+
+@pytest.mark.parametrize('envelope_version', [Envelope.binary_version, Envelope.version])
+def test_all_topics_over_one_stream(http_server, envelope_version):
+    client = MessageBrokerClient(host='127.0.0.1', port=http_server.server_port,
+                                 envelope_version=envelope_version)
+    address = make_address()
+    signer = Signer.random()
+    cancellations = [Cancellation(offer_id) for offer_id in range(2)]
+    for cancellation in cancellations:
+        signer.sign(cancellation)
+
+    broadcast_listener = client.listen_on('broadcast')
+    address_listener = client.listen_on(address)
+    assert len(server.streams) == 1
+
+    client.broadcast('plain text')
+    client.send(address, cancellations[0])
+    client.broadcast(cancellations[1])
+    with gevent.Timeout(5):
+        assert broadcast_listener.message_queue_async.get() == 'plain text'
+        assert broadcast_listener.message_queue_async.get().offer_id == 1
+        received = address_listener.message_queue_async.get()
+    assert received.offer_id == 0 and received.sender == signer.address
+
+    client.stop_listen(address_listener)
+    topic_stream, = server.streams.values()
+    assert list(topic_stream.listeners) == ['broadcast']
+
+    client.stop_listen(broadcast_listener)
+    assert not server.streams
+    assert not server.message_broker.listeners['broadcast']
+
+
+def take_items(subscription):
+    items = list()
+    with gevent.Timeout(1, False):
+        for item in subscription.items():
+            items.append(item)
+    return items
+
+
+@pytest.mark.parametrize('policy, expected', [
+    (server.DROP_OLDEST, [2, 3, 4]),
+    (server.SNAPSHOT, [server.SNAPSHOT_MARKER, 3, 4]),
+    (server.DISCONNECT, []),
+])
+def test_subscription_policies(policy, expected):
+    subscription = server.Subscription('test', queue_size=3, policy=policy)
+    for item in range(5):
+        subscription.put(item)
+
+    assert subscription.max_lag == 3
+    assert take_items(subscription) == expected
+    nof_delivered = len([item for item in expected if item != server.SNAPSHOT_MARKER])
+    assert subscription.nof_dropped == 5 - nof_delivered
+    assert subscription.closed == (policy == server.DISCONNECT)
+
+
+def test_subscription_block_policy():
+    # subscribers don't lose messages unless they ask for a lossy policy
+    assert server.Subscription('test').policy == server.BLOCK
+
+    subscription = server.Subscription('test', queue_size=1, policy=server.BLOCK,
+                                       block_timeout=0.1)
+    subscription.put(0)
+    publisher = gevent.spawn(subscription.put, 1)
+    gevent.sleep(0.01)
+    assert not publisher.ready()
+
+    items = subscription.items()
+    assert next(items) == 0
+    publisher.join(1)
+    assert publisher.ready() and next(items) == 1
+
+    # a subscriber which doesn't take its messages gets disconnected
+    subscription.put(2)
+    subscription.put(3)
+    assert subscription.closed
+    assert list(items) == []
+
+
+def test_subscription_metrics():
+    client = server.app.test_client()
+    assert client.put('/api/streams/metrics/topics/lagging').status_code == 200
+    try:
+        for _ in range(3):
+            server.message_broker.send('lagging', 'plain text')
+
+        metrics, = [metrics for metrics in client.get('/api/subscriptions').get_json()['data']
+                    if metrics['name'] == 'stream metrics']
+        # the acknowledgement of the subscription and the messages
+        assert metrics['lag'] == metrics['max_lag'] == 4
+        assert metrics['policy'] == server.BROKER_QUEUE_POLICY
+        assert client.get('/api/streams/metrics?policy=unknown').status_code == 400
+    finally:
+        client.delete('/api/streams/metrics')
+    assert not server.subscriptions
+
+
+def test_unconnected_stream_expires():
+    topic_stream = server.get_stream('unconnected', connect_timeout=0.05)
+    topic_stream.subscribe('broadcast')
+    connected_stream = server.get_stream('connected', connect_timeout=0.05)
+    connected_stream.connected = True
+    try:
+        gevent.sleep(0.1)
+        assert list(server.streams) == ['connected']
+        assert not server.message_broker.listeners['broadcast']
+        assert topic_stream.subscription not in server.subscriptions
+    finally:
+        server.close_stream('connected')
+
+
+def test_replay_broadcasts(tmpdir, http_server):
+    server.broadcast_log = BroadcastLog(str(tmpdir))
+    try:
+        session = make_session()
+        url = 'http://127.0.0.1:{}/api/topics/broadcast'.format(http_server.server_port)
+        for index in range(3):
+            # logged broadcasts are not dropped without listeners
+            response = session.post(url, json={'message': 'text {}'.format(index)})
+            assert response.json()['data'] is True
+
+        response = session.get(url, params={'from_offset': 1}, stream=True)
+        lines = response.iter_lines()
+        with gevent.Timeout(5):
+            assert json.loads(next(lines).decode()) == {'data': 'text 1', 'offset': 1}
+            assert json.loads(next(lines).decode()) == {'data': 'text 2', 'offset': 2}
+            session.post(url, json={'message': 'text 3'})
+            assert json.loads(next(lines).decode()) == {'data': 'text 3', 'offset': 3}
+        response.close()
+
+        # without following the log, the replay ends
+        response = session.get(url, params={'from_offset': 2, 'follow': 'false'})
+        assert [json.loads(line) for line in response.text.splitlines()] == [
+            {'data': 'text 2', 'offset': 2}, {'data': 'text 3', 'offset': 3}]
+
+        assert session.get('{}?from_offset=x'.format(url)).status_code == 400
+    finally:
+        server.broadcast_log.close()
+        server.broadcast_log = None
+
+
+def test_stream_reconnects(http_server):
+    client = MessageBrokerClient(host='127.0.0.1', port=http_server.server_port)
+    broadcast_listener = client.listen_on('broadcast')
+    client.topic_stream.backoff_base = 0.01
+    try:
+        with gevent.Timeout(5):
+            while not any(topic_stream.connected for topic_stream in server.streams.values()):
+                gevent.sleep(0.01)
+            # e.g. the broker disconnected a lagging subscriber
+            stream_id, = server.streams
+            server.close_stream(stream_id)
+            while not any(topic_stream.connected for topic_stream in server.streams.values()):
+                gevent.sleep(0.01)
+
+            assert list(server.streams) != [stream_id]
+            client.broadcast('plain text')
+            assert broadcast_listener.message_queue_async.get() == 'plain text'
+        assert client.topic_stream.nof_reconnects == 1
+    finally:
+        client.stop_listen(broadcast_listener)
+
+
+def wait_for_message(listener, message):
+    while listener.message_queue_async.get() != message:
+        pass
+
+
+@pytest.mark.parametrize('envelope_version', [Envelope.binary_version, Envelope.version])
+def test_stream_resyncs_broadcasts(tmpdir, http_server, envelope_version):
+    server.broadcast_log = BroadcastLog(str(tmpdir))
+    client = MessageBrokerClient(host='127.0.0.1', port=http_server.server_port,
+                                 envelope_version=envelope_version)
+    broadcast_listener = client.listen_on('broadcast')
+    client.topic_stream.backoff_base = 0.1
+    try:
+        with gevent.Timeout(5):
+            while not any(topic_stream.connected for topic_stream in server.streams.values()):
+                gevent.sleep(0.01)
+            stream_id, = server.streams
+            server.close_stream(stream_id)
+            # sent while the client is disconnected
+            client.broadcast('text 0')
+            wait_for_message(broadcast_listener, 'text 0')
+            assert client.topic_stream.nof_resyncs == 1
+
+            while not any(topic_stream.connected for topic_stream in server.streams.values()):
+                gevent.sleep(0.01)
+            stream_id, = server.streams
+            # the messages dropped for the snapshot are replayed
+            server.message_broker.stop_listen(server.streams[stream_id].listeners.pop('broadcast'))
+            client.broadcast('text 1')
+            server.streams[stream_id].subscription.put(server.SNAPSHOT_MARKER)
+            wait_for_message(broadcast_listener, 'text 1')
+            assert client.topic_stream.nof_resyncs == 2
+    finally:
+        client.stop_listen(broadcast_listener)
+        server.broadcast_log.close()
+        server.broadcast_log = None
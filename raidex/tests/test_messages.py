@@ -13,6 +13,7 @@ from raidex.messages import (
     ProvenCommitment,
     ProvenOffer,
     Envelope,
+    recover_sender,
     SwapCompleted,
     SwapExecution,
     CommitmentServiceAdvertisement
@@ -70,6 +71,38 @@ def test_signing(accounts):
     assert raised
 
 
+def test_cached_hash_and_sender(accounts):
+    c = Commitment(offer_id=10, offer_hash=keccak(text='offer id'),
+                   timeout=timestamp.time_plus(seconds=1), amount=10)
+    hash_before = c.hash
+    c.amount = 11
+    # mutable objects are never cached
+    assert c.hash != hash_before
+
+    c.sign(accounts[0].privatekey)
+    assert not c.is_mutable()
+    signed_hash = c.hash
+    assert c.sender == accounts[0].address
+    assert c.__dict__['_hash_cache'] == signed_hash
+    assert '_sender' in c.__dict__
+
+    c.make_mutable()
+    assert '_hash_cache' not in c.__dict__
+    assert '_sender' not in c.__dict__
+    c.amount = 12
+    assert c.hash != signed_hash
+    # the signature doesn't match the changed message anymore
+    assert c.sender != accounts[0].address
+
+    c.sign(accounts[0].privatekey)
+    assert c.sender == accounts[0].address
+
+    deserialized = Commitment.deserialize(Commitment.serialize(c))
+    hits_before = recover_sender.cache_info().hits
+    assert deserialized.sender == accounts[0].address
+    assert recover_sender.cache_info().hits == hits_before + 1
+
+
 def test_maker_commitments(assets, accounts):
     offer = SwapOffer(assets[0], 100, assets[1], 110, big_endian_to_int(keccak(text='offer id')), 10)
     maker = accounts[0]
@@ -184,3 +217,23 @@ def assert_envelope_serialization(message):
         envelope_dict = json.loads(envelope)
         envelope_dict['version'] = 2
         Envelope.open(json.dumps(envelope_dict))
+
+    frame = Envelope.envelop(message, Envelope.binary_version)
+    assert isinstance(frame, bytes)
+    assert Envelope.open(frame) == message
+    assert len(frame) < len(envelope)
+
+    # conversion between the formats must not change the message
+    assert Envelope.to_frame(envelope) == frame
+    assert Envelope.open(Envelope.to_json(frame)) == message
+
+    with pytest.raises(ValueError):
+        Envelope.open(frame[:-1])
+
+    with pytest.raises(ValueError):
+        Envelope.open(bytes([3]) + frame[1:])
+
+
+def test_envelope_frame_with_plain_text():
+    frame = Envelope.to_frame('testmessage')
+    assert Envelope.to_json(frame) == 'testmessage'
@@ -0,0 +1,144 @@
+import random
+import time
+
+import gevent
+import pytest
+from gevent.queue import Queue
+
+from raidex.commitment_service.tasks import MessageSenderTask
+from raidex.utils.histogram import Histogram
+
+RECIPIENTS = [b'\x01' * 20, b'\x02' * 20, None]
+
+
+class SlowBroker(object):
+    """a broker with a random round-trip time per request"""
+
+    def __init__(self):
+        self.received = {recipient: list() for recipient in RECIPIENTS}
+        self.nof_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _request(self, recipient, messages_):
+        self.nof_requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        gevent.sleep(random.uniform(0, 0.005))
+        self.received[recipient].extend(messages_)
+        self.in_flight -= 1
+        return [True] * len(messages_)
+
+    def send(self, topic, message):
+        return self._request(topic, [message])[0]
+
+    def broadcast(self, message):
+        return self._request(None, [message])[0]
+
+    def send_bulk(self, topic, messages_):
+        return self._request(topic, messages_)
+
+    def broadcast_bulk(self, messages_):
+        return self._request(None, messages_)
+
+
+class Message(object):
+
+    def __init__(self, recipient, index):
+        self.recipient = recipient
+        self.index = index
+        self.signed = False
+
+
+@pytest.fixture
+def broker():
+    return SlowBroker()
+
+
+def sign(message):
+    message.signed = True
+
+
+def queue_messages(queue, nof_messages, first_index=0):
+    for index in range(first_index, first_index + nof_messages):
+        recipient = random.choice(RECIPIENTS)
+        queue.put((Message(recipient, index), recipient, time.monotonic()))
+
+
+def wait_until_sent(task, nof_messages):
+    with gevent.Timeout(5):
+        while task.nof_sent < nof_messages:
+            gevent.sleep(0.001)
+
+
+@pytest.mark.parametrize('sign_pool_size', [0, 2])
+def test_messages_are_sent_in_order_per_recipient(broker, sign_pool_size):
+    queue = Queue()
+    task = MessageSenderTask(broker, queue, sign, batch_size=16, max_connections=2,
+                             sign_pool_size=sign_pool_size)
+    task.start()
+    for round_ in range(10):
+        queue_messages(queue, 30, first_index=round_ * 30)
+        gevent.sleep(0.001)
+    wait_until_sent(task, 300)
+
+    assert broker.max_in_flight <= 2
+    for recipient, received in broker.received.items():
+        assert all(message.recipient == recipient and message.signed for message in received)
+        indices = [message.index for message in received]
+        assert indices == sorted(indices)
+    task.kill()
+
+
+def test_batches_are_sent_in_bulk(broker):
+    queue = Queue()
+    queue_messages(queue, 300)
+    task = MessageSenderTask(broker, queue, sign, batch_size=100)
+    task.start()
+    wait_until_sent(task, 300)
+
+    # one request per recipient and batch
+    assert broker.nof_requests <= 3 * len(RECIPIENTS)
+    assert task.latency.count == 300
+    assert task.gauges()['messages_sent'] == 300
+    task.kill()
+
+
+class RejectingBroker(object):
+    """accepts only broadcasts"""
+
+    def send(self, topic, message):
+        return False
+
+    def broadcast(self, message):
+        return True
+
+
+def test_rejected_messages_are_failed():
+    queue = Queue()
+    queue_messages(queue, 30)
+    nof_broadcasts = len([item for item in queue.queue if item[1] is None])
+    task = MessageSenderTask(RejectingBroker(), queue, sign)
+    task.start()
+    with gevent.Timeout(5):
+        while task.nof_sent + task.nof_failed < 30:
+            gevent.sleep(0.001)
+
+    gauges = task.gauges()
+    assert gauges['messages_sent'] == nof_broadcasts
+    assert gauges['messages_failed'] == 30 - nof_broadcasts
+    assert gauges['send_latency_count'] == gauges['send_latency_bucket_inf'] == nof_broadcasts
+    task.kill()
+
+
+def test_histogram_percentiles():
+    histogram = Histogram(buckets=(1, 2, 4, 8))
+    for value in [0.5, 1.5, 1.5, 3, 3, 3, 7, 7, 7, 100]:
+        histogram.observe(value)
+    assert histogram.count == 10
+    assert histogram.counts == [1, 2, 3, 3, 1]
+    assert histogram.percentile(0.5) == 4
+    assert histogram.percentile(0.9) == 8
+    assert histogram.percentile(0.99) is None
+    assert histogram.mean == pytest.approx(13.35)
+    assert histogram.cumulative_counts() == [(1, 1), (2, 3), (4, 6), (8, 9), (float('inf'), 10)]
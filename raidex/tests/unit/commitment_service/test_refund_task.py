@@ -0,0 +1,138 @@
+import gevent
+import pytest
+from gevent.event import AsyncResult
+from gevent.queue import PriorityQueue
+
+from raidex.signing import Signer
+from raidex.utils import timestamp
+from raidex.trader_mock.trader import TransferReceipt
+from raidex.commitment_service.refund import Refund, RefundStore
+from raidex.commitment_service.tasks import RefundTask
+
+TOKEN = b'\x01' * 20
+
+
+class SlowTraderClient(object):
+    """transfers complete only when the test resolves them"""
+
+    def __init__(self):
+        self.transfers = list()
+
+    def transfer_async(self, token_address, target_address, amount, identifier):
+        result = AsyncResult()
+        self.transfers.append((target_address, amount, identifier, result))
+        return result
+
+    def resolve(self, success=True, exception=None):
+        for _, _, _, result in self.transfers:
+            if not result.ready():
+                if exception is not None:
+                    result.set_exception(exception)
+                else:
+                    result.set(success)
+        gevent.idle()
+
+
+@pytest.fixture
+def trader_client():
+    return SlowTraderClient()
+
+
+def refund(initiator, identifier, amount=10):
+    return Refund(TransferReceipt(initiator, amount, identifier, timestamp.time()), 1, False)
+
+
+def start(task, refunds):
+    for refund_ in refunds:
+        task.refund_queue.put(refund_)
+    task.start()
+    gevent.idle()
+
+
+def test_in_flight_transfers_are_bounded(trader_client):
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, max_in_flight=2)
+    start(task, [refund(Signer.random().address, identifier) for identifier in range(5)])
+
+    assert len(trader_client.transfers) == 2
+    assert task.gauges()['refunds_in_flight'] == 2
+    assert task.gauges()['refunds_pending'] == 3
+
+    trader_client.resolve()
+    assert len(trader_client.transfers) == 4
+    trader_client.resolve()
+    trader_client.resolve()
+    assert len(trader_client.transfers) == 5
+    assert task.gauges()['refunds_done'] == 5
+    task.kill()
+
+
+def test_failed_refunds_are_retried_after_backoff(trader_client):
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, backoff_base=0.05)
+    start(task, [refund(Signer.random().address, 1)])
+
+    trader_client.resolve(success=False)
+    assert task.gauges()['refunds_failed'] == 1
+    assert task.gauges()['refund_transfers_failed'] == 1
+    assert len(trader_client.transfers) == 1
+
+    gevent.sleep(0.1)
+    assert task.gauges()['refunds_failed'] == 0
+    assert len(trader_client.transfers) == 2
+    trader_client.resolve()
+    assert task.gauges()['refunds_done'] == 1
+    task.kill()
+
+
+def test_unexpected_transfer_errors_are_retried(trader_client):
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, max_in_flight=1, backoff_base=0.05)
+    start(task, [refund(Signer.random().address, 1)])
+
+    trader_client.resolve(exception=ValueError('invalid response'))
+    # the transfer slot is free again and the refund waits for its retry
+    assert task.gauges()['refunds_in_flight'] == 0
+    assert task.gauges()['refunds_failed'] == 1
+
+    gevent.sleep(0.1)
+    assert len(trader_client.transfers) == 2
+    trader_client.resolve()
+    assert task.gauges()['refunds_done'] == 1
+    task.kill()
+
+
+def test_backoff_grows_with_jitter(trader_client):
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, backoff_base=1, backoff_max=8)
+    for attempt, delay in [(1, 1), (2, 2), (3, 4), (4, 8), (10, 8)]:
+        assert delay / 2 <= task.backoff(attempt) <= delay
+
+
+def test_pending_refunds_are_coalesced_per_recipient(trader_client):
+    recipient, other = Signer.random().address, Signer.random().address
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, max_in_flight=1, coalesce=True)
+    start(task, [refund(other, 1), refund(recipient, 2), refund(recipient, 3),
+                 refund(recipient, 4)])
+
+    trader_client.resolve()
+    transfers = [(target, amount) for target, amount, _, _ in trader_client.transfers]
+    assert transfers == [(other, 10), (recipient, 30)]
+    trader_client.resolve()
+    assert task.gauges()['refunds_done'] == 4
+    task.kill()
+
+
+def test_outstanding_refunds_survive_restart(tmpdir, trader_client):
+    path = str(tmpdir.join('refunds'))
+    initiator = Signer.random().address
+    task = RefundTask(trader_client, PriorityQueue(), TOKEN, max_in_flight=1,
+                      store=RefundStore(path))
+    start(task, [refund(initiator, identifier) for identifier in range(3)])
+    trader_client.resolve()
+    # every change is synced right away, not only when the store is closed
+    assert task.store._journal._nof_unsynced == 0
+    task.kill()
+    task.store.close()
+
+    restarted_client = SlowTraderClient()
+    restarted = RefundTask(restarted_client, PriorityQueue(), TOKEN, store=RefundStore(path))
+    start(restarted, [refund(initiator, 3)])
+    assert sorted(identifier for _, _, identifier, _ in restarted_client.transfers) == [1, 2, 3]
+    restarted.kill()
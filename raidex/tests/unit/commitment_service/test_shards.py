@@ -0,0 +1,178 @@
+import json
+import os
+
+import gevent
+import pytest
+from eth_utils import keccak
+
+import raidex
+from raidex import messages
+from raidex.signing import Signer, generate_random_privkey
+from raidex.utils import timestamp
+from raidex.trader_mock.trader import TransferReceipt
+from raidex.commitment_service.shards import (
+    shard_of,
+    ShardChannel,
+    ShardedCommitmentService,
+    CommitmentShard,
+    MESSAGE,
+    TRANSFER,
+    METRICS,
+)
+
+NOF_SHARDS = 4
+
+
+class FakeShard(object):
+
+    def __init__(self, index):
+        self.index = index
+        self.frames = list()
+        self.channel = self
+        self.metrics = dict()
+
+    def send(self, kind, payload):
+        self.frames.append((kind, payload))
+
+    def send_json(self, kind, data):
+        self.send(kind, json.dumps(data).encode('utf-8'))
+
+
+@pytest.fixture
+def channels():
+    front_read, shard_write = os.pipe()
+    shard_read, front_write = os.pipe()
+    front, shard = ShardChannel(front_read, front_write), ShardChannel(shard_read, shard_write)
+    yield front, shard
+    front.close()
+    shard.close()
+
+
+@pytest.fixture
+def front(mocker):
+    service = ShardedCommitmentService(generate_random_privkey(), mocker.Mock(), mocker.Mock(),
+                                       NOF_SHARDS, dict())
+    service.shards = [FakeShard(index) for index in range(NOF_SHARDS)]
+    return service
+
+
+def commitment(offer_id, signer):
+    message = messages.Commitment(offer_id, keccak(offer_id), timestamp.time_plus(seconds=60), 5)
+    signer.sign(message)
+    return message
+
+
+def test_shard_of_partitions_offer_ids():
+    offer_ids = range(1000)
+    counts = [0] * NOF_SHARDS
+    for offer_id in offer_ids:
+        counts[shard_of(offer_id, NOF_SHARDS)] += 1
+    assert counts == [250] * NOF_SHARDS
+
+
+def test_channel_round_trip(channels):
+    front, shard = channels
+    # larger than the pipe buffer, the writer has to wait for the reader
+    writer = gevent.spawn(front.send, MESSAGE, b'\x00' * 100000)
+    writer.link(lambda _: front.send_json(TRANSFER, dict(amount=5)))
+
+    assert shard.receive() == (MESSAGE, b'\x00' * 100000)
+    kind, payload = shard.receive()
+    assert kind == TRANSFER and json.loads(payload.decode('utf-8')) == dict(amount=5)
+
+
+def test_channel_ends_when_closed(channels):
+    front, shard = channels
+    shard.send(METRICS, b'{}')
+    shard._writer.close()
+    assert list(front) == [(METRICS, b'{}')]
+
+
+def test_front_routes_messages_by_offer_id(front):
+    signer = Signer.random()
+    for offer_id in range(8):
+        front.route_message(commitment(offer_id, signer))
+    # messages without an offer id have no owning shard
+    front.route_message(object())
+
+    for shard in front.shards:
+        assert len(shard.frames) == 2
+        for kind, payload in shard.frames:
+            message = messages.Envelope.open_frame(payload)
+            assert kind == MESSAGE
+            assert shard_of(message.offer_id, NOF_SHARDS) == shard.index
+            assert message.sender == signer.address
+    assert front.nof_routed_messages == 8
+    assert front.nof_dropped == 1
+
+
+def test_front_routes_transfers_by_identifier(front):
+    initiator = Signer.random().address
+    front.route_transfer(TransferReceipt(initiator, 5, 6, timestamp.time()))
+
+    kind, payload = front.shards[6 % NOF_SHARDS].frames[0]
+    assert kind == TRANSFER
+    assert json.loads(payload.decode('utf-8')) == dict(
+        initiator='0x' + initiator.hex(), binary=True, amount=5, identifier=6)
+
+
+def test_metrics_sum_all_shards(front):
+    for shard in front.shards:
+        shard.metrics = dict(nof_swaps=shard.index, refund_queue_size=1)
+    metrics = front.metrics()
+    assert metrics['nof_swaps'] == 0 + 1 + 2 + 3
+    assert metrics['refund_queue_size'] == NOF_SHARDS
+    assert metrics['nof_shards'] == NOF_SHARDS
+    assert len(metrics['shards']) == NOF_SHARDS
+
+
+def test_shard_hands_frames_to_its_service(mocker):
+    service = mocker.Mock(address=Signer.random().address)
+    shard = CommitmentShard(mocker.Mock(), service, mocker.Mock(), mocker.Mock())
+    signer = Signer.random()
+    message = commitment(3, signer)
+
+    shard.handle(MESSAGE, messages.Envelope.envelop_frame(message))
+    topic, received = shard.inbound_message_broker.send.call_args[0]
+    assert topic == service.address
+    assert received.offer_id == 3 and received.sender == signer.address
+
+    transfer = dict(initiator='0x' + signer.address.hex(), binary=True, amount=5, identifier=3)
+    shard.handle(TRANSFER, json.dumps(transfer).encode('utf-8'))
+    shard.inbound_trader.transfer.assert_called_once_with(signer.address, service.address, 5, 3)
+
+
+def wait_for(condition, timeout=30):
+    with gevent.Timeout(timeout):
+        while not condition():
+            gevent.sleep(0.05)
+
+
+def test_exited_shard_process_is_restarted(mocker, monkeypatch):
+    # the shard processes import the raidex package from the same place as the tests
+    monkeypatch.setenv('PYTHONPATH', os.path.dirname(os.path.dirname(raidex.__file__)))
+    shard_config = dict(message_broker_host='127.0.0.1', message_broker_port=5000,
+                        trader_host='127.0.0.1', trader_port=5001, fee_rate=0,
+                        refund_store_path=None)
+    service = ShardedCommitmentService(generate_random_privkey(), mocker.Mock(), mocker.Mock(),
+                                       2, shard_config, restart_delay=0)
+    signer = Signer.random()
+    service.start_shards()
+    try:
+        wait_for(lambda: all(shard.metrics for shard in service.shards))
+        exited = service.shards[0]
+        exited.process.kill()
+        exited.process.wait()
+
+        # the frames for the exited shard are dropped, the other shard still receives its frames
+        service.route_message(commitment(2, signer))
+        service.route_message(commitment(3, signer))
+        assert service.nof_dropped == 1
+        assert service.nof_routed_messages == 1
+
+        wait_for(lambda: service.shards[0] is not exited and service.shards[0].metrics)
+        assert service.metrics()['nof_shard_restarts'] == 1
+        service.route_message(commitment(4, signer))
+        assert service.nof_routed_messages == 2
+    finally:
+        service.stop()
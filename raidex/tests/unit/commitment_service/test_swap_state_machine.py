@@ -0,0 +1,95 @@
+import pytest
+from eth_utils import keccak
+
+from raidex import messages
+from raidex.signing import Signer
+from raidex.utils import timestamp
+from raidex.trader_mock.trader import TransferReceipt
+from raidex.commitment_service.swap import SwapCommitment
+from raidex.commitment_service.swap_state_machine import SwapStateMachine
+from raidex.raidex_node.order.fsm import MachineError
+
+OFFER_ID = 123
+AMOUNT = 5
+
+
+@pytest.fixture
+def maker():
+    return Signer.random()
+
+
+@pytest.fixture
+def taker():
+    return Signer.random()
+
+
+@pytest.fixture
+def swap(mocker):
+    return SwapCommitment(OFFER_ID, mocker.Mock(), mocker.Mock(), mocker.Mock(),
+                          auto_spawn_timeout=False)
+
+
+def commitment(signer):
+    message = messages.Commitment(OFFER_ID, keccak(OFFER_ID), timestamp.time_plus(seconds=60),
+                                  AMOUNT)
+    signer.sign(message)
+    return message
+
+
+def execution(signer):
+    message = messages.SwapExecution(OFFER_ID, timestamp.time())
+    signer.sign(message)
+    return message
+
+
+def receipt(signer):
+    return TransferReceipt(signer.address, AMOUNT, OFFER_ID, timestamp.time())
+
+
+def test_swap_traded(swap, maker, taker):
+    swap.hand_maker_commitment_msg(commitment(maker))
+    assert swap.state == 'wait_for_maker'
+    swap.hand_transfer_receipt(receipt(maker))
+    assert swap.state == 'wait_for_taker'
+
+    swap.hand_taker_commitment_msg(commitment(taker))
+    assert swap.state == 'wait_for_taker'
+    swap.hand_transfer_receipt(receipt(taker))
+    assert swap.state == 'wait_for_execution'
+    assert swap.taker_address == taker.address
+
+    swap.hand_swap_execution_msg(execution(taker))
+    assert swap.state == 'wait_for_maker_execution'
+    swap.hand_swap_execution_msg(execution(maker))
+
+    assert swap.state == 'processed'
+    assert swap.terminated_state == 'traded'
+    assert [call[0][2] for call in swap._refund_func.call_args_list] == [True, True]
+    swap._cleanup_func.assert_called_once_with()
+
+
+def test_swap_untraded(swap, maker, taker):
+    swap.hand_maker_commitment_msg(commitment(maker))
+    swap.hand_transfer_receipt(receipt(maker))
+
+    # a transfer without a commitment is refunded and doesn't change the state
+    swap.hand_transfer_receipt(receipt(taker))
+    assert swap.state == 'wait_for_taker'
+    assert swap._refund_func.call_count == 1
+
+    swap.trigger_timeout()
+    assert swap.state == 'processed'
+    assert swap.terminated_state == 'untraded'
+    assert swap._refund_func.call_count == 2
+
+
+def test_invalid_trigger(swap, maker):
+    with pytest.raises(MachineError):
+        swap.hand_transfer_receipt(receipt(maker))
+    assert swap.state == 'initializing'
+
+
+def test_state_is_slotted(swap):
+    assert not hasattr(swap._state_machine, '__dict__')
+    other = SwapStateMachine(swap, auto_spawn_timeout=False)
+    assert other._table is swap._state_machine._table
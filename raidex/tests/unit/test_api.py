@@ -0,0 +1,134 @@
+import json
+
+import pytest
+from flask import Flask
+
+from raidex.raidex_node.api.v0_1 import build_blueprint
+from raidex.raidex_node.offer_book import OfferBookEntry
+from raidex.raidex_node.order.offer import BasicOffer, OfferType
+from raidex.raidex_node.raidex_node import RaidexNode
+
+OFFERS_URL = '/api/v01/markets/dummy/offers'
+
+
+@pytest.fixture
+def raidex_node(market):
+    return RaidexNode(b'1' * 20, market, None, None)
+
+
+@pytest.fixture
+def client(raidex_node):
+    app = Flask(__name__)
+    app.register_blueprint(build_blueprint(raidex_node))
+    return app.test_client()
+
+
+def insert_offer(raidex_node, offer_id, offer_type, base_amount, quote_amount):
+    offer = BasicOffer(offer_id, offer_type, base_amount, quote_amount, 1000)
+    raidex_node.offer_book.insert_offer(OfferBookEntry(offer, None, None))
+
+
+def test_offers_snapshot(raidex_node, client):
+    insert_offer(raidex_node, 1, OfferType.BUY, 10, 25)
+    insert_offer(raidex_node, 2, OfferType.SELL, 10, 30)
+    insert_offer(raidex_node, 3, OfferType.SELL, 10, 41)
+
+    response = client.get(OFFERS_URL)
+    assert response.status_code == 200
+    content = json.loads(response.data.decode())
+    assert content['version'] == 3
+    assert content['data']['buys'] == [dict(amount=10, price=2.5, timeout=1000)]
+    assert [sell['price'] for sell in content['data']['sells']] == [4.1, 3.0]
+
+    # unchanged book, the cached serialization is reused
+    assert raidex_node.depth_snapshot() is raidex_node.depth_snapshot()
+    etag = response.headers['ETag']
+    assert client.get(OFFERS_URL, headers={'If-None-Match': etag}).status_code == 304
+
+    raidex_node.offer_book.remove_offer(3)
+    response = client.get(OFFERS_URL, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data.decode())['version'] == 4
+
+    content = json.loads(client.get(OFFERS_URL + '?precision=0').data.decode())
+    assert content['data']['buys'] == [dict(amount=10, price=2.0, timeout=1000)]
+    assert client.get(OFFERS_URL + '?precision=9').status_code == 400
+
+
+def read_lines(subscription):
+    lines = list()
+    while not subscription.queue.empty():
+        lines.append(json.loads(subscription.queue.get()))
+    return lines
+
+
+def test_market_feed(raidex_node):
+    market_feed = raidex_node.market_feed
+    insert_offer(raidex_node, 1, OfferType.BUY, 10, 25)
+
+    subscription = market_feed.subscribe()
+    snapshot, = read_lines(subscription)
+    assert snapshot['type'] == 'snapshot'
+    assert snapshot['seq'] == 1
+    assert snapshot['buys'] == [dict(price=2.5, amount=10, count=1, timeout=1000)]
+
+    insert_offer(raidex_node, 2, OfferType.BUY, 4, 10)
+    insert_offer(raidex_node, 3, OfferType.SELL, 10, 30)
+    raidex_node.offer_book.remove_offer(1)
+    raidex_node.offer_book.remove_offer(2)
+    raidex_node._trades_view.add_pending(BasicOffer(4, OfferType.SELL, 10, 30, 1000))
+    raidex_node._trades_view.report_completed(4, 500)
+
+    deltas = read_lines(subscription)
+    assert [delta['seq'] for delta in deltas] == [2, 3, 4, 5, 6]
+    changes = [(delta['side'], delta['action'], delta['price'], delta['amount'])
+               for delta in deltas[:4]]
+    assert changes == [
+        ('buys', 'change', 2.5, 14),
+        ('sells', 'add', 3.0, 10),
+        ('buys', 'change', 2.5, 4),
+        ('buys', 'remove', 2.5, 0),
+    ]
+    assert deltas[4] == dict(type='trade', seq=6, timestamp=500, price=3.0, amount=10, side='SELL')
+
+    market_feed.unsubscribe(subscription)
+    insert_offer(raidex_node, 5, OfferType.BUY, 10, 25)
+    assert subscription.queue.empty()
+
+
+def test_market_feed_drops_slow_subscription(raidex_node):
+    market_feed = raidex_node.market_feed
+    market_feed.queue_size = 2
+    subscription = market_feed.subscribe()
+
+    for offer_id in range(2):
+        insert_offer(raidex_node, offer_id, OfferType.BUY, 10, 25)
+
+    assert subscription.overflowed
+    assert subscription not in market_feed.subscriptions
+    assert list(subscription.iter_lines()) == []
+
+
+def test_stream_endpoint(raidex_node, client):
+    insert_offer(raidex_node, 1, OfferType.SELL, 10, 25)
+
+    response = client.get('/api/v01/markets/dummy/stream', buffered=False)
+    assert response.mimetype == 'application/x-json-stream'
+    snapshot = json.loads(next(response.response))
+    assert snapshot['sells'] == [dict(price=2.5, amount=10, count=1, timeout=1000)]
+    assert len(raidex_node.market_feed.subscriptions) == 1
+
+    response.close()
+    assert len(raidex_node.market_feed.subscriptions) == 0
+
+
+def test_metrics(raidex_node, client):
+    insert_offer(raidex_node, 1, OfferType.SELL, 10, 25)
+
+    response = client.get('/api/v01/markets/dummy/metrics')
+    assert response.status_code == 200
+    metrics = json.loads(response.data.decode())['data']
+    assert metrics['nof_offers'] == 1
+    assert metrics['offer_book_memory']['entries'] == 1
+    assert metrics['timeouts_pending'] == 0
+    assert metrics['timeout_max_lateness'] == 0
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from raidex.raidex_node.candles import CandleStore
+from raidex.raidex_node.offer_grouping import make_price_bins
+from raidex.raidex_node.order.offer import BasicOffer, OfferType
+from raidex.raidex_node.trades import TradesView
+
+NOW = 1546300805000
+
+
+@pytest.fixture
+def trades_view():
+    trades_view = TradesView()
+    random.seed(1)
+    for offer_id in range(300):
+        # prices with an exact float representation,
+        # the float based bins quantize them the same way
+        offer = BasicOffer(offer_id, OfferType.SELL, 4, random.randint(1, 400), NOW)
+        trades_view.add_pending(offer)
+        trades_view.report_completed(offer_id, NOW - random.randint(0, 1200 * 1000))
+    return trades_view
+
+
+def assert_same_bins(candles, price_bins):
+    assert len(candles) == len(price_bins)
+    for candle, price_bin in zip(candles, price_bins):
+        assert candle.timestamp == price_bin.timestamp
+        assert candle.amount == price_bin.amount
+        assert candle.open_price == pytest.approx(price_bin.open_price)
+        assert candle.close_price == pytest.approx(price_bin.close_price)
+        assert candle.min_price == pytest.approx(price_bin.min_price)
+        assert candle.max_price == pytest.approx(price_bin.max_price)
+
+
+@pytest.mark.parametrize('nof_buckets, interval', [(100, 10), (15, 60), (6, 120), (3, 300)])
+def test_candles_match_price_bins(mocker, trades_view, nof_buckets, interval):
+    mocker.patch('raidex.utils.timestamp.time', return_value=NOW)
+
+    candles = trades_view.candles.price_bins(nof_buckets, interval * 1000, NOW)
+    price_bins = make_price_bins(trades_view.trades, nof_buckets, interval)
+
+    assert_same_bins(candles, price_bins)
+
+
+def test_candles_unavailable(trades_view):
+    # no resolution divides the interval
+    assert trades_view.candles.price_bins(10, 15 * 1000, NOW) is None
+
+    candles = CandleStore(resolutions=(10,), history=4)
+    for trade in trades_view.values():
+        candles.add_trade(trade)
+    assert len(candles.price_bins(2, 10 * 1000, NOW)) == 2
+    # the older buckets were overwritten already
+    assert candles.price_bins(10, 10 * 1000, NOW) is None
@@ -0,0 +1,49 @@
+import pytest
+
+from raidex.raidex_node.architecture.event_architecture import (
+    Dispatch,
+    Processor,
+    event_dispatch,
+    dispatch_events,
+)
+
+
+class BaseEvent:
+    pass
+
+
+class DerivedEvent(BaseEvent):
+    pass
+
+
+class OtherEvent:
+    pass
+
+
+@pytest.fixture(autouse=True)
+def clean_dispatch():
+    consumer_tasks = list(Dispatch.consumer_tasks)
+    yield
+    Dispatch.consumer_tasks[:] = consumer_tasks
+    Dispatch.routing_table.clear()
+
+
+def test_routing_table():
+    event_dispatch.connect_consumer(Processor(BaseEvent), None)
+    base_consumer = Dispatch.consumer_tasks[-1]
+
+    dispatch_events([DerivedEvent(), OtherEvent()])
+
+    assert base_consumer.queue.qsize() == 1
+    assert Dispatch.routing_table[DerivedEvent] == [base_consumer.queue]
+    assert Dispatch.routing_table[OtherEvent] == []
+
+    event_dispatch.connect_consumer(Processor((DerivedEvent, OtherEvent)), None)
+    derived_consumer = Dispatch.consumer_tasks[-1]
+    assert DerivedEvent not in Dispatch.routing_table
+
+    dispatch_events([DerivedEvent(), BaseEvent()])
+
+    assert base_consumer.queue.qsize() == 3
+    assert derived_consumer.queue.qsize() == 1
+    assert Dispatch.routing_table[DerivedEvent] == [base_consumer.queue, derived_consumer.queue]
@@ -0,0 +1,83 @@
+from collections import namedtuple
+
+import pytest
+
+from raidex.utils.random import create_random_32_bytes_id
+from raidex.utils.timestamp import time_plus
+from raidex.raidex_node.offer_book import OfferBook, OfferBookEntry
+from raidex.raidex_node.order.offer import BasicOffer, OfferFactory, OfferType, TraderRole
+from raidex.raidex_node.architecture.data_manager import DataManager
+from raidex.raidex_node.architecture.state_change import (
+    OfferPublishedStateChange,
+    OfferTimeoutStateChange,
+)
+from raidex.raidex_node.architecture.journal import StateStorage
+from raidex.utils.journal import Journal
+
+
+Node = namedtuple('Node', 'data_manager')
+
+
+def make_entry(offer_type=OfferType.SELL):
+    offer = BasicOffer(create_random_32_bytes_id(), offer_type, 10, 20, time_plus(seconds=60))
+    return OfferBookEntry(offer, b'1' * 20, None)
+
+
+def handle_offer_published(node, state_change):
+    node.data_manager.matching_engine.offer_book.insert_offer(state_change.offer_entry)
+
+
+@pytest.fixture
+def data_manager(market):
+    data_manager = DataManager(OfferBook(), market)
+    yield data_manager
+    data_manager.timeout_handler.stop()
+
+
+def test_journal_read_ignores_torn_record(tmpdir):
+    path = str(tmpdir.join('journal'))
+    journal = Journal(path, fsync_batch_size=2)
+    for offer_id in range(3):
+        journal.append(OfferTimeoutStateChange(offer_id, 1))
+    journal.close()
+
+    with open(path, 'ab') as journal_file:
+        journal_file.write(b'\x00\x00\x01\x00torn')
+
+    assert [state_change.offer_id for state_change in Journal.read(path)] == [0, 1, 2]
+
+
+def test_snapshot_and_replay(tmpdir, data_manager, market):
+    storage = StateStorage(str(tmpdir), snapshot_interval=2)
+
+    own_offer = OfferFactory.create_offer(OfferType.BUY, 5, 10, 60, TraderRole.MAKER)
+    own_offer.initiating()
+    data_manager.offer_manager.add_offer(own_offer)
+
+    entries = [make_entry() for _ in range(3)]
+    for entry in entries:
+        state_change = OfferPublishedStateChange(entry)
+        storage.record(state_change)
+        handle_offer_published(Node(data_manager), state_change)
+        storage.after_state_change(data_manager, state_change)
+
+    # the first two entries are in the snapshot, the third one only in the journal
+    assert storage.generation == 1
+    storage.close()
+
+    restored = DataManager(OfferBook(), market)
+    try:
+        nof_replayed = StateStorage(str(tmpdir)).restore(Node(restored), handle_offer_published)
+
+        assert nof_replayed == 1
+        offer_book = restored.matching_engine.offer_book
+        assert [entry.offer_id for entry in offer_book.sells.values()] == \
+               [entry.offer_id for entry in data_manager.matching_engine.offer_book.sells.values()]
+
+        restored_offer = restored.offer_manager.get_offer(own_offer.offer_id)
+        assert restored_offer == own_offer
+        assert restored_offer.state == 'unproved'
+        assert restored_offer.status == 'open'
+        assert restored.timeout_handler.is_pending(own_offer.offer_id)
+    finally:
+        restored.timeout_handler.stop()
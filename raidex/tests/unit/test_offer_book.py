@@ -0,0 +1,316 @@
+import pickle
+
+import gevent
+import pytest
+
+from raidex.messages import OfferTaken, CommitmentProof
+from raidex.signing import Signer
+from raidex.message_broker.message_broker import MessageBroker
+from raidex.utils.random import create_random_32_bytes_id
+from raidex.utils.timestamp import time_plus
+from raidex.raidex_node.listener_tasks import OfferTakenTask, OfferEvictionTask
+from raidex.raidex_node.trades import TradesView
+from raidex.raidex_node.order.offer import OfferType, BasicOffer
+from raidex.raidex_node.offer_book import OfferBook, OfferBookEntry
+from raidex.raidex_node.order.limit_order import LimitOrder
+from raidex.raidex_node.matching.matching_algorithm import match_limit, match_limit_crossing
+from raidex.raidex_node.offer_grouping import group_offers
+from raidex.constants import DEPTH_PRECISIONS
+
+
+def make_entry(offer_type, base_amount, quote_amount, timeout_date=None):
+    offer = BasicOffer(offer_id=create_random_32_bytes_id(),
+                       offer_type=offer_type,
+                       base_amount=base_amount,
+                       quote_amount=quote_amount,
+                       timeout_date=(timeout_date if timeout_date is not None
+                                     else time_plus(seconds=60)))
+    return OfferBookEntry(offer, None, None)
+
+
+@pytest.fixture
+def offer_book():
+    return OfferBook()
+
+
+def test_price_levels(offer_book):
+    first = make_entry(OfferType.SELL, 10, 20)
+    second = make_entry(OfferType.SELL, 5, 10)
+    third = make_entry(OfferType.SELL, 10, 30)
+
+    for entry in (first, second, third):
+        offer_book.insert_offer(entry)
+
+    price_level = offer_book.sells.get_price_level(2.)
+    assert price_level.amount == 15
+    assert list(price_level.values()) == [first, second]
+    assert offer_book.get_offers_by_price(2., OfferType.BUY) == [first, second]
+    assert offer_book.get_offers_by_price(2.5, OfferType.BUY) == []
+
+    assert offer_book.sells.lowest_price_level.price == 2.
+    assert offer_book.sells.highest_price_level.price == 3.
+    assert offer_book.get_best_price_level(OfferType.BUY).price == 2.
+    assert offer_book.get_best_price_level(OfferType.SELL) is None
+
+    assert offer_book.sells.get_offers_in_range(min_price=2.5) == [third]
+    assert [level.price for level in offer_book.sells.iter_price_levels(reverse=True)] == [3., 2.]
+
+    offer_book.remove_offer(first.offer_id)
+    assert price_level.amount == 5
+
+    offer_book.remove_offer(second.offer_id)
+    assert offer_book.sells.get_price_level(2.) is None
+    assert len(offer_book.sells.price_levels) == 1
+
+
+def test_add_offer_twice(offer_book):
+    entry = make_entry(OfferType.SELL, 10, 20)
+    offer_book.sells.add_offer(entry)
+    offer_book.sells.add_offer(make_entry(OfferType.SELL, 5, 10))
+    offer_book.sells.add_offer(entry)
+
+    price_level = offer_book.sells.get_price_level(2.)
+    assert price_level.amount == 15
+    assert len(price_level) == len(offer_book.sells) == 2
+
+    offer_book.sells.remove_offer(entry.offer_id)
+    assert price_level.amount == 5
+
+
+def test_match_limit(offer_book):
+    entries = [make_entry(OfferType.BUY, amount, amount * 2) for amount in (3, 5, 4)]
+    for entry in entries:
+        offer_book.insert_offer(entry)
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.SELL, 20, 2.)
+    take_offers, amount_left = match_limit(offer_book, order)
+    assert take_offers == entries
+    assert amount_left == 8
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.SELL, 8, 2.)
+    take_offers, amount_left = match_limit(offer_book, order)
+    assert take_offers == [entries[1], entries[0]]
+    assert amount_left == 0
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.SELL, 8, 3.)
+    take_offers, amount_left = match_limit(offer_book, order)
+    assert take_offers == []
+    assert amount_left == 8
+
+
+def test_match_limit_crossing(offer_book):
+    cheap = make_entry(OfferType.SELL, 5, 5)
+    first = make_entry(OfferType.SELL, 4, 8)
+    big = make_entry(OfferType.SELL, 10, 20)
+    second = make_entry(OfferType.SELL, 2, 4)
+    expensive = make_entry(OfferType.SELL, 1, 3)
+
+    for entry in (cheap, first, big, second, expensive):
+        offer_book.insert_offer(entry)
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.BUY, 12, 2.)
+    take_offers, amount_left = match_limit_crossing(offer_book, order)
+    assert take_offers == [cheap, first, second]
+    assert amount_left == 1
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.BUY, 5, 2.)
+    take_offers, amount_left = match_limit_crossing(offer_book, order)
+    assert take_offers == [cheap]
+    assert amount_left == 0
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.SELL, 5, 2.)
+    take_offers, amount_left = match_limit_crossing(offer_book, order)
+    assert take_offers == []
+    assert amount_left == 5
+
+
+def test_match_limit_crossing_sell(offer_book):
+    low = make_entry(OfferType.BUY, 3, 3)
+    high = make_entry(OfferType.BUY, 3, 9)
+    middle = make_entry(OfferType.BUY, 3, 6)
+
+    for entry in (low, high, middle):
+        offer_book.insert_offer(entry)
+
+    order = LimitOrder(create_random_32_bytes_id(), OfferType.SELL, 9, 2.)
+    take_offers, amount_left = match_limit_crossing(offer_book, order)
+    assert take_offers == [high, middle]
+    assert amount_left == 3
+
+
+def depth_levels(offer_view, precision):
+    return [(bucket.price, bucket.amount, bucket.count)
+            for bucket in offer_view.depth.levels(precision)]
+
+
+def test_depth_view(offer_book):
+    entries = [make_entry(OfferType.BUY, base_amount, quote_amount)
+               for base_amount, quote_amount in [(10, 25), (4, 10), (8, 21), (2, 7), (10, 9)]]
+    for entry in entries:
+        offer_book.insert_offer(entry)
+    assert offer_book.version == len(entries)
+
+    for precision in (0, 1):
+        grouped = group_offers(entries, price_group_precision=precision)
+        buckets = offer_book.buys.depth.levels(precision)
+        assert [(bucket.price, bucket.amount, bucket.avg_timeout) for bucket in buckets] == \
+               [(offer.price, offer.amount, offer.avg_timeout) for offer in grouped]
+
+    offer_book.remove_offer(entries[0].offer_id)
+    offer_book.remove_offer(entries[2].offer_id)
+    assert offer_book.version == len(entries) + 2
+    assert depth_levels(offer_book.buys, 1) == [(0.9, 10, 1), (2.5, 4, 1), (3.5, 2, 1)]
+    assert offer_book.sells.depth.levels(1) == []
+
+
+def test_depth_view_offer_added_twice(offer_book):
+    entry = make_entry(OfferType.BUY, 10, 25)
+    offer_book.buys.add_offer(entry)
+    offer_book.buys.add_offer(entry)
+    assert depth_levels(offer_book.buys, 1) == [(2.5, 10, 1)]
+
+    # no bucket is left behind after the offer is removed
+    offer_book.buys.remove_offer(entry.offer_id)
+    for precision in DEPTH_PRECISIONS:
+        assert offer_book.buys.depth.levels(precision) == []
+
+
+def test_evict_expired(offer_book):
+    entries = [make_entry(OfferType.BUY if index % 2 else OfferType.SELL, 10, 20,
+                          timeout_date=1000 + index)
+               for index in range(6)]
+    for entry in reversed(entries):
+        offer_book.insert_offer(entry)
+    removed = list()
+    offer_book.observers.append(lambda offer_view, offer_entry, added: removed.append(offer_entry))
+    version = offer_book.version
+
+    assert offer_book.next_timeout_date == 1000
+    assert offer_book.evict_expired(1003, max_batch=3) == entries[:3]
+    assert offer_book.evict_expired(1003) == entries[3:4]
+    assert offer_book.evict_expired(1003) == []
+    assert removed == entries[:4]
+    assert offer_book.version == version + 2
+    assert len(offer_book.buys) + len(offer_book.sells) == 2
+
+    offer_book.remove_offers([entries[4].offer_id, entries[0].offer_id])
+    assert offer_book.next_timeout_date == 1005
+
+
+def test_insert_offer_twice(offer_book):
+    entry = make_entry(OfferType.SELL, 10, 20, timeout_date=1000)
+    offer_book.insert_offer(entry)
+    # a replayed offer replaces the entry
+    offer_book.insert_offer(entry)
+    offer_book.insert_offer(make_entry(OfferType.SELL, 10, 20, timeout_date=2000))
+    assert len(offer_book.sells) == 2
+    assert len(offer_book.expiries) == 2
+
+    assert offer_book.evict_expired(1000) == [entry]
+    assert offer_book.evict_expired(1000) == []
+    assert offer_book.next_timeout_date == 2000
+
+
+def test_evict_expired_stale_entries(offer_book):
+    entry = make_entry(OfferType.SELL, 10, 20, timeout_date=1000)
+    offer_book.insert_offer(entry)
+    offer_book.sells.remove_offer(entry.offer_id)
+
+    # the entry is gone from the view, its expiry must not keep the next timeout in the past
+    assert offer_book.evict_expired(1000) == []
+    assert offer_book.next_timeout_date is None
+
+
+def test_offer_eviction_task(offer_book):
+    for timeout_date in (time_plus(seconds=-1), time_plus(seconds=-1), time_plus(seconds=-1),
+                         time_plus(seconds=60)):
+        offer_book.insert_offer(make_entry(OfferType.SELL, 10, 20, timeout_date))
+
+    task = OfferEvictionTask(offer_book, threshold=0, batch_size=2)
+    assert task.evict() == 3
+    assert len(offer_book.sells) == 1
+
+    # offers are seen as timed out `threshold` seconds before their timeout
+    assert OfferEvictionTask(offer_book, threshold=61).evict() == 1
+
+
+def test_expire_pending_trades(offer_book):
+    trades = TradesView()
+    entries = [make_entry(OfferType.SELL, 10, 20, timeout_date)
+               for timeout_date in (1000, 2000, 3000)]
+    for entry in entries:
+        trades.add_pending(entry.offer)
+    assert trades.report_completed(entries[1].offer_id, 1500) == entries[1].offer_id
+
+    assert trades.expire_pending(2500) == [entries[0].offer]
+    assert trades.report_completed(entries[0].offer_id, 2600) is False
+    assert trades.get_pending_by_id(entries[2].offer_id) is entries[2].offer
+
+    # taken offers are dropped from the pending trades `threshold` seconds after their timeout
+    pending = make_entry(OfferType.SELL, 10, 20, time_plus(seconds=-1)).offer
+    trades.add_pending(pending)
+    trades.add_pending(make_entry(OfferType.SELL, 10, 20, time_plus(seconds=-3)).offer)
+    OfferEvictionTask(offer_book, trades, threshold=2).evict()
+    assert list(trades.pending_offer_by_id) == [pending.offer_id]
+
+
+def test_offer_taken_task(offer_book):
+    message_broker = MessageBroker()
+    trades = TradesView()
+    entries = [make_entry(OfferType.SELL, 10, 20) for _ in range(3)]
+    for entry in entries:
+        offer_book.insert_offer(entry)
+
+    task = OfferTakenTask(offer_book, trades, message_broker)
+    task.start()
+    gevent.idle()
+    try:
+        message_broker.broadcast(OfferTaken(entries[0].offer_id))
+        message_broker.broadcast(OfferTaken(entries[1].offer_id))
+        message_broker.broadcast(OfferTaken(12345))
+        gevent.idle()
+
+        assert list(offer_book.sells.values()) == entries[2:]
+        assert trades.get_pending_by_id(entries[0].offer_id) is entries[0].offer
+        assert trades.get_pending_by_id(entries[1].offer_id) is entries[1].offer
+    finally:
+        task.kill()
+
+
+def test_compact_entry(offer_book):
+    signer = Signer.random()
+    proof = CommitmentProof(b'\x01' * 65, b'\x02' * 32, b'\x03' * 32, 7)
+    signer.sign(proof)
+    offer = BasicOffer(7, OfferType.SELL, 10, 25, 1000)
+    entry = OfferBookEntry(offer, bytes(bytearray(b'1' * 20)), proof)
+    other = OfferBookEntry(BasicOffer(8, OfferType.SELL, 10, 30, 1000),
+                           bytes(bytearray(b'1' * 20)), None)
+
+    assert not hasattr(entry, '__dict__') and not hasattr(offer, '__dict__')
+    assert entry.price == 2.5
+    # the proof is kept encoded until it is needed, and then decoded once
+    assert isinstance(entry.commitment_proof_data, bytes)
+    assert entry.commitment_proof == proof and entry.commitment_proof.sender == signer.address
+    assert entry.commitment_proof is entry.commitment_proof
+    assert other.commitment_proof is None
+
+    # the book shares the initiators while it holds offers of them
+    offer_book.insert_offer(entry)
+    offer_book.insert_offer(other)
+    offer_book.insert_offer(entry)
+    assert entry.initiator is other.initiator
+    assert len(offer_book.initiators) == 1
+    offer_book.remove_offers([entry.offer_id, other.offer_id])
+    assert len(offer_book.initiators) == 0
+
+    restored = pickle.loads(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+    assert restored.offer == offer and restored.commitment_proof == proof and restored.price == 2.5
+
+
+def test_memory_usage(offer_book):
+    assert offer_book.memory_usage() == (0, 0)
+    entries = [make_entry(OfferType.SELL, 10, 20), make_entry(OfferType.BUY, 10, 20)]
+    for entry in entries:
+        offer_book.insert_offer(entry)
+    nof_entries, size = offer_book.memory_usage()
+    assert nof_entries == 2 and size == sum(entry.memory_size() for entry in entries)
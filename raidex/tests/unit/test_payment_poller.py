@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+from raidex.raidex_node.trader.listener.payment_poller import (
+    PaymentPoller,
+    RecentIds,
+    iter_json_items,
+)
+from raidex.raidex_node.trader.listener.listen_for_events import encode
+
+
+def raw_payment(identifier, initiator='0x' + '11' * 20, amount=5):
+    return dict(event='EventPaymentReceivedSuccess', initiator=initiator, amount=amount,
+                identifier=identifier)
+
+
+class FakeResponse(object):
+
+    def __init__(self, text, chunk_size):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.encoding = 'utf-8'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.text), self.chunk_size):
+            yield self.text[i:i + self.chunk_size]
+
+
+class FakeRaidenSession(object):
+    """Serves the payment history with raiden's offset and limit parameters"""
+
+    def __init__(self, history, chunk_size=7, paginated=True):
+        self.history = history
+        self.chunk_size = chunk_size
+        self.paginated = paginated
+        self.requests = list()
+
+    def get(self, url, params=None, **kwargs):
+        self.requests.append(params)
+        if not self.paginated:
+            return FakeResponse(json.dumps(self.history), self.chunk_size)
+        offset, limit = params['offset'], params['limit']
+        return FakeResponse(json.dumps(self.history[offset:offset + limit]), self.chunk_size)
+
+
+def test_iter_json_items_across_chunks():
+    items = [raw_payment(i) for i in range(10)]
+    text = json.dumps(items[:4]) + '\n' + json.dumps(items[4:])
+
+    for chunk_size in (1, 3, 50, len(text)):
+        chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+        assert list(iter_json_items(chunks)) == items
+
+    assert list(iter_json_items(['[]', '\n'])) == []
+
+    with pytest.raises(ValueError):
+        list(iter_json_items(['[{"event": 1', ']']))
+
+
+def test_recent_ids_window_and_size():
+    now = [0]
+    ids = RecentIds(window=10, max_size=3, clock=lambda: now[0])
+
+    assert ids.add(1)
+    assert not ids.add(1)
+    assert ids.add(2)
+
+    now[0] = 10
+    assert ids.add(3)
+    assert 1 not in ids and 2 not in ids
+    assert ids.add(1)
+
+    ids.add(4)
+    ids.add(5)
+    assert len(ids) == 3
+    assert 3 not in ids
+
+
+def test_poller_requests_only_new_events():
+    history = [raw_payment(i) for i in range(5)]
+    session = FakeRaidenSession(history)
+    received = list()
+    poller = PaymentPoller(session, 'http://raiden/api/v1/payments', encode, received.append,
+                           page_size=3)
+
+    assert poller.poll() == (3, 3)
+    assert poller.poll() == (2, 2)
+    assert poller.poll() == (0, 0)
+    assert [event.identifier for event in received] == list(range(5))
+    assert [request['offset'] for request in session.requests] == [0, 3, 5]
+
+    # other events move the cursor, but are not handed out
+    history.append(dict(event='EventPaymentSentSuccess', identifier=5))
+    history.append(raw_payment(6))
+    assert poller.poll() == (2, 1)
+    assert received[-1].identifier == 6
+    assert poller.cursor == 7
+
+
+def test_poller_drops_duplicates():
+    history = [raw_payment(1), raw_payment(1), raw_payment(2)]
+    received = list()
+    poller = PaymentPoller(FakeRaidenSession(history), 'url', encode, received.append)
+
+    assert poller.poll() == (3, 2)
+    assert [event.identifier for event in received] == [1, 2]
+
+
+def test_poller_without_pagination_delivers_once():
+    history = [raw_payment(i) for i in range(2)]
+    session = FakeRaidenSession(history, paginated=False)
+    received = list()
+    poller = PaymentPoller(session, 'url', encode, received.append, page_size=3)
+    now = [0]
+    poller.seen = RecentIds(window=10, clock=lambda: now[0])
+
+    assert poller.poll() == (2, 2)
+    # not detected yet, the ids seen again are filtered
+    now[0] = 8
+    assert poller.poll() == (2, 0)
+
+    now[0] = 16
+    history.extend(raw_payment(i) for i in range(2, 5))
+    assert poller.poll() == (5, 3)
+    assert not poller.paginated
+    assert poller.cursor == 5
+
+    # the ids expired, the events before the cursor are still not delivered again
+    now[0] = 100
+    assert poller.poll() == (5, 0)
+    history.append(raw_payment(5))
+    assert poller.poll() == (6, 1)
+    assert [event.identifier for event in received] == list(range(6))
+    assert [request['offset'] for request in session.requests[-2:]] == [0, 0]
+
+
+def test_poller_backs_off_when_idle():
+    poller = PaymentPoller(FakeRaidenSession([]), 'url', encode, None, interval=1, max_interval=4)
+
+    intervals = list()
+    for _ in range(4):
+        poller._adapt_interval(0)
+        intervals.append(poller.interval)
+    assert intervals == [2, 4, 4, 4]
+
+    poller._adapt_interval(1)
+    assert poller.interval == 1
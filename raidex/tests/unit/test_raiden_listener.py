@@ -0,0 +1,46 @@
+import pytest
+
+from raidex.raidex_node.architecture.state_change import (
+    TransferReceivedStateChange,
+    ChannelStatusStateChange,
+)
+from raidex.raidex_node.trader.listener.events import (
+    PaymentReceivedEvent,
+    ChannelStatusRaidenEvent,
+)
+from raidex.raidex_node.trader.listener.filter import TransferReceivedFilter, ChannelFilter
+from raidex.raidex_node.trader.listener.raiden_listener import RaidenListener
+
+
+@pytest.fixture
+def dispatched(mocker):
+    dispatched = list()
+    mocker.patch('raidex.raidex_node.trader.listener.raiden_listener.dispatch_state_changes',
+                 side_effect=dispatched.extend)
+    return dispatched
+
+
+def test_indexed_filters(dispatched):
+    raiden_listener = RaidenListener(None)
+    for identifier in range(3):
+        raiden_listener.add_event_filter(TransferReceivedFilter(b'a' * 20, identifier))
+    raiden_listener.add_event_filter(ChannelFilter(dict()))
+    assert raiden_listener.nof_filters == 4
+
+    raiden_listener.new_raiden_event(PaymentReceivedEvent(b'b' * 20, 10, 1))
+    assert dispatched == []
+
+    raiden_listener.new_raiden_event(PaymentReceivedEvent(b'a' * 20, 10, 1))
+    assert len(dispatched) == 1
+    assert isinstance(dispatched[0], TransferReceivedStateChange)
+    assert dispatched[0].raiden_event.identifier == 1
+    assert raiden_listener.nof_filters == 3
+    assert (PaymentReceivedEvent, (b'a' * 20, 1)) not in raiden_listener.keyed_filters
+
+    # the filter was removed with the first match
+    raiden_listener.new_raiden_event(PaymentReceivedEvent(b'a' * 20, 10, 1))
+    assert len(dispatched) == 1
+
+    raiden_listener.new_raiden_event(ChannelStatusRaidenEvent(dict()))
+    assert isinstance(dispatched[1], ChannelStatusStateChange)
+    assert raiden_listener.nof_filters == 2
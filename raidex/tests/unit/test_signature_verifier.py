@@ -0,0 +1,37 @@
+import pytest
+from gevent.queue import Queue
+from eth_utils import keccak
+
+from raidex.messages import Commitment
+from raidex.utils import timestamp
+from raidex.utils.signature_verifier import SignatureVerifier
+
+
+def make_commitment(offer_id, privatekey=None):
+    commitment = Commitment(offer_id, keccak(text='offer id'), timestamp.time_plus(seconds=10), 10)
+    if privatekey is not None:
+        commitment.sign(privatekey)
+    return commitment
+
+
+@pytest.mark.parametrize('pool_size', [0, 2])
+def test_signature_verifier(accounts, pool_size):
+    source = Queue()
+    signers = [accounts[offer_id % 2] for offer_id in range(5)]
+    for offer_id, account in enumerate(signers):
+        source.put(make_commitment(offer_id, account.privatekey))
+    source.put(make_commitment(5))
+
+    verifier = SignatureVerifier(source.get, batch_size=4, max_wait=0.01, pool_size=pool_size)
+    verifier.start()
+    try:
+        verified = [verifier.get(timeout=1) for _ in signers]
+
+        assert [message.offer_id for message, _ in verified] == list(range(5))
+        assert [sender for _, sender in verified] == [account.address for account in signers]
+        assert verifier.nof_batches == 2
+        assert verifier.nof_verified == 5
+        assert verifier.nof_failed == 1
+        assert verifier.queue_depth == 0
+    finally:
+        verifier.kill()
@@ -6,6 +6,33 @@ from eth_utils import (
     decode_hex)
 
 
+class InternedAddresses(object):
+    """
+    Shares one instance of equal binary addresses, e.g. between the many offers of one maker.
+    An address is kept as long as it is referenced, every `acquire` needs its `release`.
+    """
+
+    def __init__(self):
+        self._addresses = dict()  # address -> [shared instance, number of references]
+
+    def acquire(self, address):
+        """:return: the shared instance of an equal address"""
+        shared = self._addresses.get(address)
+        if shared is None:
+            shared = self._addresses[address] = [address, 0]
+        shared[1] += 1
+        return shared[0]
+
+    def release(self, address):
+        shared = self._addresses[address]
+        shared[1] -= 1
+        if shared[1] == 0:
+            del self._addresses[address]
+
+    def __len__(self):
+        return len(self._addresses)
+
+
 def encode_address(address_bytes):
     return to_checksum_address(address_bytes)
 
@@ -1,51 +1,153 @@
-from gevent import spawn_later, kill
+import heapq
+import itertools
+
+import gevent
+from gevent.event import Event
 
 from raidex.raidex_node.architecture.state_change import OfferTimeoutStateChange
 from raidex.exceptions import AlreadyTimedOutException
-from raidex.utils.timestamp import seconds_to_timeout
+from raidex.utils import timestamp
 from raidex.raidex_node.architecture.event_architecture import dispatch_state_changes
 
+# rebuild the heap when more than this fraction of its entries is cancelled
+COMPACT_RATIO = 0.5
+
 
-def future_timeout(offer_id, timeout, threshold=0):
+class TimeoutEntry:
 
-    lifetime = seconds_to_timeout(timeout) - threshold
-    return spawn_later(lifetime, dispatch_state_changes, OfferTimeoutStateChange(offer_id, timeout))
+    __slots__ = [
+        'dispatch_time',
+        'sequence',
+        'offer_id',
+        'timeout_date',
+        'cancelled',
+    ]
 
+    def __init__(self, dispatch_time, sequence, offer_id, timeout_date):
+        self.dispatch_time = dispatch_time
+        self.sequence = sequence
+        self.offer_id = offer_id
+        self.timeout_date = timeout_date
+        self.cancelled = False
 
-def kill_greenlet(greenlet):
-    kill(greenlet)
+    def __lt__(self, other):
+        return (self.dispatch_time, self.sequence) < (other.dispatch_time, other.sequence)
 
 
 class TimeoutHandler:
+    """
+    Schedules the OfferTimeoutStateChanges of all offers in a single greenlet.
+
+    Timeouts are kept in a min-heap ordered by their dispatch time. Cancelled timeouts are only
+    flagged and get dropped when they reach the top of the heap. All timeouts that are due
+    at the same wakeup are dispatched together as one batch of state changes.
+    """
 
     def __init__(self):
-        self.timeout_greenlets = dict()
+        self._heap = list()
+        self._pending = dict()
+        self._timed_out = set()
+        self._sequence = itertools.count()
+        self._nof_cancelled = 0
+        self._wakeup = Event()
+        self._scheduler = None
+        self.last_lateness = 0
+        self.max_lateness = 0
 
     def create_new_timeout(self, offer, threshold=0):
 
         offer_id = offer.offer_id
 
-        if self._has_greenlet(offer_id) and not self._is_still_alive(offer_id):
+        if offer_id in self._timed_out:
             raise AlreadyTimedOutException()
 
         self.clean_up_timeout(offer_id)
-        timeout_greenlet = future_timeout(offer_id, offer.timeout_date, threshold)
-        self.timeout_greenlets[offer_id] = timeout_greenlet
-        return True
 
-    def _has_greenlet(self, offer_id):
-        if offer_id in self.timeout_greenlets:
-            return True
-        return False
+        dispatch_time = offer.timeout_date - int(timestamp.to_milliseconds(threshold))
+        entry = TimeoutEntry(dispatch_time, next(self._sequence), offer_id, offer.timeout_date)
+        heapq.heappush(self._heap, entry)
+        self._pending[offer_id] = entry
+
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        self._ensure_scheduler()
+        return True
 
-    def _is_still_alive(self, offer_id):
+    def has_timeout(self, offer_id):
+        return offer_id in self._pending or offer_id in self._timed_out
 
-        if offer_id in self.timeout_greenlets and not self.timeout_greenlets[offer_id].dead:
-            return True
-        return False
+    def is_pending(self, offer_id):
+        return offer_id in self._pending
 
     def clean_up_timeout(self, offer_id):
 
-        if offer_id in self.timeout_greenlets:
-            kill_greenlet(self.timeout_greenlets[offer_id])
-            del self.timeout_greenlets[offer_id]
\ No newline at end of file
+        entry = self._pending.pop(offer_id, None)
+        if entry is not None:
+            entry.cancelled = True
+            self._nof_cancelled += 1
+            if self._nof_cancelled > len(self._heap) * COMPACT_RATIO:
+                self._compact()
+
+        self._timed_out.discard(offer_id)
+
+    @property
+    def queue_length(self):
+        return len(self._pending)
+
+    def gauges(self):
+        """lateness in milliseconds, of the last dispatched batch and the maximum so far"""
+        return dict(
+            timeouts_pending=self.queue_length,
+            timeout_last_lateness=self.last_lateness,
+            timeout_max_lateness=self.max_lateness,
+        )
+
+    def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.kill()
+            self._scheduler = None
+
+    def _ensure_scheduler(self):
+        if self._scheduler is None or self._scheduler.dead:
+            self._scheduler = gevent.spawn(self._run)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if not entry.cancelled]
+        heapq.heapify(self._heap)
+        self._nof_cancelled = 0
+
+    def _pop_due(self, now):
+        due = list()
+        while self._heap and self._heap[0].dispatch_time <= now:
+            entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                self._nof_cancelled -= 1
+                continue
+            del self._pending[entry.offer_id]
+            self._timed_out.add(entry.offer_id)
+            due.append(entry)
+        return due
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+
+            if not self._heap:
+                self._wakeup.wait()
+                continue
+
+            delay = timestamp.to_seconds(self._heap[0].dispatch_time - timestamp.time())
+            if delay > 0 and self._wakeup.wait(delay):
+                # the earliest timeout changed, recalculate the delay
+                continue
+
+            now = timestamp.time()
+            due = self._pop_due(now)
+            if not due:
+                continue
+
+            self.last_lateness = now - due[0].dispatch_time
+            self.max_lateness = max(self.max_lateness, self.last_lateness)
+
+            dispatch_state_changes([OfferTimeoutStateChange(entry.offer_id, entry.timeout_date)
+                                    for entry in due])
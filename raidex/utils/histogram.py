@@ -0,0 +1,56 @@
+import bisect
+
+# upper bounds in seconds, from 0.1ms growing by a factor of 2 up to ~105s
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** exponent for exponent in range(21))
+
+
+class Histogram(object):
+    """
+    Counts observed values in fixed buckets, like a prometheus histogram.
+    Every bucket counts the values up to its upper bound and above the previous one,
+    the last bucket counts everything above the largest bound.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def percentile(self, fraction):
+        """
+        :param fraction: e.g. 0.99 for the 99th percentile
+        :return: upper bound of the bucket the percentile falls into,
+                 None if there are no observations or it falls above the largest bound
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None
+
+    def cumulative_counts(self):
+        """:return: (upper bound, number of values up to it), the last bound is infinity"""
+        cumulative = 0
+        counts = list()
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            counts.append((bound, cumulative))
+        return counts
+
+    def snapshot(self):
+        bounds = self.buckets + (float('inf'),)
+        return dict(count=self.count, sum=self.sum, buckets=list(zip(bounds, self.counts)))
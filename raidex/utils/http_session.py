@@ -0,0 +1,25 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from raidex.constants import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_MAX_RETRIES
+
+
+def make_session(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_retries=HTTP_MAX_RETRIES):
+    """
+    Creates a requests Session that keeps connections alive and reuses them.
+
+    :param pool_connections: number of hosts a connection pool is kept for
+    :param pool_maxsize: number of connections kept alive per host
+    :param max_retries: retries of failed connection attempts,
+                        requests are never retried once they reached the server
+    """
+    session = requests.Session()
+    # the clients only talk to configured hosts,
+    # don't look up proxy settings in the environment on every request
+    session.trust_env = False
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
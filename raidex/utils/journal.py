@@ -0,0 +1,70 @@
+import os
+import pickle
+import struct
+import time
+
+import structlog
+
+from raidex.constants import JOURNAL_FSYNC_BATCH_SIZE, JOURNAL_FSYNC_INTERVAL
+
+log = structlog.get_logger('utils.journal')
+
+RECORD_HEADER = struct.Struct('>I')
+
+
+class Journal:
+    """
+    Append-only file of length prefixed, pickled records, e.g. the StateChanges of the node.
+    Every record is flushed to the OS immediately, fsync is done in batches.
+    """
+
+    def __init__(self, path, fsync_batch_size=JOURNAL_FSYNC_BATCH_SIZE,
+                 fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'ab')
+        self._nof_unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(RECORD_HEADER.pack(len(data)) + data)
+        self._file.flush()
+        self._nof_unsynced += 1
+
+        if (self._nof_unsynced >= self.fsync_batch_size or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        if self._nof_unsynced > 0:
+            os.fsync(self._file.fileno())
+            self._nof_unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        """
+        :param path: path of the journal file
+        :return: generator of the journaled records,
+                 stops at a torn record at the end of the file
+        """
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as journal_file:
+            while True:
+                header = journal_file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, = RECORD_HEADER.unpack(header)
+                data = journal_file.read(length)
+                if len(data) < length:
+                    log.warning('Incomplete journal record, ignoring the journal tail', path=path)
+                    return
+                yield pickle.loads(data)
@@ -0,0 +1,123 @@
+import time
+
+import gevent
+from gevent.queue import Queue, Empty
+from gevent.threadpool import ThreadPool
+
+from raidex.messages import recover_sender
+from raidex.constants import VERIFY_BATCH_SIZE, VERIFY_MAX_WAIT, VERIFY_POOL_SIZE
+
+
+def recover_senders(requests):
+    """
+    :param requests: list of (signature, message hash without signature)
+    :return: list of the recovered sender addresses, None where the recovery failed
+    """
+    senders = list()
+    for signature, messagedata in requests:
+        try:
+            senders.append(recover_sender(signature, messagedata))
+        except Exception:
+            senders.append(None)
+    return senders
+
+
+class SignatureVerifier(gevent.Greenlet):
+    """
+    Recovers the senders of signed messages in micro-batches, off the gevent hub.
+
+    Messages are pulled from `source` until `batch_size` messages are collected or `max_wait`
+    seconds passed since the first message of the batch. The batch is split over a pool of
+    OS threads, the secp256k1 backend (coincurve) releases the GIL while recovering.
+    The verified (message, sender) pairs are put in order on the output queue, messages
+    without a valid signature are dropped.
+    """
+
+    def __init__(self, source, batch_size=VERIFY_BATCH_SIZE, max_wait=VERIFY_MAX_WAIT,
+                 pool_size=VERIFY_POOL_SIZE):
+        """
+        :param source: callable like gevent's Queue.get(block=True, timeout=None),
+                       raises Empty on timeout
+        :param pool_size: number of threads, 0 recovers the senders in the calling greenlet
+        """
+        self.source = source
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.pool_size = pool_size
+        self.output = Queue()
+        self.nof_verified = 0
+        self.nof_failed = 0
+        self.nof_batches = 0
+        self.nof_in_flight = 0
+        self.started_at = None
+        self._pool = None
+        gevent.Greenlet.__init__(self)
+
+    def get(self, *args, **kwargs):
+        """Gets the next verified (message, sender) pair or blocks until there is one"""
+        return self.output.get(*args, **kwargs)
+
+    @property
+    def queue_depth(self):
+        """number of messages that are being verified or wait to be picked up"""
+        return self.nof_in_flight + self.output.qsize()
+
+    @property
+    def throughput(self):
+        """verified messages per second since the verifier was started"""
+        if self.started_at is None:
+            return 0
+        elapsed = time.monotonic() - self.started_at
+        return self.nof_verified / elapsed if elapsed > 0 else 0
+
+    def _run(self):
+        self.started_at = time.monotonic()
+        if self.pool_size > 0:
+            self._pool = ThreadPool(self.pool_size)
+        try:
+            while True:
+                batch = self._next_batch()
+                self.nof_in_flight = len(batch)
+                senders = self._recover(batch)
+                self.nof_batches += 1
+
+                for message, sender in zip(batch, senders):
+                    if sender is None:
+                        self.nof_failed += 1
+                        continue
+                    self.nof_verified += 1
+                    self.output.put((message, sender))
+                self.nof_in_flight = 0
+        finally:
+            if self._pool is not None:
+                self._pool.kill()
+
+    def _next_batch(self):
+        batch = [self.source()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.source(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _recover(self, batch):
+        requests = list()
+        for message in batch:
+            signature = message.signature
+            if signature is not None and not isinstance(signature, bytes):
+                signature = signature.to_bytes()
+            requests.append((signature, message._hash_without_signature))
+
+        if self._pool is None:
+            return recover_senders(requests)
+
+        chunk_size = -(-len(requests) // self.pool_size)
+        results = [self._pool.spawn(recover_senders, requests[index:index + chunk_size])
+                   for index in range(0, len(requests), chunk_size)]
+        return [sender for result in results for sender in result.get()]